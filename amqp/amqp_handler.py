@@ -57,6 +57,11 @@ def prepare_test_item_info(test_item_info):
     return launch_objects.TestItemInfo(**test_item_info)
 
 
+def prepare_test_item_info_list(test_item_info_list):
+    """Function for deserializing array of test item info for suggestions"""
+    return [launch_objects.TestItemInfo(**test_item_info) for test_item_info in test_item_info_list]
+
+
 def prepare_search_response_data(response):
     """Function for serializing response from search request"""
     return json.dumps(response)
@@ -67,6 +72,11 @@ def prepare_analyze_response_data(response):
     return json.dumps([resp.dict() for resp in response])
 
 
+def prepare_batch_response_data(response):
+    """Function for serializing lists of results for every request item"""
+    return json.dumps([[resp.dict() for resp in item_response] for item_response in response])
+
+
 def prepare_index_response_data(response):
     """Function for serializing response from index request
     and other objects, which are pydantic objects"""
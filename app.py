@@ -69,13 +69,30 @@ APP_CONFIG = {
     "binaryStoreType":   os.getenv("ANALYZER_BINARYSTORE_TYPE", "minio"),
     "minioBucketPrefix": os.getenv("ANALYZER_BINARYSTORE_BUCKETPREFIX", "prj-"),
     "minioRegion":       os.getenv("ANALYZER_BINARYSTORE_MINIO_REGION", None),
+    "minioBucketCacheTtl": int(os.getenv("MINIO_BUCKET_CACHE_TTL", "60")),
+    "minioLocalCacheFolder": os.getenv("MINIO_LOCAL_CACHE_FOLDER", "").strip(),
+    "minioLocalCacheSize": int(os.getenv("MINIO_LOCAL_CACHE_SIZE", "1024")),
     "instanceTaskType":  os.getenv("INSTANCE_TASK_TYPE", "").strip(),
     "filesystemDefaultPath": os.getenv("FILESYSTEM_DEFAULT_PATH", "storage").strip(),
     "esChunkNumber":         int(os.getenv("ES_CHUNK_NUMBER", "1000")),
     "esChunkNumberUpdateClusters": int(os.getenv("ES_CHUNK_NUMBER_UPDATE_CLUSTERS", "500")),
+    "clusteringProcessesNum": int(os.getenv("ANALYZER_CLUSTERING_PROCESSES_NUM", "0")),
+    "suggestMsearchChunkSize": int(os.getenv("SUGGEST_MSEARCH_CHUNK_SIZE", "60")),
+    "suggestMsearchThreadsNum": int(os.getenv("SUGGEST_MSEARCH_THREADS_NUM", "1")),
+    "suggestCacheTtl": int(os.getenv("SUGGEST_CACHE_TTL", "300")),
+    "suggestCacheSize": int(os.getenv("SUGGEST_CACHE_SIZE", "1000")),
+    "suggestInfoFlushInterval": float(os.getenv("SUGGEST_INFO_FLUSH_INTERVAL", "0")),
+    "suggestInfoFlushSize": int(os.getenv("SUGGEST_INFO_FLUSH_SIZE", "1000")),
+    "trainingScanThreadsNum": int(os.getenv("TRAINING_SCAN_THREADS_NUM", "4")),
+    "trainingScanSlicesNum": int(os.getenv("TRAINING_SCAN_SLICES_NUM", "1")),
+    "trainingDataGatheringTimeLimit": int(os.getenv("TRAINING_DATA_GATHERING_TIME_LIMIT", "0")),
+    "trainingCvProcessesNum": int(os.getenv("TRAINING_CV_PROCESSES_NUM", "1")),
+    "trainingCvMemoryLimit": int(os.getenv("TRAINING_CV_MEMORY_LIMIT", "0")),
+    "trainingFeaturesCache": json.loads(os.getenv("TRAINING_FEATURES_CACHE", "true").lower()),
     "esProjectIndexPrefix":  os.getenv("ES_PROJECT_INDEX_PREFIX", "").strip(),
     "analyzerHttpPort":  int(os.getenv("ANALYZER_HTTP_PORT", "5001")),
-    "analyzerPathToLog":  os.getenv("ANALYZER_FILE_LOGGING_PATH", "/tmp/config.log")
+    "analyzerPathToLog":  os.getenv("ANALYZER_FILE_LOGGING_PATH", "/tmp/config.log"),
+    "warmUpModels":      json.loads(os.getenv("ANALYZER_WARM_UP_MODELS", "true").lower())
 }
 
 SEARCH_CONFIG = {
@@ -161,6 +178,9 @@ def init_amqp(_amqp_client):
                        amqp_handler.handle_inner_amqp_request(channel, method, props, body,
                                                               _retraining_service.train_models))))
     else:
+        _cluster_service = ClusterService(APP_CONFIG, SEARCH_CONFIG)
+        if APP_CONFIG["warmUpModels"]:
+            _model_chooser.warm_up_global_models()
         _es_client = EsClient(APP_CONFIG, SEARCH_CONFIG)
         _auto_analyzer_service = AutoAnalyzerService(_model_chooser, APP_CONFIG, SEARCH_CONFIG)
         _delete_index_service = DeleteIndexService(_model_chooser, APP_CONFIG, SEARCH_CONFIG)
@@ -169,7 +189,6 @@ def init_amqp(_amqp_client):
         _suggest_service = SuggestService(_model_chooser, APP_CONFIG, SEARCH_CONFIG)
         _suggest_info_service = SuggestInfoService(APP_CONFIG, SEARCH_CONFIG)
         _search_service = SearchService(APP_CONFIG, SEARCH_CONFIG)
-        _cluster_service = ClusterService(APP_CONFIG, SEARCH_CONFIG)
         _namespace_finder_service = NamespaceFinderService(APP_CONFIG, SEARCH_CONFIG)
         _suggest_patterns_service = SuggestPatternsService(APP_CONFIG, SEARCH_CONFIG)
         threads.append(create_thread(AmqpClient(APP_CONFIG["amqpUrl"]).receive,
@@ -222,6 +241,24 @@ def init_amqp(_amqp_client):
                                                         prepare_test_item_info,
                                                         prepare_response_data=amqp_handler.
                                                         prepare_analyze_response_data))))
+        threads.append(create_thread(AmqpClient(APP_CONFIG["amqpUrl"]).receive,
+                       (APP_CONFIG["exchangeName"], "suggest_batch", True, False,
+                       lambda channel, method, props, body:
+                       amqp_handler.handle_amqp_request(channel, method, props, body,
+                                                        _suggest_service.suggest_items_batch,
+                                                        prepare_data_func=amqp_handler.
+                                                        prepare_test_item_info_list,
+                                                        prepare_response_data=amqp_handler.
+                                                        prepare_batch_response_data))))
+        threads.append(create_thread(AmqpClient(APP_CONFIG["amqpUrl"]).receive,
+                       (APP_CONFIG["exchangeName"], "suggest_cluster", True, False,
+                       lambda channel, method, props, body:
+                       amqp_handler.handle_amqp_request(channel, method, props, body,
+                                                        _suggest_service.suggest_items_for_cluster,
+                                                        prepare_data_func=amqp_handler.
+                                                        prepare_test_item_info,
+                                                        prepare_response_data=amqp_handler.
+                                                        prepare_analyze_response_data))))
         threads.append(create_thread(AmqpClient(APP_CONFIG["amqpUrl"]).receive,
                        (APP_CONFIG["exchangeName"], "cluster", True, False,
                        lambda channel, method, props, body:
@@ -0,0 +1,92 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+
+Reports the memory used by each forked worker with global models loaded in every worker
+and with global models preloaded in the parent process before fork.
+Run from the repository root (Linux only):
+    PYTHONPATH=. python benchmarks/shared_models_rss.py --workers 4
+"""
+
+import argparse
+import os
+import sys
+from commons import global_models
+
+
+def read_memory_kb(file_name, field_name):
+    try:
+        with open(file_name, "r") as f:
+            for line in f:
+                if line.startswith(field_name + ":"):
+                    return int(line.split()[1])
+    except Exception:
+        pass
+    return 0
+
+
+def use_models(search_cfg):
+    for folder, class_to_use in global_models.get_global_model_folders(search_cfg).values():
+        if folder.strip():
+            global_models.get_global_model(class_to_use, folder)
+    global_models.get_weighted_similarity_calculator(search_cfg)
+
+
+def run_workers(search_cfg, workers_num):
+    pipes = []
+    for _ in range(workers_num):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                use_models(search_cfg)
+            except Exception as err:
+                print("Failed to load models: %s" % err)
+            rss = read_memory_kb("/proc/self/status", "VmRSS")
+            pss = read_memory_kb("/proc/self/smaps_rollup", "Pss")
+            os.write(write_fd, ("%d %d" % (rss, pss)).encode("utf-8"))
+            os.close(write_fd)
+            os._exit(0)
+        os.close(write_fd)
+        pipes.append((pid, read_fd))
+    results = []
+    for pid, read_fd in pipes:
+        with os.fdopen(read_fd, "r") as f:
+            results.append([int(val) for val in f.read().split()])
+        os.waitpid(pid, 0)
+    return results
+
+
+def print_results(title, results):
+    print(title)
+    for idx, (rss, pss) in enumerate(results):
+        print("  worker %d: RSS %.1f MB, PSS %.1f MB" % (idx, rss / 1024.0, pss / 1024.0))
+    print("  total PSS %.1f MB" % (sum(pss for _, pss in results) / 1024.0))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    search_cfg = global_models.read_global_model_folders()
+
+    print_results("Models loaded in each worker:", run_workers(search_cfg, args.workers))
+
+    global_models.preload_global_models(search_cfg)
+    print_results("Models preloaded before fork:", run_workers(search_cfg, args.workers))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
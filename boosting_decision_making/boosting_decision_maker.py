@@ -14,11 +14,14 @@
 * limitations under the License.
 """
 
-from xgboost import XGBClassifier
+from xgboost import XGBClassifier, DMatrix
 from sklearn.metrics import classification_report, confusion_matrix
+import numpy as np
 import os
+import json
 import pickle
 import logging
+import threading
 from utils import utils
 from boosting_decision_making import feature_encoder
 
@@ -36,6 +39,7 @@ class BoostingDecisionMaker:
             monotonous_features)
         self.is_global = is_global
         self.features_dict_with_saved_objects = {}
+        self.booster_lock = threading.Lock()
         if not folder.strip():
             self.xg_boost = XGBClassifier(n_estimators=n_estimators,
                                           max_depth=max_depth,
@@ -88,8 +92,49 @@ class BoostingDecisionMaker:
             _features_dict_with_saved_objects[feature] = _feature_encoder
         return _features_dict_with_saved_objects
 
+    def transform_feature_encoders_to_native_dict(self):
+        features_dict_with_saved_objects = {}
+        for feature in self.features_dict_with_saved_objects:
+            feature_info = self.features_dict_with_saved_objects[feature].save_to_native_feature_info()
+            features_dict_with_saved_objects[feature] = feature_info
+        return features_dict_with_saved_objects
+
+    def transform_native_dict_to_feature_encoders(self, features_dict_with_saved_objects):
+        _features_dict_with_saved_objects = {}
+        for feature in features_dict_with_saved_objects:
+            _feature_encoder = feature_encoder.FeatureEncoder()
+            _feature_encoder.load_from_native_feature_info(features_dict_with_saved_objects[feature])
+            _features_dict_with_saved_objects[int(feature)] = _feature_encoder
+        return _features_dict_with_saved_objects
+
+    def get_native_config(self):
+        return {"n_estimators": self.n_estimators, "max_depth": self.max_depth,
+                "full_config": self.full_config, "feature_ids": self.feature_ids,
+                "monotonous_features": self.monotonous_features}
+
+    def load_native_config(self, native_config):
+        self.n_estimators = native_config["n_estimators"]
+        self.max_depth = native_config["max_depth"]
+        self.full_config = native_config["full_config"]
+        self.feature_ids = native_config["feature_ids"]
+        self.monotonous_features = native_config["monotonous_features"]
+
+    def load_booster(self, model_data):
+        """Loads the booster saved in the xgboost native format, model_data is
+        either a file name or raw bytes of the model"""
+        self.xg_boost = XGBClassifier(n_estimators=self.n_estimators,
+                                      max_depth=self.max_depth,
+                                      random_state=43)
+        self.xg_boost.load_model(model_data)
+
+    def get_booster_raw_data(self):
+        return bytes(self.xg_boost.get_booster().save_raw())
+
     def load_model(self, folder):
         self.folder = folder
+        if os.path.exists(os.path.join(folder, "boost_model.bin")):
+            self.load_native_model(folder)
+            return
         with open(os.path.join(folder, "boost_model.pickle"), "rb") as f:
             self.n_estimators, self.max_depth, self.xg_boost = pickle.load(f)
         with open(os.path.join(folder, "data_features_config.pickle"), "rb") as f:
@@ -103,15 +148,25 @@ class BoostingDecisionMaker:
         else:
             self.features_dict_with_saved_objects = {}
 
+    def load_native_model(self, folder):
+        with open(os.path.join(folder, "data_features_config.json"), "r") as f:
+            self.load_native_config(json.load(f))
+        self.load_booster(os.path.join(folder, "boost_model.bin"))
+        self.features_dict_with_saved_objects = {}
+        if os.path.exists(os.path.join(folder, "features_dict_with_saved_objects.json")):
+            with open(os.path.join(folder, "features_dict_with_saved_objects.json"), "r") as f:
+                self.features_dict_with_saved_objects = self.transform_native_dict_to_feature_encoders(
+                    json.load(f))
+
     def save_model(self, folder):
+        """Saves the model in the native format: the xgboost binary model file and json configs"""
         if not os.path.exists(folder):
             os.makedirs(folder)
-        with open(os.path.join(folder, "boost_model.pickle"), "wb") as f:
-            pickle.dump([self.n_estimators, self.max_depth, self.xg_boost], f)
-        with open(os.path.join(folder, "data_features_config.pickle"), "wb") as f:
-            pickle.dump([self.full_config, self.feature_ids, self.monotonous_features], f)
-        with open(os.path.join(folder, "features_dict_with_saved_objects.pickle"), "wb") as f:
-            pickle.dump(self.transform_feature_encoders_to_dict(), f)
+        self.xg_boost.save_model(os.path.join(folder, "boost_model.bin"))
+        with open(os.path.join(folder, "data_features_config.json"), "w") as f:
+            json.dump(self.get_native_config(), f)
+        with open(os.path.join(folder, "features_dict_with_saved_objects.json"), "w") as f:
+            json.dump(self.transform_feature_encoders_to_native_dict(), f)
 
     def train_model(self, train_data, labels):
         mon_features = [
@@ -132,7 +187,32 @@ class BoostingDecisionMaker:
         logger.info(classification_report(valid_test_labels, res))
         return f1_score
 
-    def predict(self, data):
+    def predict_probabilities(self, data, n_threads=None):
+        booster = self.xg_boost.get_booster()
+        data = np.asarray(data, dtype=np.float32)
+        if hasattr(booster, "inplace_predict"):
+            return booster.inplace_predict(data, missing=np.nan)
+        return booster.predict(DMatrix(data, missing=np.nan, nthread=n_threads or -1))
+
+    def predict(self, data, n_threads=None):
+        """Predicts with the raw booster, the input is converted into float32 once
+        and the labels are derived from the probabilities. The booster is shared
+        by the threads and n_threads changes its parameters, so it's used under the lock"""
         if not len(data):
             return [], []
-        return self.xg_boost.predict(data), self.xg_boost.predict_proba(data)
+        data = np.asarray(data, dtype=np.float32)
+        with self.booster_lock:
+            if n_threads:
+                self.xg_boost.get_booster().set_param({"nthread": n_threads})
+            try:
+                probabilities = self.predict_probabilities(data, n_threads=n_threads)
+            finally:
+                if n_threads:
+                    self.xg_boost.get_booster().set_param(
+                        {"nthread": getattr(self.xg_boost, "n_jobs", None) or -1})
+        if len(probabilities.shape) == 1:
+            probabilities = np.vstack((1 - probabilities, probabilities)).transpose()
+        classes = getattr(self.xg_boost, "classes_", None)
+        if classes is None:
+            classes = np.arange(probabilities.shape[1])
+        return np.asarray(classes)[np.argmax(probabilities, axis=1)], probabilities
@@ -16,6 +16,7 @@
 
 from utils import utils
 from commons import similarity_calculator
+from commons import global_models
 from boosting_decision_making.boosting_decision_maker import BoostingDecisionMaker
 import logging
 import numpy as np
@@ -256,7 +257,8 @@ class BoostingFeaturizer:
             return[]
         if model_folder not in self.models:
             try:
-                self.models[model_folder] = BoostingDecisionMaker(folder=model_folder)
+                self.models[model_folder] = global_models.get_global_model(
+                    BoostingDecisionMaker, model_folder)
                 return self.models[model_folder].get_feature_ids()
             except Exception as err:
                 logger.debug(err)
@@ -276,6 +278,7 @@ class BoostingFeaturizer:
     def predict_particular_defect_type(self):
         scores_by_issue_type = self.find_most_relevant_by_type()
         result = {}
+        issue_types_to_predict, messages_to_predict, models_to_use = [], [], []
         for issue_type in scores_by_issue_type:
             compared_log = scores_by_issue_type[issue_type]["compared_log"]
             det_message = compared_log["_source"]["detected_message_without_params_extended"]
@@ -283,18 +286,36 @@ class BoostingFeaturizer:
             issue_type_to_compare = mr_hit["_source"]["issue_type"]
             det_message = utils.clean_from_brackets(det_message)
             result[issue_type] = 0.0
-            try:
-                model_to_use = issue_type_to_compare.lower()[:2]
-                if model_to_use in ["nd", "ti"]:
-                    continue
-                if issue_type_to_compare in self.defect_type_predict_model.models:
-                    model_to_use = issue_type_to_compare
-                res, res_prob = self.defect_type_predict_model.predict(
-                    [det_message], model_to_use)
-                result[issue_type] = res_prob[0][1] if len(res_prob[0]) == 2 else 0.0
-                self.used_model_info.update(self.defect_type_predict_model.get_model_info())
-            except Exception as err:
-                logger.error(err)
+            model_to_use = issue_type_to_compare.lower()[:2]
+            if model_to_use in ["nd", "ti"]:
+                continue
+            if issue_type_to_compare in self.defect_type_predict_model.models:
+                model_to_use = issue_type_to_compare
+            if model_to_use not in self.defect_type_predict_model.models:
+                logger.error("Defect type model for '%s' is not found", model_to_use)
+                continue
+            issue_types_to_predict.append(issue_type)
+            messages_to_predict.append(det_message)
+            models_to_use.append(model_to_use)
+        try:
+            res, res_prob = self.defect_type_predict_model.predict_with_several_models(
+                messages_to_predict, models_to_use)
+        except Exception as err:
+            logger.error("Failed to predict with several defect type models, "
+                         "predicting with every model separately")
+            logger.error(err)
+            res_prob = []
+            for det_message, model_to_use in zip(messages_to_predict, models_to_use):
+                try:
+                    res_prob.append(self.defect_type_predict_model.predict(
+                        [det_message], model_to_use)[1][0])
+                except Exception as err:
+                    logger.error(err)
+                    res_prob.append([])
+        for issue_type, prob in zip(issue_types_to_predict, res_prob):
+            result[issue_type] = prob[1] if len(prob) == 2 else 0.0
+        if any(len(prob) for prob in res_prob):
+            self.used_model_info.update(self.defect_type_predict_model.get_model_info())
         return result
 
     def is_text_of_particular_defect_type(self, label_type):
@@ -31,6 +31,12 @@ class CustomBoostingDecisionMaker(BoostingDecisionMaker):
         self.is_global = False
 
     def load_model(self, folder):
+        booster_raw_data = self.object_saver.get_project_object(
+            self.project_id, os.path.join(folder, "boost_model.bin"),
+            using_json=False)
+        if booster_raw_data:
+            self.load_native_model(folder, booster_raw_data)
+            return
         self.n_estimators, self.max_depth, self.xg_boost = self.object_saver.get_project_object(
             self.project_id, os.path.join(folder, "boost_model"),
             using_json=False)
@@ -49,16 +55,28 @@ class CustomBoostingDecisionMaker(BoostingDecisionMaker):
         else:
             self.features_dict_with_saved_objects = {}
 
+    def load_native_model(self, folder, booster_raw_data):
+        native_config = self.object_saver.get_project_object(
+            self.project_id, os.path.join(folder, "data_features_config.json"),
+            using_json=True)
+        assert len(native_config) > 0
+        self.load_native_config(native_config)
+        self.load_booster(bytearray(booster_raw_data))
+        self.features_dict_with_saved_objects = self.transform_native_dict_to_feature_encoders(
+            self.object_saver.get_project_object(
+                self.project_id, os.path.join(folder, "features_dict_with_saved_objects.json"),
+                using_json=True))
+
     def save_model(self, folder):
         self.object_saver.put_project_object(
-            [self.n_estimators, self.max_depth, self.xg_boost],
-            self.project_id, os.path.join(folder, "boost_model"),
+            self.get_booster_raw_data(),
+            self.project_id, os.path.join(folder, "boost_model.bin"),
             using_json=False)
         self.object_saver.put_project_object(
-            [self.full_config, self.feature_ids, self.monotonous_features],
-            self.project_id, os.path.join(folder, "data_features_config"),
-            using_json=False)
+            self.get_native_config(),
+            self.project_id, os.path.join(folder, "data_features_config.json"),
+            using_json=True)
         self.object_saver.put_project_object(
-            self.transform_feature_encoders_to_dict(),
-            self.project_id, os.path.join(folder, "features_dict_with_saved_objects"),
-            using_json=False)
+            self.transform_feature_encoders_to_native_dict(),
+            self.project_id, os.path.join(folder, "features_dict_with_saved_objects.json"),
+            using_json=True)
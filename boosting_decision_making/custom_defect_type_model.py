@@ -15,6 +15,7 @@
 """
 
 from boosting_decision_making.defect_type_model import DefectTypeModel
+from boosting_decision_making.shared_tfidf_vectorizer import SharedTfidfVectorizer
 from commons.object_saving.object_saver import ObjectSaver
 import os
 
@@ -36,6 +37,7 @@ class CustomDefectTypeModel(DefectTypeModel):
             self.project_id, os.path.join(folder, "models"),
             using_json=False)
         assert len(self.models) > 0
+        self.shared_vectorizer = SharedTfidfVectorizer(self.count_vectorizer_models)
 
     def save_model(self, folder):
         self.object_saver.put_project_object(
@@ -18,10 +18,12 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import f1_score, accuracy_score
 from sklearn.metrics import classification_report, confusion_matrix
+from boosting_decision_making.shared_tfidf_vectorizer import SharedTfidfVectorizer
 from utils import utils
 import pandas as pd
 import os
 import pickle
+import threading
 from collections import Counter
 
 
@@ -31,6 +33,8 @@ class DefectTypeModel:
         self.folder = folder
         self.count_vectorizer_models = {}
         self.models = {}
+        self.shared_vectorizer = SharedTfidfVectorizer()
+        self.shared_vectorizer_lock = threading.Lock()
         self.is_global = True
         if self.folder:
             self.load_model(folder)
@@ -49,6 +53,7 @@ class DefectTypeModel:
             self.count_vectorizer_models = pickle.load(f)
         with open(os.path.join(folder, "models.pickle"), "rb") as f:
             self.models = pickle.load(f)
+        self.shared_vectorizer = SharedTfidfVectorizer(self.count_vectorizer_models)
 
     def save_model(self, folder):
         os.makedirs(folder, exist_ok=True)
@@ -57,19 +62,20 @@ class DefectTypeModel:
         with open(os.path.join(folder, "models.pickle"), "wb") as f:
             pickle.dump(self.models, f)
 
-    def train_model(self, name, train_data_x, labels):
+    def train_model(self, name, train_data_x, labels, random_state=None):
         self.count_vectorizer_models[name] = TfidfVectorizer(
             binary=True, stop_words="english", min_df=5,
             token_pattern=r"[\w\._]+", analyzer=utils.preprocess_words)
         transformed_values = self.count_vectorizer_models[name].fit_transform(train_data_x)
         print("Length of train data: ", len(labels))
         print("Label distribution:", Counter(labels))
-        model = RandomForestClassifier(class_weight="balanced")
+        model = RandomForestClassifier(class_weight="balanced", random_state=random_state)
         x_train_values = pd.DataFrame(
             transformed_values.toarray(),
             columns=self.count_vectorizer_models[name].get_feature_names())
         model.fit(x_train_values, labels)
         self.models[name] = model
+        self.shared_vectorizer = SharedTfidfVectorizer(self.count_vectorizer_models)
 
     def train_models(self, train_data):
         for name, train_data_x, labels in train_data:
@@ -99,14 +105,58 @@ class DefectTypeModel:
             results.append((name, f1, accuracy))
         return results
 
-    def predict(self, data, model_name):
-        assert model_name in self.models
-        if len(data) == 0:
-            return [], []
-        transformed_values = self.count_vectorizer_models[model_name].transform(data)
+    def get_shared_vectorizer(self):
+        """The shared vectorizer is built when the model is loaded or trained, it's rebuilt
+        as a new object, if vectorizers are changed, so predictions in other threads
+        keep using the previous one"""
+        shared_vectorizer = self.shared_vectorizer
+        if shared_vectorizer.is_synced_with(self.count_vectorizer_models):
+            return shared_vectorizer
+        with self.shared_vectorizer_lock:
+            if not self.shared_vectorizer.is_synced_with(self.count_vectorizer_models):
+                self.shared_vectorizer = SharedTfidfVectorizer(self.count_vectorizer_models)
+            return self.shared_vectorizer
+
+    def predict_by_transformed_values(self, shared_vectorizer, transformed_values, model_name):
         x_test_values = pd.DataFrame(
             transformed_values.toarray(),
-            columns=self.count_vectorizer_models[model_name].get_feature_names())
+            columns=shared_vectorizer.get_feature_names(model_name))
         predicted_labels = self.models[model_name].predict(x_test_values)
         predicted_probs = self.models[model_name].predict_proba(x_test_values)
         return predicted_labels, predicted_probs
+
+    def predict(self, data, model_name):
+        assert model_name in self.models
+        if len(data) == 0:
+            return [], []
+        shared_vectorizer = self.get_shared_vectorizer()
+        transformed_values = shared_vectorizer.transform(data, [model_name])[model_name]
+        return self.predict_by_transformed_values(shared_vectorizer, transformed_values, model_name)
+
+    def predict_with_several_models(self, data, model_names):
+        """Predicts data[i] with the model model_names[i], the texts are tokenized once"""
+        for model_name in model_names:
+            assert model_name in self.models
+        if len(data) == 0:
+            return [], []
+        unique_texts = {}
+        for text in data:
+            if text not in unique_texts:
+                unique_texts[text] = len(unique_texts)
+        shared_vectorizer = self.get_shared_vectorizer()
+        transformed_by_model = shared_vectorizer.transform(
+            list(unique_texts.keys()), set(model_names))
+        rows_by_model = {}
+        for idx, model_name in enumerate(model_names):
+            if model_name not in rows_by_model:
+                rows_by_model[model_name] = []
+            rows_by_model[model_name].append(idx)
+        predicted_labels, predicted_probs = [None] * len(data), [None] * len(data)
+        for model_name, rows in rows_by_model.items():
+            text_ids = [unique_texts[data[idx]] for idx in rows]
+            labels, probs = self.predict_by_transformed_values(
+                shared_vectorizer, transformed_by_model[model_name][text_ids], model_name)
+            for idx, label, prob in zip(rows, labels, probs):
+                predicted_labels[idx] = label
+                predicted_probs[idx] = prob
+        return predicted_labels, predicted_probs
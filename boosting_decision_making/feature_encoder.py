@@ -3,6 +3,8 @@ from sklearn.feature_extraction.text import HashingVectorizer
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.feature_extraction.text import CountVectorizer
 from sklearn.preprocessing import OneHotEncoder
+import numpy as np
+from scipy import sparse
 import re
 from utils import utils
 
@@ -108,21 +110,25 @@ class FeatureEncoder:
                 logger.error("Prepare text function is not defined for the field '%s'" % self.field_name)
         return data
 
-    def fit(self, texts):
+    def create_encoder(self, vocabulary=None):
         if self.encoding_type == "one_hot":
-            self.encoder = OneHotEncoder(handle_unknown='ignore')
+            return OneHotEncoder(handle_unknown='ignore')
         elif self.encoding_type == "hashing":
-            self.encoder = HashingVectorizer(
+            return HashingVectorizer(
                 n_features=self.max_features, ngram_range=(1, self.ngram_max), stop_words="english")
         elif self.encoding_type == "count_vector":
-            self.encoder = CountVectorizer(
+            return CountVectorizer(
                 max_features=self.max_features, ngram_range=(1, self.ngram_max),
-                binary=True, stop_words="english")
+                binary=True, stop_words="english", vocabulary=vocabulary)
         elif self.encoding_type == "tf_idf":
-            self.encoder = TfidfVectorizer(
-                max_features=self.max_features, ngram_range=(1, self.ngram_max), stop_words="english")
-        else:
-            logger.error("Encoding type '%s' is not found", self.encoding_type)
+            return TfidfVectorizer(
+                max_features=self.max_features, ngram_range=(1, self.ngram_max), stop_words="english",
+                vocabulary=vocabulary)
+        logger.error("Encoding type '%s' is not found", self.encoding_type)
+        return None
+
+    def fit(self, texts):
+        self.encoder = self.create_encoder()
         if self.encoder:
             extracted_data = self.extract_data(texts)
             logger.debug("Extracted data %d", len(extracted_data))
@@ -154,3 +160,36 @@ class FeatureEncoder:
                         "max_features": self.max_features, "additional_info": self.additional_info,
                         "encoder": self.encoder, "ngram_max": self.ngram_max}
         return feature_info
+
+    def save_to_native_feature_info(self):
+        """Saves the encoder as plain json data without pickled sklearn objects"""
+        feature_info = {"field_name": self.field_name, "encoding_type": self.encoding_type,
+                        "max_features": self.max_features, "additional_info": self.additional_info,
+                        "ngram_max": self.ngram_max}
+        if self.encoding_type in ["count_vector", "tf_idf"]:
+            feature_info["vocabulary"] = [
+                word for word, _ in sorted(self.encoder.vocabulary_.items(), key=lambda x: x[1])]
+        if self.encoding_type == "tf_idf":
+            feature_info["idf"] = [float(idf) for idf in self.encoder.idf_]
+        return feature_info
+
+    def load_from_native_feature_info(self, feature_info):
+        self.field_name = feature_info["field_name"]
+        self.encoding_type = feature_info["encoding_type"]
+        self.max_features = feature_info["max_features"]
+        self.additional_info = feature_info["additional_info"]
+        self.ngram_max = feature_info["ngram_max"]
+        vocabulary = None
+        if "vocabulary" in feature_info:
+            vocabulary = {word: idx for idx, word in enumerate(feature_info["vocabulary"])}
+        self.encoder = self.create_encoder(vocabulary=vocabulary)
+        if self.encoding_type == "one_hot":
+            self.encoder.fit([[category] for category in sorted(set(self.additional_info.values()))])
+        elif self.encoding_type == "tf_idf":
+            self.encoder._validate_vocabulary()
+            idf = np.asarray(feature_info["idf"], dtype=np.float64)
+            try:
+                self.encoder.idf_ = idf
+            except AttributeError:
+                self.encoder._tfidf._idf_diag = sparse.spdiags(
+                    idf, diags=0, m=len(idf), n=len(idf), format="csr")
@@ -0,0 +1,146 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+"""
+
+import logging
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+logger = logging.getLogger("analyzerApp.sharedTfidfVectorizer")
+
+# TfidfVectorizer params which don't influence tokenization, vectorizers differing
+# only in them can share a single analyzer pass
+WEIGHTING_PARAMS = set([
+    "binary", "norm", "use_idf", "smooth_idf", "sublinear_tf", "dtype",
+    "max_df", "min_df", "max_features", "vocabulary"])
+
+
+class LabelProjection:
+
+    def __init__(self, vectorizer, shared_vocabulary):
+        self.vectorizer = vectorizer
+        self.binary = vectorizer.binary
+        self.norm = vectorizer.norm
+        self.sublinear_tf = vectorizer.sublinear_tf
+        self.feature_names = [None] * len(vectorizer.vocabulary_)
+        shared_ids, local_ids = [], []
+        for word, local_id in vectorizer.vocabulary_.items():
+            if word not in shared_vocabulary:
+                shared_vocabulary[word] = len(shared_vocabulary)
+            self.feature_names[local_id] = word
+            shared_ids.append(shared_vocabulary[word])
+            local_ids.append(local_id)
+        self.shared_ids = np.asarray(shared_ids, dtype=np.int64)
+        self.local_ids = np.asarray(local_ids, dtype=np.int64)
+        self.idf = vectorizer.idf_ if vectorizer.use_idf else None
+        self.projection = None
+
+    def build_projection(self, shared_vocabulary_size):
+        weights = np.ones(len(self.local_ids)) if self.idf is None else self.idf[self.local_ids]
+        self.projection = sparse.csr_matrix(
+            (weights, (self.shared_ids, self.local_ids)),
+            shape=(shared_vocabulary_size, len(self.feature_names)))
+
+    def transform(self, term_counts):
+        if self.binary:
+            term_counts = term_counts.copy()
+            term_counts.data = np.ones_like(term_counts.data)
+        elif self.sublinear_tf:
+            term_counts = term_counts.copy()
+            term_counts.data = np.log(term_counts.data) + 1
+        transformed = term_counts.dot(self.projection).tocsr()
+        if self.norm:
+            transformed = normalize(transformed, norm=self.norm, copy=False)
+        return transformed
+
+
+class SharedTfidfVectorizer:
+    """Combines per label TfidfVectorizers of a defect type model, so that
+    a text is tokenized once and projected into every label's vocabulary"""
+
+    def __init__(self, count_vectorizer_models=None):
+        self.analyzers = []
+        self.shared_vocabularies = []
+        self.label_groups = {}
+        self.label_projections = {}
+        if count_vectorizer_models:
+            self.fit_from_vectorizers(count_vectorizer_models)
+
+    @staticmethod
+    def get_analyzer_key(vectorizer):
+        return repr(sorted(
+            (name, value) for name, value in vectorizer.get_params().items()
+            if name not in WEIGHTING_PARAMS))
+
+    def fit_from_vectorizers(self, count_vectorizer_models):
+        self.analyzers = []
+        self.shared_vocabularies = []
+        self.label_groups = {}
+        self.label_projections = {}
+        group_by_analyzer_key = {}
+        for label, vectorizer in count_vectorizer_models.items():
+            analyzer_key = SharedTfidfVectorizer.get_analyzer_key(vectorizer)
+            if analyzer_key not in group_by_analyzer_key:
+                group_by_analyzer_key[analyzer_key] = len(self.analyzers)
+                self.analyzers.append(vectorizer.build_analyzer())
+                self.shared_vocabularies.append({})
+            group = group_by_analyzer_key[analyzer_key]
+            self.label_groups[label] = group
+            self.label_projections[label] = LabelProjection(
+                vectorizer, self.shared_vocabularies[group])
+        for label, projection in self.label_projections.items():
+            projection.build_projection(len(self.shared_vocabularies[self.label_groups[label]]))
+        logger.debug("Combined %d vectorizers into %d analyzer groups",
+                     len(self.label_projections), len(self.analyzers))
+
+    def is_synced_with(self, count_vectorizer_models):
+        if set(count_vectorizer_models.keys()) != set(self.label_projections.keys()):
+            return False
+        for label, vectorizer in count_vectorizer_models.items():
+            if self.label_projections[label].vectorizer is not vectorizer:
+                return False
+        return True
+
+    def get_feature_names(self, label):
+        return self.label_projections[label].feature_names
+
+    def count_terms(self, data, group):
+        analyzer = self.analyzers[group]
+        shared_vocabulary = self.shared_vocabularies[group]
+        indptr, indices = [0], []
+        for text in data:
+            for word in analyzer(text):
+                if word in shared_vocabulary:
+                    indices.append(shared_vocabulary[word])
+            indptr.append(len(indices))
+        term_counts = sparse.csr_matrix(
+            (np.ones(len(indices)), np.asarray(indices, dtype=np.int64), indptr),
+            shape=(len(data), len(shared_vocabulary)))
+        term_counts.sum_duplicates()
+        return term_counts
+
+    def transform(self, data, labels):
+        """Returns a dict label -> tf-idf matrix of data for all the labels,
+        the texts are tokenized only once per analyzer group"""
+        term_counts_by_group = {}
+        transformed_by_label = {}
+        for label in labels:
+            group = self.label_groups[label]
+            if group not in term_counts_by_group:
+                term_counts_by_group[group] = self.count_terms(data, group)
+            transformed_by_label[label] = self.label_projections[label].transform(
+                term_counts_by_group[group])
+        return transformed_by_label
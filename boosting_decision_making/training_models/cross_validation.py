@@ -0,0 +1,107 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+"""
+
+import os
+import logging
+import multiprocessing
+from time import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from threadpoolctl import threadpool_limits
+
+logger = logging.getLogger("analyzerApp.crossValidation")
+
+job_context = {}
+
+
+def get_used_memory():
+    """Returns the virtual memory size of the current process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return 0
+
+
+def set_memory_limit(memory_limit):
+    """Allows the process to allocate memory_limit more megabytes than it uses now"""
+    if memory_limit <= 0 or resource is None:
+        return
+    limit = get_used_memory() + memory_limit * 1024 * 1024
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_AS)
+    if hard_limit != resource.RLIM_INFINITY:
+        limit = min(limit, hard_limit)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard_limit))
+
+
+def init_job_process(context, memory_limit):
+    """Jobs are run in one thread, processes run in parallel instead. The limit
+    covers OpenMP used by xgboost and BLAS used by numpy and sklearn, so a forked
+    process doesn't start the thread pools inherited from the parent process"""
+    job_context.update(context)
+    threadpool_limits(limits=1)
+    set_memory_limit(memory_limit)
+
+
+def call_job(job, context, args):
+    try:
+        return job(context, *args)
+    except Exception as err:
+        logger.error(err)
+        return err
+
+
+def run_job(job, args):
+    return call_job(job, job_context, args)
+
+
+def run_jobs(job, jobs_args, context, processes_num=1, memory_limit=0):
+    """Runs job(context, *args) for each args from jobs_args and returns the results
+    in the order of jobs_args, a failed job returns its exception as the result,
+    a job exceeding the memory limit returns MemoryError. With processes_num > 1 jobs
+    run in processes, which may allocate memory_limit megabytes for jobs. Jobs run
+    in the current process only if the processes can't be created.
+
+    The processes are forked: the analyzer runs under uwsgi, so spawned processes
+    can't start the python interpreter, and the context with the loaded models isn't
+    pickled. The forked processes only run jobs on the context: they don't use
+    the connections or the threads of the parent process, their OpenMP and BLAS
+    code runs in one thread, so the thread pools of the parent aren't used,
+    and the logging locks are reinitialized after fork by python itself"""
+    if processes_num > 1 and len(jobs_args) > 1:
+        executor = None
+        try:
+            processes_num = min(processes_num, len(jobs_args))
+            executor = ProcessPoolExecutor(max_workers=processes_num,
+                                           mp_context=multiprocessing.get_context("fork"),
+                                           initializer=init_job_process,
+                                           initargs=(context, memory_limit))
+        except Exception as err:
+            logger.error("Failed to create processes for jobs")
+            logger.error(err)
+        if executor is not None:
+            t_start = time()
+            with executor:
+                results = list(executor.map(run_job, [job] * len(jobs_args), jobs_args))
+            logger.debug("Finished %d jobs in %d processes for %.2f s",
+                         len(jobs_args), processes_num, time() - t_start)
+            return results
+    return [call_job(job, context, args) for args in jobs_args]
@@ -0,0 +1,102 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+"""
+
+import hashlib
+import json
+import logging
+import numpy as np
+from commons.object_saving.object_saver import ObjectSaver
+
+logger = logging.getLogger("analyzerApp.featuresCache")
+
+
+class FeaturesCache:
+    """Keeps features of suggest info records calculated for model retraining
+    in the project storage. Features are kept by columns: the ids of records and
+    a matrix of feature values with a column for every feature id"""
+
+    def __init__(self, app_config, project_id, model_type):
+        self.object_saver = ObjectSaver(app_config)
+        self.project_id = project_id
+        self.object_name = "%s_features_cache" % model_type
+        self.version = ""
+        self.feature_ids = []
+        self.rows_by_id = {}
+        self.row_ids_to_keep = set()
+        self.updated = False
+
+    @staticmethod
+    def calculate_version(version_info):
+        return hashlib.sha1(
+            json.dumps(version_info, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def load(self, feature_ids, version_info):
+        """Loads the cached features, they are ignored if they were calculated
+        for other feature ids or with other version info"""
+        self.feature_ids = list(feature_ids)
+        self.version = self.calculate_version([self.feature_ids, version_info])
+        self.rows_by_id = {}
+        self.row_ids_to_keep = set()
+        self.updated = False
+        try:
+            saved_cache = self.object_saver.get_project_object(
+                self.project_id, self.object_name, using_json=False)
+            if saved_cache and saved_cache["version"] == self.version:
+                for idx, row_id in enumerate(saved_cache["ids"]):
+                    self.rows_by_id[str(row_id)] = saved_cache["features"][idx]
+            elif saved_cache:
+                logger.debug("Cached features of '%s' are outdated", self.object_name)
+                self.updated = True
+        except Exception as err:
+            logger.error(err)
+        logger.debug("Loaded %d cached feature rows of '%s'", len(self.rows_by_id), self.object_name)
+
+    def get(self, row_id):
+        """Returns the cached features as a dict of feature id and the feature values"""
+        if row_id not in self.rows_by_id:
+            return None
+        self.row_ids_to_keep.add(row_id)
+        row = self.rows_by_id[row_id]
+        return dict((feature, [[float(row[idx])]]) for idx, feature in enumerate(self.feature_ids))
+
+    def add(self, row_id, gathered_features):
+        """Adds the features of one record, gathered_features is a dict of feature id
+        and the feature values for one issue type, missing features are zeros"""
+        row = []
+        for feature in self.feature_ids:
+            if feature not in gathered_features or len(gathered_features[feature]) == 0:
+                row.append(0.0)
+                continue
+            if len(gathered_features[feature]) != 1 or len(gathered_features[feature][0]) != 1:
+                return
+            row.append(gathered_features[feature][0][0])
+        self.rows_by_id[row_id] = np.asarray(row, dtype=np.float64)
+        self.row_ids_to_keep.add(row_id)
+        self.updated = True
+
+    def save(self):
+        """Saves the features of the records requested or added since the loading,
+        the features of the records not found anymore are removed"""
+        if not self.updated and len(self.row_ids_to_keep) == len(self.rows_by_id):
+            return
+        row_ids = sorted(self.row_ids_to_keep)
+        features = np.zeros((len(row_ids), len(self.feature_ids)), dtype=np.float64)
+        for idx, row_id in enumerate(row_ids):
+            features[idx] = self.rows_by_id[row_id]
+        self.object_saver.put_project_object(
+            {"version": self.version, "ids": np.asarray(row_ids, dtype=str), "features": features},
+            self.project_id, self.object_name, using_json=False)
+        logger.debug("Saved %d cached feature rows of '%s'", len(row_ids), self.object_name)
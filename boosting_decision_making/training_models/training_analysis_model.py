@@ -16,12 +16,12 @@
 
 from boosting_decision_making import boosting_decision_maker, custom_boosting_decision_maker
 from boosting_decision_making.suggest_boosting_featurizer import SuggestBoostingFeaturizer
-from boosting_decision_making import weighted_similarity_calculator
+from commons import global_models
 from boosting_decision_making.feature_encoding_configurer import FeatureEncodingConfigurer
 from sklearn.model_selection import train_test_split
-import elasticsearch
-import elasticsearch.helpers
 from commons.esclient import EsClient
+from boosting_decision_making.training_models import cross_validation
+from boosting_decision_making.training_models.features_cache import FeaturesCache
 from commons import namespace_finder
 from imblearn.over_sampling import SMOTE
 from utils import utils
@@ -32,6 +32,7 @@ import logging
 from datetime import datetime
 import os
 import pickle
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger("analyzerApp.trainingAnalysisModel")
 
@@ -50,21 +51,41 @@ class AnalysisModelTraining:
         self.model_config = {
             "suggestion": self.search_cfg["RetrainSuggestBoostModelConfig"],
             "auto_analysis": self.search_cfg["RetrainAutoBoostModelConfig"]}
-        self.weighted_log_similarity_calculator = None
-        if self.search_cfg["SimilarityWeightsFolder"].strip():
-            self.weighted_log_similarity_calculator = weighted_similarity_calculator.\
-                WeightedSimilarityCalculator(folder=self.search_cfg["SimilarityWeightsFolder"])
+        self.weighted_log_similarity_calculator = global_models.get_weighted_similarity_calculator(
+            self.search_cfg)
         self.namespace_finder = namespace_finder.NamespaceFinder(app_config)
         self.model_chooser = model_chooser
         self.metrics_calculations = {
             "F1": self.calculate_F1,
             "Mean Reciprocal Rank": self.calculate_MRR
         }
-
-    def calculate_F1(self, model, x_test, y_test, test_item_ids_with_pos):
+        self.scan_threads_num = 1
+        self.scan_slices_num = 1
+        self.data_gathering_time_limit = 0
+        if "trainingScanThreadsNum" in self.app_config:
+            self.scan_threads_num = max(self.app_config["trainingScanThreadsNum"], 1)
+        if "trainingScanSlicesNum" in self.app_config:
+            self.scan_slices_num = self.app_config["trainingScanSlicesNum"]
+        if "trainingDataGatheringTimeLimit" in self.app_config:
+            self.data_gathering_time_limit = self.app_config["trainingDataGatheringTimeLimit"]
+        self.random_states = [1257, 1873, 1917, 2477, 3449,
+                              353, 4561, 5417, 6427, 2029]
+        self.cv_processes_num = 1
+        self.cv_memory_limit = 0
+        if "trainingCvProcessesNum" in self.app_config:
+            self.cv_processes_num = self.app_config["trainingCvProcessesNum"]
+        if "trainingCvMemoryLimit" in self.app_config:
+            self.cv_memory_limit = self.app_config["trainingCvMemoryLimit"]
+        self.use_features_cache = False
+        if "trainingFeaturesCache" in self.app_config:
+            self.use_features_cache = self.app_config["trainingFeaturesCache"]
+
+    @staticmethod
+    def calculate_F1(model, x_test, y_test, test_item_ids_with_pos):
         return model.validate_model(x_test, y_test)
 
-    def calculate_MRR(self, model, x_test, y_test, test_item_ids_with_pos):
+    @staticmethod
+    def calculate_MRR(model, x_test, y_test, test_item_ids_with_pos):
         res_labels, prob_labels = model.predict(x_test)
         test_item_ids_res = {}
         for i in range(len(test_item_ids_with_pos)):
@@ -115,18 +136,6 @@ class AnalysisModelTraining:
                 "data_proportion": 0.0, "baseline_mean_metric": 0.0, "new_model_mean_metric": 0.0,
                 "bad_data_proportion": 0, "metric_name": metric_name, "errors": [], "errors_count": 0}
 
-    def calculate_metrics(self, model, x_test, y_test,
-                          metrics_to_gather, test_item_ids_with_pos, new_model_results):
-        for metric in metrics_to_gather:
-            metric_res = 0.0
-            if metric in self.metrics_calculations:
-                metric_res = self.metrics_calculations[metric](
-                    model, x_test, y_test, test_item_ids_with_pos)
-            if metric not in new_model_results:
-                new_model_results[metric] = []
-            new_model_results[metric].append(metric_res)
-        return new_model_results
-
     def deduplicate_data(self, data, labels):
         data_wo_duplicates = []
         labels_wo_duplicates = []
@@ -138,7 +147,8 @@ class AnalysisModelTraining:
                 labels_wo_duplicates.append(labels[i])
         return data_wo_duplicates, labels_wo_duplicates
 
-    def split_data(self, data, labels, random_state, test_item_ids_with_pos):
+    @staticmethod
+    def split_data(data, labels, random_state, test_item_ids_with_pos):
         x_ids = [i for i in range(len(data))]
         x_train_ids, x_test_ids, y_train, y_test = train_test_split(
             x_ids, labels,
@@ -151,8 +161,6 @@ class AnalysisModelTraining:
     def train_several_times(self, data, labels, features, test_item_ids_with_pos, metrics_to_gather):
         new_model_results = {}
         baseline_model_results = {}
-        random_states = [1257, 1873, 1917, 2477, 3449,
-                         353, 4561, 5417, 6427, 2029]
         bad_data = False
 
         proportion_binary_labels = utils.calculate_proportions_for_labels(labels)
@@ -163,41 +171,42 @@ class AnalysisModelTraining:
 
         if not bad_data:
             data, labels = self.deduplicate_data(data, labels)
-            for random_state in random_states:
-                x_train, x_test, y_train, y_test, test_item_ids_with_pos_test = self.split_data(
-                    data, labels, random_state, test_item_ids_with_pos)
-                proportion_binary_labels = utils.calculate_proportions_for_labels(y_train)
-                if proportion_binary_labels < self.due_proportion_to_smote:
-                    oversample = SMOTE(ratio="minority")
-                    x_train, y_train = oversample.fit_sample(x_train, y_train)
-                self.new_model.train_model(x_train, y_train)
-                logger.debug("New model results")
-                new_model_results = self.calculate_metrics(
-                    self.new_model, x_test, y_test, metrics_to_gather,
-                    test_item_ids_with_pos_test, new_model_results)
-                logger.debug("Baseline results")
-                x_test_for_baseline = self.transform_data_from_feature_lists(
-                    x_test, features, self.baseline_model.get_feature_ids())
-                baseline_model_results = self.calculate_metrics(
-                    self.baseline_model, x_test_for_baseline, y_test,
-                    metrics_to_gather, test_item_ids_with_pos_test, baseline_model_results)
+            jobs_results = cross_validation.run_jobs(
+                train_and_validate_boosting_model, [(random_state,) for random_state in self.random_states],
+                {"data": data, "labels": labels, "features": features,
+                 "test_item_ids_with_pos": test_item_ids_with_pos,
+                 "metrics_to_gather": metrics_to_gather,
+                 "metrics_calculations": self.metrics_calculations,
+                 "due_proportion_to_smote": self.due_proportion_to_smote,
+                 "baseline_model": self.baseline_model,
+                 "new_model_config": (self.new_model.n_estimators, self.new_model.max_depth,
+                                      self.new_model.full_config, self.new_model.feature_ids,
+                                      self.new_model.monotonous_features)},
+                processes_num=self.cv_processes_num, memory_limit=self.cv_memory_limit)
+            for job_result in jobs_results:
+                if isinstance(job_result, Exception):
+                    raise job_result
+                baseline_results, new_results = job_result
+                for metric in metrics_to_gather:
+                    baseline_model_results.setdefault(metric, []).extend(baseline_results[metric])
+                    new_model_results.setdefault(metric, []).extend(new_results[metric])
         return baseline_model_results, new_model_results, bad_data
 
-    def transform_data_from_feature_lists(self, feature_list, cur_features, desired_features):
+    @staticmethod
+    def transform_data_from_feature_lists(feature_list, cur_features, desired_features):
         previously_gathered_features = utils.fill_prevously_gathered_features(feature_list, cur_features)
         gathered_data = utils.gather_feature_list(previously_gathered_features, desired_features)
         return gathered_data
 
-    def query_logs(self, project_id, log_ids_to_find):
+    def query_logs(self, project_id, log_ids_to_find, deadline=None):
         log_ids_to_find = list(log_ids_to_find)
         project_index_name = utils.unite_project_name(
             str(project_id), self.app_config["esProjectIndexPrefix"])
         batch_size = 1000
-        log_id_dict = {}
-        for i in range(int(len(log_ids_to_find) / batch_size) + 1):
-            log_ids = log_ids_to_find[i * batch_size: (i + 1) * batch_size]
-            if not log_ids:
-                continue
+        log_id_batches = [log_ids_to_find[i: i + batch_size]
+                          for i in range(0, len(log_ids_to_find), batch_size)]
+
+        def query_logs_batch(log_ids):
             ids_query = {
                 "size": self.app_config["esChunkNumber"],
                 "query": {
@@ -207,11 +216,16 @@ class AnalysisModelTraining:
                         ]
                     }
                 }}
-            for r in elasticsearch.helpers.scan(self.es_client.es_client,
-                                                query=ids_query,
-                                                index=project_index_name,
-                                                scroll="5m"):
-                log_id_dict[str(r["_id"])] = r
+            return [r for r in self.es_client.scan_by_slices(project_index_name, ids_query,
+                                                             slices_num=self.scan_slices_num,
+                                                             deadline=deadline)]
+        log_id_dict = {}
+        with ThreadPoolExecutor(max_workers=self.scan_threads_num) as executor:
+            for batch_num, found_logs in enumerate(executor.map(query_logs_batch, log_id_batches)):
+                for r in found_logs:
+                    log_id_dict[str(r["_id"])] = r
+                logger.debug("Queried %d batches of %d with logs for training",
+                             batch_num + 1, len(log_id_batches))
         return log_id_dict
 
     def get_search_query_suggest(self):
@@ -261,16 +275,18 @@ class AnalysisModelTraining:
         cur_number_of_logs_0 = 0
         cur_number_of_logs_1 = 0
         unique_saved_features = set()
+        deadline = None
+        if self.data_gathering_time_limit > 0:
+            deadline = time() + self.data_gathering_time_limit
         for query_name, query in [
                 ("auto_analysis 0s", self.get_search_query_aa(0)),
                 ("suggestion", self.get_search_query_suggest()),
                 ("auto_analysis 1s", self.get_search_query_aa(1))]:
             if cur_number_of_logs >= max_number_of_logs:
                 break
-            for res in elasticsearch.helpers.scan(self.es_client.es_client,
-                                                  query=query,
-                                                  index=index_name,
-                                                  scroll="5m"):
+            for res in self.es_client.scan_by_slices(index_name, query,
+                                                     slices_num=self.scan_slices_num,
+                                                     deadline=deadline):
                 if cur_number_of_logs >= max_number_of_logs:
                     break
                 saved_model_features = "{}|{}".format(
@@ -299,7 +315,7 @@ class AnalysisModelTraining:
                     break
             logger.debug("Query: '%s', results number: %d, number of 1s: %d",
                          query_name, cur_number_of_logs, cur_number_of_logs_1)
-        log_id_dict = self.query_logs(project_id, log_ids_to_find)
+        log_id_dict = self.query_logs(project_id, log_ids_to_find, deadline=deadline)
         return gathered_suggested_data, log_id_dict
 
     def prepare_encoders(self, features_encoding_config, logs_found):
@@ -308,11 +324,24 @@ class AnalysisModelTraining:
         _feature_encoding_configurer.prepare_encoders(logs_found)
         return _feature_encoding_configurer.feature_dict_with_encodings
 
+    def get_features_cache_version_info(self, model_type, defect_type_model_to_use, namespaces):
+        return [self.app_config["appVersion"], model_type,
+                self.get_config_for_boosting(0, model_type, namespaces),
+                defect_type_model_to_use.get_model_info()]
+
     def gather_data(self, model_type, project_id, features, defect_type_model_to_use, full_config):
         namespaces = self.namespace_finder.get_chosen_namespaces(project_id)
         gathered_suggested_data, log_id_dict = self.query_es_for_suggest_info(project_id)
         features_dict_with_saved_objects = self.prepare_encoders(
             full_config["features_encoding_config"], list(log_id_dict.values()))
+        encoded_features = [
+            feature for feature in features if feature in features_dict_with_saved_objects]
+        features_cache = None
+        if self.use_features_cache:
+            features_cache = FeaturesCache(self.app_config, project_id, model_type)
+            features_cache.load(
+                [feature for feature in features if feature not in encoded_features],
+                self.get_features_cache_version_info(model_type, defect_type_model_to_use, namespaces))
         full_data_features, labels, test_item_ids_with_pos = [], [], []
         for _suggest_res in gathered_suggested_data:
             searched_res = []
@@ -329,22 +358,36 @@ class AnalysisModelTraining:
                 searched_res = [
                     (found_logs["testItemLogId"], {"hits": {"hits": [log_relevent]}})]
             if searched_res:
-                _boosting_data_gatherer = SuggestBoostingFeaturizer(
-                    searched_res,
-                    self.get_config_for_boosting(
-                        _suggest_res["_source"]["usedLogLines"], model_type, namespaces),
-                    feature_ids=features,
-                    weighted_log_similarity_calculator=self.weighted_log_similarity_calculator,
-                    features_dict_with_saved_objects=features_dict_with_saved_objects)
-                _boosting_data_gatherer.set_defect_type_model(defect_type_model_to_use)
-                _boosting_data_gatherer.fill_prevously_gathered_features(
-                    [utils.to_number_list(_suggest_res["_source"]["modelFeatureValues"])],
-                    _suggest_res["_source"]["modelFeatureNames"])
-                feature_data, _ = _boosting_data_gatherer.gather_features_info()
+                cached_features = None
+                if features_cache is not None:
+                    cached_features = features_cache.get(str(_suggest_res["_id"]))
+                if cached_features is not None and not encoded_features:
+                    feature_data = utils.gather_feature_list(cached_features, features, to_list=True)
+                else:
+                    _boosting_data_gatherer = SuggestBoostingFeaturizer(
+                        searched_res,
+                        self.get_config_for_boosting(
+                            _suggest_res["_source"]["usedLogLines"], model_type, namespaces),
+                        feature_ids=features if cached_features is None else encoded_features,
+                        weighted_log_similarity_calculator=self.weighted_log_similarity_calculator,
+                        features_dict_with_saved_objects=features_dict_with_saved_objects)
+                    _boosting_data_gatherer.set_defect_type_model(defect_type_model_to_use)
+                    _boosting_data_gatherer.fill_prevously_gathered_features(
+                        [utils.to_number_list(_suggest_res["_source"]["modelFeatureValues"])],
+                        _suggest_res["_source"]["modelFeatureNames"])
+                    feature_data, _ = _boosting_data_gatherer.gather_features_info()
+                    gathered_features = _boosting_data_gatherer.previously_gathered_features
+                    if feature_data and cached_features is not None:
+                        gathered_features.update(cached_features)
+                        feature_data = utils.gather_feature_list(gathered_features, features, to_list=True)
+                    elif feature_data and features_cache is not None:
+                        features_cache.add(str(_suggest_res["_id"]), gathered_features)
                 if feature_data:
                     full_data_features.extend(feature_data)
                     labels.append(_suggest_res["_source"]["userChoice"])
                     test_item_ids_with_pos.append(_suggest_res["_source"]["testItem"])
+        if features_cache is not None:
+            features_cache.save()
         return np.asarray(full_data_features), np.asarray(labels),\
             test_item_ids_with_pos, features_dict_with_saved_objects
 
@@ -355,8 +398,9 @@ class AnalysisModelTraining:
 
         baseline_model_folder = os.path.basename(
             self.baseline_folders[project_info["model_type"]].strip("/").strip("\\"))
-        self.baseline_model = boosting_decision_maker.BoostingDecisionMaker(
-            folder=self.baseline_folders[project_info["model_type"]])
+        self.baseline_model = global_models.get_global_model(
+            boosting_decision_maker.BoostingDecisionMaker,
+            self.baseline_folders[project_info["model_type"]])
 
         full_config, features, monotonous_features = pickle.load(
             open(self.model_config[project_info["model_type"]], "rb"))
@@ -452,3 +496,43 @@ class AnalysisModelTraining:
 
         logger.info("Finished for %d s", time_spent)
         return len(train_data), train_log_info
+
+
+def calculate_metrics(metrics_calculations, model, x_test, y_test,
+                      metrics_to_gather, test_item_ids_with_pos, new_model_results):
+    for metric in metrics_to_gather:
+        metric_res = 0.0
+        if metric in metrics_calculations:
+            metric_res = metrics_calculations[metric](
+                model, x_test, y_test, test_item_ids_with_pos)
+        if metric not in new_model_results:
+            new_model_results[metric] = []
+        new_model_results[metric].append(metric_res)
+    return new_model_results
+
+
+def train_and_validate_boosting_model(context, random_state):
+    """Trains the new model on one split of data and validates it and the baseline model"""
+    x_train, x_test, y_train, y_test, test_item_ids_with_pos_test = AnalysisModelTraining.split_data(
+        context["data"], context["labels"], random_state, context["test_item_ids_with_pos"])
+    proportion_binary_labels = utils.calculate_proportions_for_labels(y_train)
+    if proportion_binary_labels < context["due_proportion_to_smote"]:
+        oversample = SMOTE(ratio="minority", random_state=random_state)
+        x_train, y_train = oversample.fit_sample(x_train, y_train)
+    n_estimators, max_depth, full_config, feature_ids, monotonous_features = context["new_model_config"]
+    new_model = boosting_decision_maker.BoostingDecisionMaker(
+        n_estimators=n_estimators, max_depth=max_depth)
+    new_model.add_config_info(full_config, feature_ids, monotonous_features)
+    new_model.train_model(x_train, y_train)
+    logger.debug("New model results")
+    new_model_results = calculate_metrics(
+        context["metrics_calculations"], new_model, x_test, y_test, context["metrics_to_gather"],
+        test_item_ids_with_pos_test, {})
+    logger.debug("Baseline results")
+    baseline_model = context["baseline_model"]
+    x_test_for_baseline = AnalysisModelTraining.transform_data_from_feature_lists(
+        x_test, context["features"], baseline_model.get_feature_ids())
+    baseline_model_results = calculate_metrics(
+        context["metrics_calculations"], baseline_model, x_test_for_baseline, y_test,
+        context["metrics_to_gather"], test_item_ids_with_pos_test, {})
+    return baseline_model_results, new_model_results
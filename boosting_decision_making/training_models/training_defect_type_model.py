@@ -17,6 +17,8 @@
 from boosting_decision_making import defect_type_model, custom_defect_type_model
 from sklearn.model_selection import train_test_split
 from commons.esclient import EsClient
+from boosting_decision_making.training_models import cross_validation
+from commons import global_models
 from utils import utils
 from time import time
 import scipy.stats as stats
@@ -25,8 +27,7 @@ import logging
 from datetime import datetime
 import os
 import re
-from queue import Queue
-import elasticsearch.helpers
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger("analyzerApp.trainingDefectTypeModel")
 
@@ -39,11 +40,29 @@ class DefectTypeModelTraining:
         self.label2inds = {"ab": 0, "pb": 1, "si": 2}
         self.due_proportion = 0.2
         self.es_client = EsClient(app_config=app_config, search_cfg=search_cfg)
-        self.baseline_model = defect_type_model.DefectTypeModel(
-            folder=search_cfg["GlobalDefectTypeModelFolder"])
+        self.baseline_model = global_models.get_global_model(
+            defect_type_model.DefectTypeModel, search_cfg["GlobalDefectTypeModelFolder"])
         self.model_chooser = model_chooser
+        self.scan_threads_num = 1
+        self.scan_slices_num = 1
+        self.data_gathering_time_limit = 0
+        if "trainingScanThreadsNum" in self.app_config:
+            self.scan_threads_num = max(self.app_config["trainingScanThreadsNum"], 1)
+        if "trainingScanSlicesNum" in self.app_config:
+            self.scan_slices_num = self.app_config["trainingScanSlicesNum"]
+        if "trainingDataGatheringTimeLimit" in self.app_config:
+            self.data_gathering_time_limit = self.app_config["trainingDataGatheringTimeLimit"]
+        self.random_states = [1257, 1873, 1917, 2477, 3449,
+                              353, 4561, 5417, 6427, 2029]
+        self.cv_processes_num = 1
+        self.cv_memory_limit = 0
+        if "trainingCvProcessesNum" in self.app_config:
+            self.cv_processes_num = self.app_config["trainingCvProcessesNum"]
+        if "trainingCvMemoryLimit" in self.app_config:
+            self.cv_memory_limit = self.app_config["trainingCvMemoryLimit"]
 
-    def return_similar_objects_into_sample(self, x_train_ind, y_train, data, additional_logs, label):
+    @staticmethod
+    def return_similar_objects_into_sample(x_train_ind, y_train, data, additional_logs, label):
         x_train = []
         x_train_add = []
         y_train_add = []
@@ -65,13 +84,14 @@ class DefectTypeModelTraining:
         y_train.extend(y_train_add)
         return x_train, y_train
 
+    @staticmethod
     def split_train_test(
-            self, logs_to_train_idx, data, labels_filtered,
+            logs_to_train_idx, data, labels_filtered,
             additional_logs, label, random_state=1257):
         x_train_ind, x_test_ind, y_train, y_test = train_test_split(
             logs_to_train_idx, labels_filtered,
             test_size=0.1, random_state=random_state, stratify=labels_filtered)
-        x_train, y_train = self.return_similar_objects_into_sample(
+        x_train, y_train = DefectTypeModelTraining.return_similar_objects_into_sample(
             x_train_ind, y_train, data, additional_logs, label)
         x_test = []
         for ind in x_test_ind:
@@ -108,15 +128,15 @@ class DefectTypeModelTraining:
             }
         }
 
-    def query_data(self, project, label):
+    def query_data(self, project, label, deadline=None):
         message_launch_dict = set()
         project_index_name = utils.unite_project_name(
             str(project), self.app_config["esProjectIndexPrefix"])
         data = []
-        for r in elasticsearch.helpers.scan(self.es_client.es_client,
-                                            query=self.get_message_query_by_label(
-                                                label),
-                                            index=project_index_name):
+        for r in self.es_client.scan_by_slices(project_index_name,
+                                               self.get_message_query_by_label(label),
+                                               slices_num=self.scan_slices_num,
+                                               deadline=deadline):
             detected_message = r["_source"]["detected_message_without_params_extended"]
             text_message_normalized = " ".join(sorted(
                 utils.split_words(detected_message, to_lower=True)))
@@ -154,41 +174,60 @@ class DefectTypeModelTraining:
                 "bad_data_proportion": 0, "metric_name": "F1", "errors": [], "errors_count": 0,
                 "time_spent": 0.0}
 
+    def query_label_data(self, project_id, label, deadline):
+        time_querying = time()
+        logger.debug("Label to gather data %s", label)
+        try:
+            found_data = self.query_data(project_id, label, deadline=deadline)
+        except Exception as err:
+            return label, None, err, time() - time_querying
+        time_spent = time() - time_querying
+        logger.debug("Finished quering for %d s", time_spent)
+        return label, found_data, None, time_spent
+
     def load_data_for_training(self, project_info, baseline_model, model_name):
         train_log_info = {}
         data = []
         found_sub_categories = {}
-        labels_to_find_queue = Queue()
+        labels_to_find = list(self.label2inds.keys())
         errors = []
         errors_count = 0
+        deadline = None
+        if self.data_gathering_time_limit > 0:
+            deadline = time() + self.data_gathering_time_limit
 
-        for label in self.label2inds:
-            labels_to_find_queue.put(label)
-        while not labels_to_find_queue.empty():
-            try:
-                label = labels_to_find_queue.get()
-                train_log_info[label] = self.get_info_template(
-                    project_info, label, baseline_model, model_name)
-                time_querying = time()
-                logger.debug("Label to gather data %s", label)
-                found_data = self.query_data(project_info["project_id"], label)
-                for _, _, _issue_type in found_data:
-                    if re.search(r"\w{2}_\w+", _issue_type) and _issue_type not in found_sub_categories:
-                        found_sub_categories[_issue_type] = []
-                        labels_to_find_queue.put(_issue_type)
-                if label in self.label2inds:
-                    data.extend(found_data)
-                else:
-                    found_sub_categories[label] = found_data
-                time_spent = time() - time_querying
-                logger.debug("Finished quering for %d s", time_spent)
-                train_log_info[label]["time_spent"] = time_spent
-                train_log_info[label]["data_size"] = len(found_data)
-            except Exception as err:
-                logger.error(err)
-                errors.append(utils.extract_exception(err))
-                errors_count += 1
-            labels_to_find_queue.task_done()
+        with ThreadPoolExecutor(max_workers=self.scan_threads_num) as executor:
+            while labels_to_find:
+                if deadline is not None and time() > deadline:
+                    logger.info("Data gathering stopped by the time limit, labels %s weren't queried",
+                                labels_to_find)
+                    for label in labels_to_find:
+                        del found_sub_categories[label]
+                    break
+                next_labels_to_find = []
+                for label, found_data, err, time_spent in executor.map(
+                        lambda label: self.query_label_data(project_info["project_id"], label, deadline),
+                        labels_to_find):
+                    train_log_info[label] = self.get_info_template(
+                        project_info, label, baseline_model, model_name)
+                    if err is not None:
+                        logger.error(err)
+                        errors.append(utils.extract_exception(err))
+                        errors_count += 1
+                        continue
+                    for _, _, _issue_type in found_data:
+                        if re.search(r"\w{2}_\w+", _issue_type) and _issue_type not in found_sub_categories:
+                            found_sub_categories[_issue_type] = []
+                            next_labels_to_find.append(_issue_type)
+                    if label in self.label2inds:
+                        data.extend(found_data)
+                    else:
+                        found_sub_categories[label] = found_data
+                    train_log_info[label]["time_spent"] = time_spent
+                    train_log_info[label]["data_size"] = len(found_data)
+                logger.info("Gathered data for labels %s, %d logs in total", labels_to_find,
+                            len(data) + sum(len(found_data) for found_data in found_sub_categories.values()))
+                labels_to_find = next_labels_to_find
         logger.debug("Data gathered: %d" % len(data))
         train_log_info["all"] = self.get_info_template(
             project_info, "all", baseline_model, model_name)
@@ -225,38 +264,49 @@ class DefectTypeModelTraining:
             _count_vectorizer = self.baseline_model.count_vectorizer_models[label]
             self.new_model.count_vectorizer_models[label] = _count_vectorizer
 
-    def train_several_times(self, label, data, found_sub_categories):
-        new_model_results = []
-        baseline_model_results = []
-        random_states = [1257, 1873, 1917, 2477, 3449,
-                         353, 4561, 5417, 6427, 2029]
-        bad_data = False
-
-        logs_to_train_idx, labels_filtered, data_to_train,\
-            additional_logs, proportion_binary_labels = self.creating_binary_target_data(
-                label, data, found_sub_categories)
-
-        if proportion_binary_labels < self.due_proportion:
-            logger.debug("Train data has a bad proportion: %.3f", proportion_binary_labels)
-            bad_data = True
+    def train_several_times_for_labels(self, labels, data, found_sub_categories):
+        """Trains and validates models for the labels with different random states,
+        all splits of all labels are run as jobs in parallel processes.
+        Returns baseline model results, new model results and the bad data flag
+        or the occured error for each label"""
+        results = {}
+        label_data = {}
+        for label in labels:
+            try:
+                (logs_to_train_idx, labels_filtered, data_to_train,
+                 additional_logs, proportion_binary_labels) = self.creating_binary_target_data(
+                    label, data, found_sub_categories)
+            except Exception as err:
+                results[label] = err
+                continue
+            if proportion_binary_labels < self.due_proportion:
+                logger.debug("Train data has a bad proportion: %.3f", proportion_binary_labels)
+                results[label] = ([], [], True)
+                continue
+            label_data[label] = (logs_to_train_idx, labels_filtered, data_to_train, additional_logs)
+            results[label] = ([], [], False)
+        jobs_args = [(label, random_state) for label in label_data for random_state in self.random_states]
+        jobs_results = cross_validation.run_jobs(
+            train_and_validate_defect_type_model, jobs_args,
+            {"label_data": label_data, "sub_categories": set(found_sub_categories.keys()),
+             "baseline_model": self.baseline_model},
+            processes_num=self.cv_processes_num, memory_limit=self.cv_memory_limit)
+        for (label, _), job_result in zip(jobs_args, jobs_results):
+            if isinstance(results[label], Exception):
+                continue
+            if isinstance(job_result, Exception):
+                results[label] = job_result
+                continue
+            baseline_f1, new_model_f1 = job_result
+            results[label][0].append(baseline_f1)
+            results[label][1].append(new_model_f1)
+        return results
 
-        if not bad_data:
-            for random_state in random_states:
-                x_train, x_test, y_train, y_test = self.split_train_test(
-                    logs_to_train_idx, data_to_train, labels_filtered,
-                    additional_logs, label,
-                    random_state=random_state)
-                self.new_model.train_model(label, x_train, y_train)
-                logger.debug("New model results")
-                f1, accuracy = self.new_model.validate_model(label, x_test, y_test)
-                new_model_results.append(f1)
-                if label in found_sub_categories:
-                    baseline_model_results.append(0.001)
-                else:
-                    logger.debug("Baseline results")
-                    f1, accuracy = self.baseline_model.validate_model(label, x_test, y_test)
-                    baseline_model_results.append(f1)
-        return baseline_model_results, new_model_results, bad_data
+    def train_several_times(self, label, data, found_sub_categories):
+        result = self.train_several_times_for_labels([label], data, found_sub_categories)[label]
+        if isinstance(result, Exception):
+            raise result
+        return result
 
     def train(self, project_info):
         start_time = time()
@@ -277,13 +327,18 @@ class DefectTypeModelTraining:
         f1_baseline_models = []
         errors = []
         errors_count = 0
-        for label in list(self.label2inds.keys()) + list(found_sub_categories.keys()):
+        labels_to_train = list(self.label2inds.keys()) + list(found_sub_categories.keys())
+        time_validation = time()
+        results_by_label = self.train_several_times_for_labels(labels_to_train, data, found_sub_categories)
+        validation_time_per_label = (time() - time_validation) / len(labels_to_train)
+        for label in labels_to_train:
             try:
-                time_training = time()
+                time_training = time() - validation_time_per_label
                 logger.debug("Label to train the model %s", label)
 
-                baseline_model_results, new_model_results, bad_data = self.train_several_times(
-                    label, data, found_sub_categories)
+                if isinstance(results_by_label[label], Exception):
+                    raise results_by_label[label]
+                baseline_model_results, new_model_results, bad_data = results_by_label[label]
 
                 use_custom_model = False
                 if not bad_data:
@@ -368,3 +423,24 @@ class DefectTypeModelTraining:
             train_log_info[label]["gather_date"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             train_log_info[label]["module_version"] = [self.app_config["appVersion"]]
         return len(data), train_log_info
+
+
+def train_and_validate_defect_type_model(context, label, random_state):
+    """Trains the model for the label on one split of data and validates it
+    and the baseline model, returns the error, if it occurs"""
+    try:
+        logs_to_train_idx, labels_filtered, data_to_train, additional_logs = context["label_data"][label]
+        x_train, x_test, y_train, y_test = DefectTypeModelTraining.split_train_test(
+            logs_to_train_idx, data_to_train, labels_filtered,
+            additional_logs, label, random_state=random_state)
+        new_model = defect_type_model.DefectTypeModel()
+        new_model.train_model(label, x_train, y_train, random_state=random_state)
+        logger.debug("New model results")
+        new_model_f1, _ = new_model.validate_model(label, x_test, y_test)
+        if label in context["sub_categories"]:
+            return 0.001, new_model_f1
+        logger.debug("Baseline results")
+        baseline_f1, _ = context["baseline_model"].validate_model(label, x_test, y_test)
+        return baseline_f1, new_model_f1
+    except Exception as err:
+        return err
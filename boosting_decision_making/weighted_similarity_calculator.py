@@ -15,6 +15,7 @@
 """
 
 import os
+import json
 import numpy as np
 import pickle
 import math
@@ -34,6 +35,9 @@ class WeightedSimilarityCalculator:
 
     def load_model(self, folder):
         self.folder = folder
+        if os.path.exists(os.path.join(folder, "weights.npy")):
+            self.load_native_model(folder)
+            return
         if not os.path.exists(os.path.join(folder, "weights.pickle")):
             return
         with open(os.path.join(folder, "weights.pickle"), "rb") as f:
@@ -47,6 +51,16 @@ class WeightedSimilarityCalculator:
         except: # noqa
             pass
 
+    def load_native_model(self, folder):
+        with open(os.path.join(folder, "weights_config.json"), "r") as f:
+            weights_config = json.load(f)
+        self.block_to_split = weights_config["block_to_split"]
+        self.min_log_number_in_block = weights_config["min_log_number_in_block"]
+        if "config" in weights_config:
+            self.config = weights_config["config"]
+        self.weights = np.load(os.path.join(folder, "weights.npy"), mmap_mode="r")
+        self.softmax_weights = np.load(os.path.join(folder, "softmax_weights.npy"), mmap_mode="r")
+
     def add_config_info(self, config):
         self.config = config
 
@@ -54,15 +68,15 @@ class WeightedSimilarityCalculator:
         if not os.path.exists(folder):
             os.makedirs(folder)
         if self.weights is not None:
-            with open(os.path.join(folder, "weights.pickle"), "wb") as f:
-                pickle.dump([self.block_to_split, self.min_log_number_in_block,
-                             self.weights, self.softmax_weights], f)
-            try:
-                if self.config:
-                    with open(os.path.join(folder, "config.pickle"), "wb") as f:
-                        pickle.dump(self.config, f)
-            except: # noqa
-                pass
+            weights_config = {"block_to_split": self.block_to_split,
+                              "min_log_number_in_block": self.min_log_number_in_block}
+            if getattr(self, "config", None):
+                weights_config["config"] = self.config
+            with open(os.path.join(folder, "weights_config.json"), "w") as f:
+                json.dump(weights_config, f)
+            np.save(os.path.join(folder, "weights.npy"), np.asarray(self.weights, dtype=np.float64))
+            np.save(os.path.join(folder, "softmax_weights.npy"),
+                    np.asarray(self.softmax_weights, dtype=np.float64))
 
     def message_to_array(self, detected_message_res, stacktrace_res):
         all_lines = [" ".join(utils.split_words(detected_message_res))]
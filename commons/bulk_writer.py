@@ -0,0 +1,123 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+"""
+import atexit
+import logging
+import threading
+from time import time
+from commons.launch_objects import BulkResponse
+
+logger = logging.getLogger("analyzerApp.bulkWriter")
+
+bulk_writers = {}
+bulk_writers_lock = threading.Lock()
+ENSURED_INDEX_TTL = 300
+
+
+class BufferedBulkWriter:
+    """Gathers bodies for indexing and sends them with one bulk request, when flush_size
+    bodies are gathered or flush_interval seconds have passed since the first of them.
+    With flush_interval equal to 0 bodies are sent right away.
+    Indices are checked and created once for ENSURED_INDEX_TTL seconds, they are checked
+    again after a failed bulk request, in case they were deleted by another process"""
+
+    def __init__(self, es_client, flush_size=1000, flush_interval=0):
+        self.es_client = es_client
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.bodies = []
+        self.ensured_indices = {}
+        self.flush_timer = None
+        self.lock = threading.Lock()
+        self.indices_lock = threading.Lock()
+
+    def ensure_index(self, rp_index_template, override_index_name=None):
+        index_name = rp_index_template if override_index_name is None else override_index_name
+        with self.indices_lock:
+            if index_name in self.ensured_indices and\
+                    time() - self.ensured_indices[index_name] <= ENSURED_INDEX_TTL:
+                return
+            self.es_client.create_index_for_stats_info(
+                rp_index_template, override_index_name=override_index_name)
+            self.ensured_indices[index_name] = time()
+
+    def remove_index(self, index_name):
+        """Forgets the index and drops the bodies not sent to it yet, should be
+        called when the index is deleted"""
+        with self.indices_lock:
+            self.ensured_indices.pop(index_name, None)
+        with self.lock:
+            self.bodies = [body for body in self.bodies if body["_index"] != index_name]
+
+    def _take_bodies(self):
+        bodies = self.bodies
+        self.bodies = []
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+        return bodies
+
+    def add(self, bodies):
+        """Adds bodies to the buffer, returns the bulk result, if they were sent,
+        otherwise the number of added bodies as took"""
+        bodies_to_send = None
+        with self.lock:
+            self.bodies.extend(bodies)
+            if self.flush_interval <= 0 or len(self.bodies) >= self.flush_size:
+                bodies_to_send = self._take_bodies()
+            elif self.bodies and self.flush_timer is None:
+                self.flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+        if bodies_to_send is None:
+            return BulkResponse(took=len(bodies), errors=False)
+        return self._send(bodies_to_send)
+
+    def _send(self, bodies):
+        result = self.es_client._bulk_index(bodies)
+        if result.errors:
+            logger.error("Errors while sending %d bodies", len(bodies))
+            with self.indices_lock:
+                for body in bodies:
+                    self.ensured_indices.pop(body["_index"], None)
+        return result
+
+    def flush(self):
+        with self.lock:
+            bodies = self._take_bodies()
+        if not bodies:
+            return BulkResponse(took=0, errors=False)
+        logger.debug("Flushing %d buffered bodies", len(bodies))
+        return self._send(bodies)
+
+
+def get_bulk_writer(es_client, app_config):
+    """Returns the writer shared by services with the same elasticsearch host,
+    if buffering is configured, otherwise a writer sending bodies right away"""
+    flush_interval = 0
+    flush_size = 1000
+    if "suggestInfoFlushInterval" in app_config:
+        flush_interval = app_config["suggestInfoFlushInterval"]
+    if "suggestInfoFlushSize" in app_config:
+        flush_size = app_config["suggestInfoFlushSize"]
+    if flush_interval <= 0:
+        return BufferedBulkWriter(es_client)
+    with bulk_writers_lock:
+        if es_client.host not in bulk_writers:
+            writer = BufferedBulkWriter(
+                es_client, flush_size=flush_size, flush_interval=flush_interval)
+            atexit.register(writer.flush)
+            bulk_writers[es_client.host] = writer
+        return bulk_writers[es_client.host]
@@ -0,0 +1,316 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+"""
+import logging
+import hashlib
+import threading
+from time import time
+from commons import clusterizer
+from commons.launch_objects import ClusterInfo
+from commons.object_saving.object_saver import ObjectSaver
+from utils import utils
+
+logger = logging.getLogger("analyzerApp.clusterIndex")
+
+
+def get_error_key(log):
+    return "%s|%s|%s" % (
+        " ".join(sorted(log["_source"]["found_exceptions"].split())),
+        " ".join(sorted(log["_source"]["potential_status_codes"].split())),
+        int(bool(log["_source"]["is_merged"])))
+
+
+class ClusterIndex:
+    """Keeps clusters of the recently clustered launches of the project with their
+    representative messages, so that the logs of the launch, which is clustered again
+    for update, are attached to its clusters without searching in Elasticsearch.
+    Clusters of every launch are saved in a separate object, the max_launches launches
+    with the largest ids are kept. A cluster with more than max_log_ids logs keeps only
+    the first of them and isn't used for attaching logs.
+
+    Only clusters of the same launch are looked up in the index, the groups which
+    aren't found there are searched in Elasticsearch among the logs of all launches"""
+
+    def __init__(self, app_config, max_launches=20, max_log_ids=1000):
+        self.object_saver = ObjectSaver(app_config)
+        self.max_launches = max_launches
+        self.max_log_ids = max_log_ids
+        self.index_folder = "cluster_index/"
+        self.launch_ids_by_project = {}
+        self.launch_ids_lock = threading.Lock()
+
+    def get_launch_object_name(self, launch_id):
+        return self.index_folder + str(launch_id)
+
+    def get_launch_ids(self, project_id):
+        launch_ids = []
+        for object_name in self.object_saver.get_folder_objects(project_id, self.index_folder):
+            launch_id = object_name[len(self.index_folder):]
+            if launch_id.isdigit():
+                launch_ids.append(launch_id)
+        return launch_ids
+
+    def get_saved_launch_clusters(self, project_id, launch_id):
+        launch_clusters = self.object_saver.get_project_object(
+            project_id, self.get_launch_object_name(launch_id), using_json=True)
+        if "clusters" not in launch_clusters:
+            return None
+        return launch_clusters
+
+    def save_launch_clusters(self, project_id, launch_id, launch_clusters):
+        self.object_saver.put_project_object(
+            launch_clusters, project_id, self.get_launch_object_name(launch_id), using_json=True)
+
+    def remove_cluster_index(self, project_id):
+        self.object_saver.remove_folder_objects(project_id, self.index_folder)
+        with self.launch_ids_lock:
+            self.launch_ids_by_project.pop(str(project_id), None)
+
+    def remove_launches(self, project_id, launch_ids):
+        if not launch_ids:
+            return
+        self.object_saver.remove_project_objects(
+            project_id, [self.get_launch_object_name(launch_id) for launch_id in launch_ids])
+        with self.launch_ids_lock:
+            if str(project_id) in self.launch_ids_by_project:
+                self.launch_ids_by_project[str(project_id)].difference_update(
+                    str(launch_id) for launch_id in launch_ids)
+
+    def remove_launches_by_condition(self, project_id, should_be_removed):
+        launches_to_remove = []
+        for launch_id in self.get_launch_ids(project_id):
+            launch_clusters = self.get_saved_launch_clusters(project_id, launch_id)
+            if launch_clusters is not None and should_be_removed(launch_id, launch_clusters):
+                launches_to_remove.append(launch_id)
+        self.remove_launches(project_id, launches_to_remove)
+
+    def remove_launches_with_logs(self, project_id, log_ids):
+        log_ids = set(str(log_id) for log_id in log_ids)
+
+        def has_logs(launch_id, launch_clusters):
+            for cluster in launch_clusters["clusters"].values():
+                if log_ids.intersection(cluster["log_ids"]):
+                    return True
+            return False
+        self.remove_launches_by_condition(project_id, has_logs)
+
+    def remove_launches_with_test_items(self, project_id, test_item_ids):
+        test_item_ids = set(int(test_item_id) for test_item_id in test_item_ids)
+
+        def has_test_items(launch_id, launch_clusters):
+            for cluster in launch_clusters["clusters"].values():
+                if test_item_ids.intersection(cluster["item_ids"]):
+                    return True
+            return False
+        self.remove_launches_by_condition(project_id, has_test_items)
+
+    def add_launch(self, project_id, launch_id):
+        """Remembers the saved launch, the launches of the project are listed only
+        when the project isn't known yet or has more than max_launches launches,
+        then the launches with the smallest ids are removed"""
+        project_id = str(project_id)
+        with self.launch_ids_lock:
+            launch_ids = self.launch_ids_by_project.get(project_id)
+            if launch_ids is None:
+                launch_ids = set(self.get_launch_ids(project_id))
+            launch_ids.add(str(launch_id))
+            if len(launch_ids) > self.max_launches:
+                launch_ids = sorted(
+                    set(self.get_launch_ids(project_id)).union([str(launch_id)]), key=int)
+                self.object_saver.remove_project_objects(
+                    project_id, [self.get_launch_object_name(_id)
+                                 for _id in launch_ids[:-self.max_launches]])
+                launch_ids = set(launch_ids[-self.max_launches:])
+            self.launch_ids_by_project[project_id] = launch_ids
+
+    def get_launch_clusters(self, launch_info):
+        """Returns clusters of the launch, if they were saved with the same settings"""
+        launch_clusters = self.get_saved_launch_clusters(
+            launch_info.project, launch_info.launch.launchId)
+        if launch_clusters is None:
+            return None
+        if launch_clusters["number_of_log_lines"] != launch_info.numberOfLogLines or\
+                launch_clusters["clean_numbers"] != launch_info.cleanNumbers:
+            return None
+        return launch_clusters
+
+    def find_clusters_in_index(self, launch_clusters, groups, log_dict, log_messages, log_ids,
+                               unique_errors_min_should_match):
+        """Attaches groups to the saved clusters of the launch got with get_launch_clusters,
+        returns found clusters and the groups not found in the index"""
+        t_start = time()
+        if not launch_clusters:
+            return {}, groups
+        clusters_by_error_key = {}
+        for cluster_id, cluster in launch_clusters["clusters"].items():
+            if cluster.get("log_ids_truncated"):
+                continue
+            if cluster["error_key"] not in clusters_by_error_key:
+                clusters_by_error_key[cluster["error_key"]] = []
+            clusters_by_error_key[cluster["error_key"]].append(cluster_id)
+        _clusterizer = clusterizer.Clusterizer()
+        found_clusters = {}
+        groups_not_found = {}
+        for global_group in groups:
+            first_item_ind = groups[global_group][0]
+            cluster_ids = clusters_by_error_key.get(get_error_key(log_dict[first_item_ind]), [])
+            min_should_match = utils.calculate_threshold_for_text(
+                log_messages[first_item_ind], unique_errors_min_should_match)
+            groups_part = _clusterizer.find_clusters(
+                [log_messages[first_item_ind]] + [
+                    launch_clusters["clusters"][cluster_id]["message"] for cluster_id in cluster_ids],
+                threshold=min_should_match) if cluster_ids else {}
+            found_cluster_id = None
+            for group in groups_part:
+                found_inds = [ind for ind in groups_part[group] if ind != 0]
+                if 0 in groups_part[group] and found_inds:
+                    found_cluster_id = cluster_ids[min(found_inds) - 1]
+                    break
+            if found_cluster_id is None:
+                groups_not_found[global_group] = groups[global_group]
+                continue
+            cluster = launch_clusters["clusters"][found_cluster_id]
+            new_group_log_ids = []
+            for log_id in cluster["log_ids"]:
+                if log_id in log_ids:
+                    continue
+                log_ids.add(log_id)
+                new_group_log_ids.append(log_id)
+            found_clusters[global_group] = ClusterInfo(
+                logIds=new_group_log_ids,
+                itemIds=list(cluster["item_ids"]),
+                clusterMessage=cluster["cluster_message"],
+                clusterId=int(found_cluster_id))
+        logger.debug("Found %d groups in the cluster index, %d groups are left for search for %.2f s",
+                     len(found_clusters), len(groups_not_found), time() - t_start)
+        return found_clusters, groups_not_found
+
+    def update_launch_clusters(self, clusters, cluster_representatives,
+                               log_dict, log_messages, launch_info, launch_clusters=None):
+        """Saves clusters of the launch, clusters found for update are added to
+        the saved ones got with get_launch_clusters before clustering, if the launch
+        was clustered with the same settings"""
+        launch_id = str(launch_info.launch.launchId)
+        if launch_info.forUpdate and launch_clusters is None:
+            self.remove_launches(launch_info.project, [launch_id])
+            return
+        if launch_clusters is None or not launch_info.forUpdate:
+            launch_clusters = {
+                "number_of_log_lines": launch_info.numberOfLogLines,
+                "clean_numbers": launch_info.cleanNumbers,
+                "clusters": {}}
+        for cluster in clusters:
+            cluster_id = str(cluster.clusterId)
+            if cluster_id not in launch_clusters["clusters"]:
+                representative_ind = cluster_representatives[cluster.clusterId]
+                launch_clusters["clusters"][cluster_id] = {
+                    "cluster_message": cluster.clusterMessage,
+                    "message": log_messages[representative_ind],
+                    "error_key": get_error_key(log_dict[representative_ind]),
+                    "log_ids": [],
+                    "item_ids": []}
+            saved_cluster = launch_clusters["clusters"][cluster_id]
+            saved_cluster["item_ids"] = sorted(set(saved_cluster["item_ids"]).union(cluster.itemIds))
+            if saved_cluster.get("log_ids_truncated"):
+                continue
+            saved_log_ids = set(saved_cluster["log_ids"])
+            saved_cluster["log_ids"].extend(
+                str(log_id) for log_id in cluster.logIds if str(log_id) not in saved_log_ids)
+            if len(saved_cluster["log_ids"]) > self.max_log_ids:
+                saved_cluster["log_ids"] = saved_cluster["log_ids"][:self.max_log_ids]
+                saved_cluster["log_ids_truncated"] = True
+        self.save_launch_clusters(launch_info.project, launch_id, launch_clusters)
+        self.add_launch(launch_info.project, launch_id)
+
+
+class ClusterMessagesCache:
+    """Keeps cluster ids and cluster messages of the recently clustered messages
+    of the project by fingerprints of the prepared messages, so that the messages
+    repeated across launches are assigned to their clusters without clustering"""
+
+    def __init__(self, app_config, max_messages=10000):
+        self.object_saver = ObjectSaver(app_config)
+        self.max_messages = max_messages
+        self.cache_name = "cluster_messages_cache"
+
+    def get_cache(self, project_id):
+        cache = self.object_saver.get_project_object(
+            project_id, self.cache_name, using_json=True)
+        if "messages" not in cache:
+            return {"messages": {}}
+        return cache
+
+    def remove_cache(self, project_id):
+        self.object_saver.remove_project_objects(project_id, [self.cache_name])
+
+    def get_fingerprint(self, log, log_message, launch_info):
+        return hashlib.sha1(("%s|%s|%s|%s" % (
+            launch_info.numberOfLogLines, int(bool(launch_info.cleanNumbers)),
+            get_error_key(log), log_message)).encode("utf-8")).hexdigest()
+
+    def find_cached_clusters(self, log_dict, log_messages, launch_info):
+        """Returns indices of the messages found in the cache grouped by cluster id,
+        cluster messages by cluster id and indices of the messages to cluster"""
+        t_start = time()
+        cached_messages = self.get_cache(launch_info.project)["messages"]
+        cached_clusters = {}
+        cluster_messages = {}
+        inds_to_cluster = []
+        for ind in range(len(log_messages)):
+            cached_message = None
+            if log_messages[ind].strip():
+                cached_message = cached_messages.get(
+                    self.get_fingerprint(log_dict[ind], log_messages[ind], launch_info))
+            if cached_message is None:
+                inds_to_cluster.append(ind)
+                continue
+            cluster_id, cluster_message = cached_message[0], cached_message[1]
+            if cluster_id not in cached_clusters:
+                cached_clusters[cluster_id] = []
+            cached_clusters[cluster_id].append(ind)
+            cluster_messages[cluster_id] = cluster_message
+        logger.debug("Found %d messages of %d clusters in the cache for %.2f s",
+                     len(log_messages) - len(inds_to_cluster), len(cached_clusters), time() - t_start)
+        return cached_clusters, cluster_messages, inds_to_cluster
+
+    def update_cached_clusters(self, clusters, merged_logs_to_update, log_dict, log_messages,
+                               launch_info, failed_clusters=None):
+        """Saves cluster ids and cluster messages of the clustered messages,
+        the least recently updated messages are removed above the size limit"""
+        failed_clusters = failed_clusters or {}
+        cluster_by_log_id = {}
+        for cluster in clusters:
+            for log_id in cluster.logIds:
+                cluster_by_log_id[str(log_id)] = (cluster.clusterId, cluster.clusterMessage)
+        for log_id in merged_logs_to_update:
+            cluster_by_log_id[str(log_id)] = merged_logs_to_update[log_id]
+        cache = self.get_cache(launch_info.project)
+        updated = time()
+        for ind in range(len(log_messages)):
+            if not log_messages[ind].strip():
+                continue
+            cluster_id, cluster_message = cluster_by_log_id.get(str(log_dict[ind]["_id"]), (0, ""))
+            if not cluster_id or not cluster_message or cluster_id in failed_clusters:
+                continue
+            cache["messages"][self.get_fingerprint(log_dict[ind], log_messages[ind], launch_info)] = [
+                cluster_id, cluster_message, updated]
+        if len(cache["messages"]) > self.max_messages:
+            fingerprints_to_keep = sorted(
+                cache["messages"], key=lambda fingerprint: cache["messages"][fingerprint][2],
+                reverse=True)[:self.max_messages]
+            cache["messages"] = {
+                fingerprint: cache["messages"][fingerprint] for fingerprint in fingerprints_to_keep}
+        self.object_saver.put_project_object(
+            cache, launch_info.project, self.cache_name, using_json=True)
@@ -15,9 +15,9 @@
 """
 import logging
 import hashlib
-import heapq
+import itertools
 import numpy as np
-import sklearn
+from scipy import sparse
 from sklearn.feature_extraction.text import CountVectorizer
 from time import time
 from utils import utils
@@ -25,20 +25,77 @@ from utils import utils
 logger = logging.getLogger("analyzerApp.clusterizer")
 
 
+class SimilarPairsVerifier:
+    """Checks the cosine similarity of binary vectors against the threshold recalculated
+    for the smaller number of words in the pair"""
+
+    def __init__(self, transformed_hashes, words_num, unique_words_num, thresholds, chunk_size=100000):
+        self.transformed_hashes = transformed_hashes.astype(np.int32)
+        self.words_num = words_num
+        self.unique_words_num = unique_words_num
+        self.thresholds = thresholds
+        self.chunk_size = chunk_size
+        self.inverted_norms = np.zeros(len(words_num))
+        self.inverted_norms[words_num > 0] = 1.0 / np.sqrt(words_num[words_num > 0].astype(np.float64))
+
+    def calculate_common_words_num(self, first_ids, second_ids):
+        common_words_num = []
+        for start in range(0, len(first_ids), self.chunk_size):
+            common_words_num.append(np.asarray(
+                self.transformed_hashes[first_ids[start:start + self.chunk_size]].multiply(
+                    self.transformed_hashes[second_ids[start:start + self.chunk_size]]).sum(axis=1)).ravel())
+        return np.concatenate(common_words_num)
+
+    def are_similar(self, first_ids, second_ids, common_words_num=None):
+        if not len(first_ids):
+            return np.zeros(0, dtype=bool)
+        if common_words_num is None:
+            common_words_num = self.calculate_common_words_num(first_ids, second_ids)
+        products = self.inverted_norms[first_ids] * self.inverted_norms[second_ids]
+        similarities = common_words_num * products
+        thresholds = self.thresholds[np.searchsorted(
+            self.unique_words_num, np.minimum(self.words_num[first_ids], self.words_num[second_ids]))]
+        similar = similarities >= thresholds
+        # the sparse cosine similarity sums the equal products one by one,
+        # so the pairs close to the threshold are recalculated the same way
+        for idx in np.where(np.abs(similarities - thresholds) < 1e-6)[0]:
+            similarity = 0.0
+            for _ in range(int(common_words_num[idx])):
+                similarity += products[idx]
+            similar[idx] = similarity >= thresholds[idx]
+        return similar
+
+    def update_parents(self, parents, first_ids, second_ids, common_words_num=None):
+        """Parent of the item is the first item similar to it"""
+        similar = self.are_similar(first_ids, second_ids, common_words_num=common_words_num)
+        np.minimum.at(parents, second_ids[similar], first_ids[similar])
+
+
 class Clusterizer:
 
     def __init__(self):
-        pass
+        self.n_permutations = 128
+        self.hash_prime = (1 << 31) - 1
+        self.pivots_block_size = 256
 
     def calculate_hashes(self, messages, n_gram=2, n_permutations=64):
+        """Hashes word n-grams of the messages into 64-bit integers and keeps n_permutations
+        largest hashes of every message. Hashes are the first 8 bytes of md5 digests,
+        so the chosen n-grams are the same as with comparing md5 hex digests"""
         hashes = []
+        ngram_hashes = {}
         for message in messages:
             words = message.split()
-            hash_print = set()
-            len_words = (len(words) - n_gram) if len(words) > n_gram else len(words)
-            for i in range(len_words):
-                hash_print.add(hashlib.md5(" ".join(words[i:i + n_gram]).encode("utf-8")).hexdigest())
-            hash_print = list(heapq.nlargest(n_permutations, hash_print))
+            if len(words) > n_gram:
+                ngrams = set(itertools.islice(
+                    map(" ".join, zip(*[words[i:] for i in range(n_gram)])), len(words) - n_gram))
+            else:
+                ngrams = set(" ".join(words[i:i + n_gram]) for i in range(len(words)))
+            for ngram in ngrams.difference(ngram_hashes):
+                ngram_hashes[ngram] = int.from_bytes(
+                    hashlib.md5(ngram.encode("utf-8")).digest()[:8], "big")
+            hash_print = np.unique(np.array(
+                [ngram_hashes[ngram] for ngram in ngrams], dtype=np.uint64))[-n_permutations:]
             hashes.append(hash_print)
         return hashes
 
@@ -53,56 +110,169 @@ class Clusterizer:
             for i in groups_to_check[key_word]:
                 hash_prints.append(messages[i])
             hash_groups = self.similarity_groupping(hash_prints, for_text=True, threshold=threshold)
-            new_group_id = group_id
             for key in hash_groups:
                 cluster = hash_groups[key] + group_id
-                new_group_id = max(group_id, cluster)
                 real_id = groups_to_check[key_word][key]
                 if cluster not in rearranged_groups:
                     rearranged_groups[cluster] = []
                 rearranged_groups[cluster].append(real_id)
-            new_group_id += 1
-            group_id = new_group_id
+            if hash_groups:
+                group_id += max(hash_groups.values()) + 1
         logger.debug("Time for finding groups: %.2f s", time() - start_time)
         return rearranged_groups
 
+    def transform_to_binary_vectors(self, hash_prints, for_text=True):
+        if not for_text:
+            unique_hashes, columns = np.unique(np.concatenate(hash_prints), return_inverse=True)
+            indptr = np.concatenate([[0], np.cumsum([len(hash_print) for hash_print in hash_prints])])
+            transformed_hashes = sparse.csr_matrix(
+                (np.ones(len(columns), dtype=np.int8), columns.ravel(), indptr),
+                shape=(len(hash_prints), len(unique_hashes)))
+            transformed_hashes.sort_indices()
+            return transformed_hashes
+        _count_vector = CountVectorizer(
+            binary=True, analyzer="word", token_pattern="[^ ]+", ngram_range=(2, 2))
+        return _count_vector.fit_transform(hash_prints).astype(np.int8).tocsr()
+
+    def calculate_min_hash_signatures(self, transformed_hashes, n_permutations=128, seed=1337):
+        """Calculates MinHash signatures of the binary vectors with universal hashing
+        of the feature indices, rows without features get the maximum values"""
+        random_state = np.random.RandomState(seed)
+        signatures = np.full(
+            (transformed_hashes.shape[0], n_permutations), self.hash_prime, dtype=np.uint64)
+        not_empty = np.diff(transformed_hashes.indptr) > 0
+        if not transformed_hashes.nnz:
+            return signatures
+        starts = transformed_hashes.indptr[:-1][not_empty]
+        indices = transformed_hashes.indices.astype(np.uint64)
+        for perm_num in range(n_permutations):
+            a = np.uint64(random_state.randint(1, self.hash_prime))
+            b = np.uint64(random_state.randint(0, self.hash_prime))
+            signatures[not_empty, perm_num] = np.minimum.reduceat(
+                (a * indices + b) % np.uint64(self.hash_prime), starts)
+        return signatures
+
+    def choose_rows_per_band(self, min_threshold, n_permutations, max_miss_probability=1e-6):
+        """Cosine similarity of binary vectors >= t means Jaccard similarity >= t^2,
+        so the bands are chosen to miss such pairs with a negligible probability"""
+        if min_threshold <= 0:
+            return 0
+        min_jaccard = min_threshold ** 2
+        for rows_per_band in range(n_permutations, 0, -1):
+            bands_num = n_permutations // rows_per_band
+            if (1 - min_jaccard ** rows_per_band) ** bands_num <= max_miss_probability:
+                return rows_per_band
+        return 0
+
+    def find_lsh_buckets(self, signatures, rows_per_band):
+        """Returns the matrix of bucket ids of the items in every band,
+        items without features get -1"""
+        not_empty_ids = np.where(signatures[:, 0] != self.hash_prime)[0]
+        bands_num = signatures.shape[1] // rows_per_band
+        item_bucket_ids = np.full((signatures.shape[0], bands_num), -1, dtype=np.int64)
+        buckets_num = 0
+        for band_num in range(bands_num):
+            if not len(not_empty_ids):
+                break
+            band = signatures[not_empty_ids, band_num * rows_per_band:(band_num + 1) * rows_per_band]
+            _, bucket_ids = np.unique(band, axis=0, return_inverse=True)
+            bucket_ids = bucket_ids.ravel()
+            item_bucket_ids[not_empty_ids, band_num] = bucket_ids + buckets_num
+            buckets_num += int(bucket_ids.max()) + 1
+        return item_bucket_ids
+
+    def find_parents_with_lsh(self, parents, pairs_verifier, item_bucket_ids):
+        """Items are taken as pivots in their order by blocks, each pivot is compared with
+        the next items sharing an LSH bucket with it, which don't have a parent yet"""
+        items_num, bands_num = item_bucket_ids.shape
+        member_buckets = item_bucket_ids.ravel()
+        member_items = np.repeat(np.arange(items_num), bands_num)
+        order = np.lexsort((member_items, member_buckets))
+        member_buckets, member_items = member_buckets[order], member_items[order]
+        has_parent = np.zeros(items_num, dtype=bool)
+        for start in range(0, items_num, self.pivots_block_size):
+            end = min(start + self.pivots_block_size, items_num)
+            pivot_buckets = item_bucket_ids[start:end].ravel()
+            pivots = np.repeat(np.arange(start, end), bands_num)[pivot_buckets >= 0]
+            pivot_buckets = pivot_buckets[pivot_buckets >= 0]
+            left = np.searchsorted(member_buckets, pivot_buckets, side="left")
+            sizes = np.searchsorted(member_buckets, pivot_buckets, side="right") - left
+            positions = np.repeat(left - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+            first_ids, second_ids = np.repeat(pivots, sizes), member_items[positions]
+            pair_keys = np.unique((first_ids * items_num + second_ids)[second_ids > first_ids])
+            first_ids, second_ids = pair_keys // items_num, pair_keys % items_num
+            similar = pairs_verifier.are_similar(first_ids, second_ids)
+            np.minimum.at(parents, second_ids[similar], first_ids[similar])
+            has_parent[second_ids[similar]] = True
+            members_to_keep = (member_items >= end) & ~has_parent[member_items]
+            member_buckets, member_items = member_buckets[members_to_keep], member_items[members_to_keep]
+
+    def find_parents_by_blocks(self, parents, pairs_verifier, transformed_hashes, block_size):
+        """Compares every item with the next items by blocks of rows, so that a block has
+        up to block_size^2 pairs. Only the pairs with common words are checked,
+        if all the thresholds are positive"""
+        items_num = transformed_hashes.shape[0]
+        rows_matrix = transformed_hashes.astype(np.int32).tocsr()
+        columns_matrix = rows_matrix.T.tocsc()
+        check_all_pairs = np.min(pairs_verifier.thresholds) <= 0
+        block_rows = max(1, (block_size * block_size) // items_num)
+        for start in range(0, items_num, block_rows):
+            end = min(start + block_rows, items_num)
+            common_words_num = rows_matrix[start:end].dot(columns_matrix[:, start:])
+            if check_all_pairs:
+                first_ids, second_ids = np.triu_indices(end - start, 1, items_num - start)
+                common_words_num = common_words_num.toarray()[first_ids, second_ids]
+            else:
+                common_words_num = sparse.triu(common_words_num, 1).tocoo()
+                first_ids, second_ids = common_words_num.row, common_words_num.col
+                common_words_num = common_words_num.data
+            pairs_verifier.update_parents(
+                parents, first_ids.astype(np.int64) + start, second_ids.astype(np.int64) + start,
+                common_words_num=common_words_num)
+
+    def calculate_thresholds(self, words_num, threshold):
+        unique_words_num = np.unique(words_num)
+        thresholds = np.array([utils.calculate_threshold(int(num), threshold) for num in unique_words_num])
+        return unique_words_num, thresholds
+
+    def assign_groups(self, parents):
+        """Each item gets the group of its parent, items without parents start new groups
+        numbered in the order of items, as the first group found for an item wins"""
+        roots = parents
+        while True:
+            new_roots = roots[roots]
+            if np.array_equal(new_roots, roots):
+                break
+            roots = new_roots
+        root_ids = np.where(parents == np.arange(len(parents)))[0]
+        return dict(enumerate(np.searchsorted(root_ids, roots).tolist()))
+
     def similarity_groupping(self, hash_prints, block_size=1000, for_text=True, threshold=0.95):
-        num_of_blocks = int(np.ceil(len(hash_prints) / block_size))
-        hash_groups = {}
-        global_ind = 0
-        for idx in range(num_of_blocks):
-            for jdx in range((idx + 1 if num_of_blocks > 1 else idx), num_of_blocks):
-                if for_text:
-                    _count_vector = CountVectorizer(
-                        binary=True, analyzer="word", token_pattern="[^ ]+", ngram_range=(2, 2))
-                else:
-                    _count_vector = CountVectorizer(binary=True, analyzer=lambda x: x)
-
-                block_i = hash_prints[idx * block_size: (idx + 1) * block_size]
-                block_j = hash_prints[jdx * block_size: (jdx + 1) * block_size] if num_of_blocks > 1 else []
-
-                transformed_hashes = _count_vector.fit_transform(block_i + block_j).astype(np.int8)
-                transformed_hashes_count_words = np.asarray(np.sum(transformed_hashes, axis=1))
-                similarities = sklearn.metrics.pairwise.cosine_similarity(transformed_hashes)
-
-                indices_looked = list(range(idx * block_size, idx * block_size + len(block_i))) + list(
-                    range(jdx * block_size, jdx * block_size + len(block_j)))
-
-                for seq_num_i in range(len(indices_looked)):
-                    i = indices_looked[seq_num_i]
-                    if i not in hash_groups:
-                        hash_groups[i] = global_ind
-                        global_ind += 1
-                    for seq_num_j in range(seq_num_i + 1, len(indices_looked)):
-                        j = indices_looked[seq_num_j]
-                        if j not in hash_groups:
-                            min_words_num = min(transformed_hashes_count_words[seq_num_i][0],
-                                                transformed_hashes_count_words[seq_num_j][0])
-                            recalculated_threshold = utils.calculate_threshold(
-                                min_words_num, threshold)
-                            if similarities[seq_num_i][seq_num_j] >= recalculated_threshold:
-                                hash_groups[j] = hash_groups[i]
-        return hash_groups
+        """Groups items with the cosine similarity above the threshold. All pairs are compared
+        by blocks for up to block_size items or for thresholds too low for LSH, for bigger
+        inputs candidate pairs are taken from the MinHash LSH index and verified with
+        the exact cosine similarity"""
+        if not len(hash_prints):
+            return {}
+        transformed_hashes = self.transform_to_binary_vectors(hash_prints, for_text=for_text)
+        words_num = np.asarray(transformed_hashes.sum(axis=1)).ravel()
+        unique_words_num, thresholds = self.calculate_thresholds(words_num, threshold)
+        pairs_verifier = SimilarPairsVerifier(
+            transformed_hashes, words_num, unique_words_num, thresholds)
+        parents = np.arange(len(hash_prints))
+
+        rows_per_band = 0
+        if len(hash_prints) > block_size:
+            rows_per_band = self.choose_rows_per_band(np.min(thresholds), self.n_permutations)
+        if not rows_per_band:
+            self.find_parents_by_blocks(parents, pairs_verifier, transformed_hashes, block_size)
+            return self.assign_groups(parents)
+
+        signatures = self.calculate_min_hash_signatures(
+            transformed_hashes, n_permutations=self.n_permutations)
+        self.find_parents_with_lsh(
+            parents, pairs_verifier, self.find_lsh_buckets(signatures, rows_per_band))
+        return self.assign_groups(parents)
 
     def unite_groups_by_hashes(self, messages, threshold=0.95):
         start_time = time()
@@ -153,3 +323,8 @@ class Clusterizer:
                 new_log_ids.extend(ids_with_duplicates[idx])
             new_groups[cluster] = new_log_ids
         return new_groups
+
+
+def find_clusters(messages, threshold=0.95):
+    """Finds clusters with a new clusterizer, it's used for clustering in separate processes"""
+    return Clusterizer().find_clusters(messages, threshold=threshold)
@@ -14,8 +14,10 @@
 * limitations under the License.
 """
 
+import copy
 import json
 import logging
+import threading
 import requests
 import urllib3
 import traceback
@@ -26,8 +28,10 @@ from elasticsearch import RequestsHttpConnection
 import utils.utils as utils
 from time import time
 from commons.log_merger import LogMerger
-from queue import Queue
+from queue import Queue, Empty, Full
+from concurrent.futures import ThreadPoolExecutor
 from commons.log_preparation import LogPreparation
+from commons import suggest_cache
 from amqp.amqp import AmqpClient
 from typing import List
 
@@ -233,6 +237,7 @@ class EsClient:
         result = self._bulk_index(bodies)
         result.logResults = logs_with_exceptions
         _, num_logs_with_defect_types = self._merge_logs(test_item_ids, project_with_prefix)
+        suggest_cache.invalidate_projects([project])
         try:
             if "amqpUrl" in self.app_config and self.app_config["amqpUrl"].strip():
                 AmqpClient(self.app_config["amqpUrl"]).send_to_inner_queue(
@@ -303,15 +308,25 @@ class EsClient:
         if bodies:
             self._bulk_index(bodies)
 
-    def _recreate_index_if_needed(self, bodies, formatted_exception):
-        index_name = ""
-        if bodies:
-            index_name = bodies[0]["_index"]
-        if not index_name.strip():
-            return
-        if "'type': 'mapper_parsing_exception'" in formatted_exception or\
-                "RequestError(400, 'illegal_argument_exception'" in formatted_exception:
-            if index_name in self.tables_to_recreate:
+    def _recreate_index_if_needed(self, bodies, bulk_error):
+        """Recreates stats indices, which documents failed with mapping errors. The failed
+        indices are taken from the errors of the documents, if the whole request failed,
+        the index is recreated only if all the documents are sent to it"""
+        def is_mapping_error(error):
+            return "mapper_parsing_exception" in error or "illegal_argument_exception" in error
+        failed_indices = set()
+        if isinstance(bulk_error, elasticsearch.helpers.BulkIndexError):
+            for item_error in bulk_error.errors:
+                for item_info in item_error.values():
+                    error = item_info.get("error", {})
+                    if is_mapping_error(error.get("type", "") if isinstance(error, dict) else str(error)):
+                        failed_indices.add(item_info.get("_index"))
+        index_names = set(body["_index"] for body in bodies)
+        if isinstance(bulk_error, elasticsearch.RequestError) and len(index_names) == 1 and\
+                is_mapping_error(str(bulk_error)):
+            failed_indices.update(index_names)
+        for index_name in self.tables_to_recreate:
+            if index_name in failed_indices:
                 self.delete_index(index_name)
                 self.create_index_for_stats_info(index_name)
 
@@ -334,9 +349,9 @@ class EsClient:
                                                                    chunk_size=es_chunk_number,
                                                                    request_timeout=30,
                                                                    refresh=refresh)
-            except: # noqa
-                formatted_exception = traceback.format_exc()
-                self._recreate_index_if_needed(bodies, formatted_exception)
+            except Exception as bulk_error:
+                logger.debug(traceback.format_exc())
+                self._recreate_index_if_needed(bodies, bulk_error)
                 self.update_settings_after_read_only(host)
                 success_count, errors = elasticsearch.helpers.bulk(es_client,
                                                                    bodies,
@@ -354,6 +369,114 @@ class EsClient:
             logger.error(err)
             return commons.launch_objects.BulkResponse(took=0, errors=True)
 
+    def _streaming_bulk_index(self, bodies, refresh=True, chunk_size=None):
+        """Sends bodies taken from the iterable by chunks and yields
+        the success flag and the result info for every body in their order"""
+        es_chunk_number = self.app_config["esChunkNumber"]
+        if chunk_size is not None:
+            es_chunk_number = chunk_size
+        start_time = time()
+        success_count = 0
+        for success, info in elasticsearch.helpers.streaming_bulk(self.es_client,
+                                                                  bodies,
+                                                                  chunk_size=es_chunk_number,
+                                                                  request_timeout=30,
+                                                                  refresh=refresh,
+                                                                  raise_on_error=False,
+                                                                  raise_on_exception=False):
+            success_count += int(success)
+            yield success, info
+        logger.debug("Processed %d logs", success_count)
+        logger.debug("Finished indexing for %.2f s", time() - start_time)
+
+    def msearch_by_chunks(self, index_name, queries, chunk_size=60, threads_num=1):
+        """Sends queries to the index with msearch requests of chunk_size queries,
+        the requests are sent in threads_num threads, responses are returned
+        in the order of queries"""
+        if not queries:
+            return []
+        start_time = time()
+        query_chunks = [queries[i:i + chunk_size] for i in range(0, len(queries), chunk_size)]
+
+        def send_msearch(query_chunk):
+            body = "".join("{}\n{}\n".format(json.dumps({"index": index_name}), json.dumps(query))
+                           for query in query_chunk)
+            return self.es_client.msearch(body)["responses"]
+        if threads_num > 1 and len(query_chunks) > 1:
+            with ThreadPoolExecutor(max_workers=min(threads_num, len(query_chunks))) as executor:
+                chunk_responses = list(executor.map(send_msearch, query_chunks))
+        else:
+            chunk_responses = [send_msearch(query_chunk) for query_chunk in query_chunks]
+        logger.debug("Sent %d queries in %d msearch requests for %.2f s",
+                     len(queries), len(query_chunks), time() - start_time)
+        return [response for responses in chunk_responses for response in responses]
+
+    def scan_by_slices(self, index_name, query, slices_num=1, scroll="5m", deadline=None,
+                       progress_step=10000, queue_size=1000):
+        """Scans the index with slices_num sliced scrolls running in parallel threads
+        and yields found documents as they come. Scanning threads wait, while queue_size
+        documents are not consumed yet. Scanning is stopped, when the consumer
+        stops iterating or the deadline timestamp has passed"""
+        if slices_num <= 1 and deadline is None:
+            yield from elasticsearch.helpers.scan(self.es_client, query=query,
+                                                  index=index_name, scroll=scroll)
+            return
+        slices_num = max(slices_num, 1)
+        results_queue = Queue(maxsize=queue_size)
+        stop_event = threading.Event()
+        finished_marker = object()
+
+        def put_result(res):
+            while not stop_event.is_set():
+                try:
+                    results_queue.put(res, timeout=1)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        def scan_slice(slice_id):
+            sliced_query = query
+            if slices_num > 1:
+                sliced_query = copy.deepcopy(query)
+                sliced_query["slice"] = {"id": slice_id, "max": slices_num}
+            try:
+                for res in elasticsearch.helpers.scan(self.es_client, query=sliced_query,
+                                                      index=index_name, scroll=scroll):
+                    if not put_result(res):
+                        break
+            except Exception as err:
+                put_result(err)
+            finally:
+                put_result(finished_marker)
+        threads = [threading.Thread(target=scan_slice, args=(slice_id,), daemon=True)
+                   for slice_id in range(slices_num)]
+        for thread in threads:
+            thread.start()
+        finished_slices = 0
+        scanned_num = 0
+        try:
+            while finished_slices < slices_num:
+                if deadline is not None and time() > deadline:
+                    logger.info("Stopped scanning the index %s by the time limit, %d documents scanned",
+                                index_name, scanned_num)
+                    break
+                try:
+                    res = results_queue.get(timeout=1)
+                except Empty:
+                    continue
+                if res is finished_marker:
+                    finished_slices += 1
+                    continue
+                if isinstance(res, Exception):
+                    raise res
+                scanned_num += 1
+                if scanned_num % progress_step == 0:
+                    logger.info("Scanned %d documents from the index %s", scanned_num, index_name)
+                yield res
+        finally:
+            stop_event.set()
+
     def delete_logs(self, clean_index):
         """Delete logs from elasticsearch"""
         index_name = utils.unite_project_name(
@@ -410,9 +533,8 @@ class EsClient:
                 self.es_client.indices.put_mapping(
                     index=index_name,
                     body=utils.read_json_file("", "%s_mappings.json" % rp_aa_stats_index, to_json=True))
-            except: # noqa
-                formatted_exception = traceback.format_exc()
-                self._recreate_index_if_needed([{"_index": index_name}], formatted_exception)
+            except Exception as err:
+                self._recreate_index_if_needed([{"_index": index_name}], err)
 
     @utils.ignore_warnings
     def send_stats_info(self, stats_info):
@@ -481,6 +603,7 @@ class EsClient:
                         }
                     })
         self._bulk_index(log_update_queries)
+        suggest_cache.invalidate_projects([defect_update_info["project"]])
         items_not_updated = list(set(test_item_ids) - found_test_items)
         logger.debug("Not updated test items: %s", items_not_updated)
         if "amqpUrl" in self.app_config and self.app_config["amqpUrl"].strip():
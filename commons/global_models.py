@@ -0,0 +1,106 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+"""
+
+from boosting_decision_making import weighted_similarity_calculator
+from boosting_decision_making import defect_type_model, boosting_decision_maker
+from utils import utils
+import gc
+import logging
+import threading
+from time import time
+
+logger = logging.getLogger("analyzerApp.globalModels")
+
+loaded_models = {}
+loading_locks = {}
+loading_locks_lock = threading.Lock()
+
+
+def get_global_model(class_to_use, folder):
+    """Returns the model of class_to_use loaded from the folder, the model is loaded
+    on the first use and then the same copy is shared by all the services of the process"""
+    model_key = (class_to_use, folder)
+    if model_key in loaded_models:
+        return loaded_models[model_key]
+    with loading_locks_lock:
+        if model_key not in loading_locks:
+            loading_locks[model_key] = threading.Lock()
+        model_lock = loading_locks[model_key]
+    with model_lock:
+        if model_key not in loaded_models:
+            t_start = time()
+            loaded_models[model_key] = class_to_use(folder=folder)
+            logger.debug("Loaded %s from '%s' for %.2f s",
+                         class_to_use.__name__, folder, time() - t_start)
+    return loaded_models[model_key]
+
+
+def get_weighted_similarity_calculator(search_cfg):
+    if not search_cfg["SimilarityWeightsFolder"].strip():
+        return None
+    return get_global_model(
+        weighted_similarity_calculator.WeightedSimilarityCalculator,
+        search_cfg["SimilarityWeightsFolder"])
+
+
+def get_global_model_folders(search_cfg):
+    return {
+        "defect_type_model/": (
+            search_cfg["GlobalDefectTypeModelFolder"], defect_type_model.DefectTypeModel),
+        "suggestion_model/": (
+            search_cfg["SuggestBoostModelFolder"], boosting_decision_maker.BoostingDecisionMaker),
+        "auto_analysis_model/": (
+            search_cfg["BoostModelFolder"], boosting_decision_maker.BoostingDecisionMaker)
+    }
+
+
+def read_global_model_folders():
+    model_settings = utils.read_json_file("", "model_settings.json", to_json=True)
+    return {
+        "BoostModelFolder": model_settings["BOOST_MODEL_FOLDER"],
+        "SuggestBoostModelFolder": model_settings["SUGGEST_BOOST_MODEL_FOLDER"],
+        "SimilarityWeightsFolder": model_settings["SIMILARITY_WEIGHTS_FOLDER"],
+        "GlobalDefectTypeModelFolder": model_settings["GLOBAL_DEFECT_TYPE_MODEL_FOLDER"]
+    }
+
+
+def preload_global_models(search_cfg):
+    """Loads all the global models before worker processes are forked, the loaded objects
+    are moved out of the garbage collector tracking, so that the workers don't touch their
+    memory pages and share them copy-on-write with the parent process"""
+    t_start = time()
+    for model_name_folder, (folder, class_to_use) in get_global_model_folders(search_cfg).items():
+        if not folder.strip():
+            continue
+        try:
+            get_global_model(class_to_use, folder)
+        except Exception as err:
+            logger.error("Failed to preload global model '%s'", model_name_folder)
+            logger.error(err)
+    try:
+        get_weighted_similarity_calculator(search_cfg)
+    except Exception as err:
+        logger.error(err)
+    gc.collect()
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+    logger.info("Preloaded global models for %.2f s", time() - t_start)
+
+
+def clear_global_models():
+    with loading_locks_lock:
+        loaded_models.clear()
+        loading_locks.clear()
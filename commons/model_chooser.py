@@ -14,12 +14,13 @@
 * limitations under the License.
 """
 
-from boosting_decision_making import defect_type_model, custom_defect_type_model
-from boosting_decision_making import custom_boosting_decision_maker, boosting_decision_maker
+from boosting_decision_making import custom_defect_type_model, custom_boosting_decision_maker
 from commons.object_saving.object_saver import ObjectSaver
+from commons import global_models
 import logging
 import numpy as np
 import os
+import threading
 
 logger = logging.getLogger("analyzerApp.modelChooser")
 
@@ -38,32 +39,42 @@ class ModelChooser:
         self.initialize_global_models()
 
     def initialize_global_models(self):
-        self.global_models = {}
-        for model_name, folder, class_to_use in [
-            ("defect_type_model/",
-             self.search_cfg["GlobalDefectTypeModelFolder"], defect_type_model.DefectTypeModel),
-            ("suggestion_model/",
-             self.search_cfg["SuggestBoostModelFolder"], boosting_decision_maker.BoostingDecisionMaker),
-            ("auto_analysis_model/",
-             self.search_cfg["BoostModelFolder"], boosting_decision_maker.BoostingDecisionMaker)]:
-            if folder.strip():
-                self.global_models[model_name] = class_to_use(folder=folder)
-            else:
-                self.global_models[model_name] = None
+        """Registers global models, they are loaded lazily on the first use"""
+        self.global_model_folders = global_models.get_global_model_folders(self.search_cfg)
+
+    def get_global_model(self, model_name_folder):
+        folder, class_to_use = self.global_model_folders[model_name_folder]
+        if not folder.strip():
+            return None
+        return global_models.get_global_model(class_to_use, folder)
+
+    def warm_up_global_models(self):
+        """Loads global models in a background thread, so that the first requests
+        don't wait for the models loading"""
+        def warm_up():
+            for model_name_folder in self.global_model_folders:
+                try:
+                    self.get_global_model(model_name_folder)
+                except Exception as err:
+                    logger.error("Failed to load global model '%s'", model_name_folder)
+                    logger.error(err)
+            global_models.get_weighted_similarity_calculator(self.search_cfg)
+        thread = threading.Thread(target=warm_up, daemon=True)
+        thread.start()
+        return thread
 
     def choose_model(self, project_id, model_name_folder, custom_model_prob=1.0):
-        model = self.global_models[model_name_folder]
         prob_for_model = np.random.uniform()
         if prob_for_model > custom_model_prob:
-            return model
+            return self.get_global_model(model_name_folder)
         folders = self.object_saver.get_folder_objects(project_id, model_name_folder)
         if len(folders):
             try:
-                model = self.model_folder_mapping[model_name_folder](
+                return self.model_folder_mapping[model_name_folder](
                     self.app_config, project_id, folder=folders[0])
             except Exception as err:
                 logger.error(err)
-        return model
+        return self.get_global_model(model_name_folder)
 
     def delete_old_model(self, model_name, project_id):
         all_folders = self.object_saver.get_folder_objects(
@@ -18,9 +18,24 @@ import pickle
 import os
 import shutil
 import json
+import tempfile
+from time import time
 
 logger = logging.getLogger("analyzerApp.filesystemSaver")
 
+TEMP_FILE_PREFIX = ".tmp_"
+STALE_TEMP_FILE_AGE = 3600
+
+
+def get_file_mode():
+    """Returns the mode of the files created with open() under the current umask"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+FILE_MODE = get_file_mode()
+
 
 class FilesystemSaver:
 
@@ -45,16 +60,37 @@ class FilesystemSaver:
             filename = os.path.join(
                 self.folder_storage, project_id, object_name).replace("\\", "/")
             os.makedirs(folder_to_save, exist_ok=True)
-            with open(filename, "wb") as f:
-                if using_json:
-                    f.write(json.dumps(data).encode("utf-8"))
-                else:
-                    pickle.dump(data, f)
+            self.remove_stale_temp_files(folder_to_save)
+            fd, temp_filename = tempfile.mkstemp(dir=folder_to_save, prefix=TEMP_FILE_PREFIX)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    if using_json:
+                        f.write(json.dumps(data).encode("utf-8"))
+                    else:
+                        pickle.dump(data, f)
+                os.chmod(temp_filename, FILE_MODE)
+                os.replace(temp_filename, filename)
+            except Exception:
+                if os.path.exists(temp_filename):
+                    os.remove(temp_filename)
+                raise
             logger.debug(
                 "Saved into folder '%s' with name '%s': %s", project_id, object_name, data)
         except Exception as err:
             logger.error(err)
 
+    def remove_stale_temp_files(self, folder):
+        """Removes temporary files left by saving processes, which were stopped,
+        the files written right now by other processes are younger"""
+        for entry in os.scandir(folder):
+            if not entry.name.startswith(TEMP_FILE_PREFIX):
+                continue
+            try:
+                if time() - entry.stat().st_mtime > STALE_TEMP_FILE_AGE:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
     def get_project_object(self, project_id, object_name, using_json=False):
         try:
             filename = os.path.join(
@@ -75,7 +111,8 @@ class FilesystemSaver:
             self.folder_storage, project_id, folder).replace("\\", "/")
         if os.path.exists(folder_to_check):
             return [
-                os.path.join(folder, file_name) for file_name in os.listdir(folder_to_check)]
+                os.path.join(folder, file_name) for file_name in os.listdir(folder_to_check)
+                if not file_name.startswith(TEMP_FILE_PREFIX)]
         return []
 
     def remove_folder_objects(self, project_id, folder):
@@ -0,0 +1,113 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+
+logger = logging.getLogger("analyzerApp.localCache")
+
+TEMP_FILE_PREFIX = ".tmp_"
+CHUNK_SIZE = 1024 * 1024
+
+
+class LocalObjectCache:
+    """Keeps objects downloaded from the binary store in a local folder. An object is
+    kept by its bucket, object name and ETag, so a changed object is downloaded again.
+    The folder is used by all the processes and is kept after restarts, the least
+    recently used objects are removed when the folder size exceeds max_size bytes"""
+
+    def __init__(self, folder, max_size):
+        self.folder = folder
+        self.max_size = max_size
+        os.makedirs(self.folder, exist_ok=True)
+
+    @staticmethod
+    def get_object_key(bucket_name, object_name):
+        return hashlib.sha1(("%s/%s" % (bucket_name, object_name)).encode("utf-8")).hexdigest()
+
+    def get_file_name(self, bucket_name, object_name, etag):
+        return os.path.join(self.folder, "%s_%s" % (
+            self.get_object_key(bucket_name, object_name), re.sub(r"[^\w-]", "", etag)))
+
+    def open(self, bucket_name, object_name, etag):
+        """Returns the opened cached file of the object version or None"""
+        if not etag:
+            return None
+        file_name = self.get_file_name(bucket_name, object_name, etag)
+        try:
+            cached_file = open(file_name, "rb")
+            os.utime(file_name)
+            return cached_file
+        except OSError:
+            return None
+
+    def save(self, bucket_name, object_name, etag, data_stream):
+        """Copies the object version from data_stream into the cache instead of
+        the previous versions and returns the cached file opened before it was renamed,
+        so it can be read even if another process removes it"""
+        if not etag:
+            return None
+        self.remove(bucket_name, object_name)
+        file_name = self.get_file_name(bucket_name, object_name, etag)
+        fd, temp_file_name = tempfile.mkstemp(dir=self.folder, prefix=TEMP_FILE_PREFIX)
+        cached_file = os.fdopen(fd, "w+b")
+        try:
+            shutil.copyfileobj(data_stream, cached_file, CHUNK_SIZE)
+            cached_file.flush()
+            cached_file.seek(0)
+            os.replace(temp_file_name, file_name)
+        except Exception:
+            cached_file.close()
+            if os.path.exists(temp_file_name):
+                os.remove(temp_file_name)
+            raise
+        self.remove_least_recently_used()
+        return cached_file
+
+    def remove(self, bucket_name, object_name):
+        """Removes all the cached versions of the object"""
+        object_key = self.get_object_key(bucket_name, object_name) + "_"
+        for entry in os.scandir(self.folder):
+            if entry.name.startswith(object_key):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def remove_least_recently_used(self):
+        cached_files = []
+        for entry in os.scandir(self.folder):
+            if entry.name.startswith(TEMP_FILE_PREFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            cached_files.append((stat.st_mtime, stat.st_size, entry.path))
+        cache_size = sum(file_size for _, file_size, _ in cached_files)
+        for _, file_size, file_name in sorted(cached_files):
+            if cache_size <= self.max_size:
+                break
+            try:
+                os.remove(file_name)
+                logger.debug("Removed cached object '%s'", file_name)
+            except OSError:
+                pass
+            cache_size -= file_size
@@ -15,14 +15,22 @@
 """
 
 from minio import Minio
+from minio.error import BucketAlreadyOwnedByYou, BucketAlreadyExists
+from commons.object_saving.local_cache import LocalObjectCache
 import json
 import io
 import logging
 import pickle
+import tempfile
+import threading
+from time import time
 
 
 logger = logging.getLogger("analyzerApp.minioClient")
 
+PART_SIZE = 5 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
 
 class MinioClient:
 
@@ -40,17 +48,49 @@ class MinioClient:
             logger.info("Minio intialized %s" % app_config["minioHost"])
         except Exception as err:
             logger.error(err)
+        self.bucket_cache_ttl = 60
+        if "minioBucketCacheTtl" in self.app_config:
+            self.bucket_cache_ttl = self.app_config["minioBucketCacheTtl"]
+        self.checked_buckets = {}
+        self.checked_buckets_lock = threading.Lock()
+        self.local_cache = None
+        local_cache_size = 1024
+        if "minioLocalCacheSize" in self.app_config:
+            local_cache_size = self.app_config["minioLocalCacheSize"]
+        if "minioLocalCacheFolder" in self.app_config and self.app_config["minioLocalCacheFolder"]:
+            try:
+                self.local_cache = LocalObjectCache(
+                    self.app_config["minioLocalCacheFolder"], local_cache_size * 1024 * 1024)
+            except Exception as err:
+                logger.error(err)
+
+    def bucket_exists(self, bucket_name):
+        """Checks if the bucket exists, existing buckets are reused for bucket_cache_ttl seconds,
+        missing buckets are checked every time, because other processes can create them"""
+        with self.checked_buckets_lock:
+            if bucket_name in self.checked_buckets:
+                if time() - self.checked_buckets[bucket_name] < self.bucket_cache_ttl:
+                    return True
+        exists = self.minioClient.bucket_exists(bucket_name)
+        with self.checked_buckets_lock:
+            if exists:
+                self.checked_buckets[bucket_name] = time()
+            else:
+                self.checked_buckets.pop(bucket_name, None)
+        return exists
 
     def remove_project_objects(self, project_id, object_names):
         if self.minioClient is None:
             return
         try:
             bucket_name = project_id
-            if not self.minioClient.bucket_exists(bucket_name):
+            if not self.bucket_exists(bucket_name):
                 return
             for object_name in object_names:
                 self.minioClient.remove_object(
                     bucket_name=bucket_name, object_name=object_name)
+                if self.local_cache is not None:
+                    self.local_cache.remove(bucket_name, object_name)
         except Exception as err:
             logger.error(err)
 
@@ -59,20 +99,26 @@ class MinioClient:
             return
         try:
             bucket_name = project_id
-            if not self.minioClient.bucket_exists(bucket_name):
+            if not self.bucket_exists(bucket_name):
                 logger.debug("Creating minio bucket %s" % bucket_name)
-                self.minioClient.make_bucket(
-                    bucket_name=bucket_name, location=self.app_config["minioRegion"])
+                try:
+                    self.minioClient.make_bucket(
+                        bucket_name=bucket_name, location=self.app_config["minioRegion"])
+                except (BucketAlreadyOwnedByYou, BucketAlreadyExists):
+                    logger.debug("Minio bucket %s was created by another process" % bucket_name)
+                with self.checked_buckets_lock:
+                    self.checked_buckets[bucket_name] = time()
                 logger.debug("Created minio bucket %s" % bucket_name)
-            if using_json:
-                data_to_save = json.dumps(data).encode("utf-8")
-            else:
-                data_to_save = pickle.dumps(data)
-            data_stream = io.BytesIO(data_to_save)
-            data_stream.seek(0)
-            self.minioClient.put_object(
-                bucket_name=bucket_name, object_name=object_name,
-                data=data_stream, length=len(data_to_save))
+            with tempfile.SpooledTemporaryFile(max_size=PART_SIZE) as data_stream:
+                if using_json:
+                    data_stream.write(json.dumps(data).encode("utf-8"))
+                else:
+                    pickle.dump(data, data_stream)
+                data_length = data_stream.tell()
+                data_stream.seek(0)
+                self.minioClient.put_object(
+                    bucket_name=bucket_name, object_name=object_name,
+                    data=data_stream, length=data_length, part_size=PART_SIZE)
             logger.debug(
                 "Saved into bucket '%s' with name '%s': %s", bucket_name, object_name, data)
         except Exception as err:
@@ -82,21 +128,59 @@ class MinioClient:
         if self.minioClient is None:
             return {}
         try:
-            if not self.minioClient.bucket_exists(project_id):
+            if not self.bucket_exists(project_id):
                 return {}
-            obj = self.minioClient.get_object(
-                bucket_name=project_id, object_name=object_name)
-            return json.loads(obj.data) if using_json else pickle.loads(obj.data)
+            if self.local_cache is not None:
+                return self.get_cached_project_object(project_id, object_name, using_json=using_json)
+            return self.download_project_object(project_id, object_name, using_json=using_json)
         except Exception:
             return {}
 
+    def download_project_object(self, project_id, object_name, using_json=False):
+        obj = self.minioClient.get_object(
+            bucket_name=project_id, object_name=object_name)
+        try:
+            data_stream = io.BufferedReader(obj, CHUNK_SIZE)
+            return json.load(data_stream) if using_json else pickle.load(data_stream)
+        finally:
+            obj.close()
+            obj.release_conn()
+
+    def get_cached_project_object(self, project_id, object_name, using_json=False):
+        """Reads the object from the local cache, if the cached version has the same ETag
+        as the object in minio, otherwise downloads the object into the cache.
+        A cached file, which can't be read, is downloaded again"""
+        etag = self.minioClient.stat_object(
+            bucket_name=project_id, object_name=object_name).etag
+        if not etag:
+            return self.download_project_object(project_id, object_name, using_json=using_json)
+        cached_file = self.local_cache.open(project_id, object_name, etag)
+        if cached_file is not None:
+            try:
+                with cached_file:
+                    return json.load(cached_file) if using_json else pickle.load(cached_file)
+            except Exception as err:
+                logger.error("Failed to read cached object '%s' from bucket '%s'", object_name, project_id)
+                logger.error(err)
+                self.local_cache.remove(project_id, object_name)
+        obj = self.minioClient.get_object(
+            bucket_name=project_id, object_name=object_name)
+        try:
+            cached_file = self.local_cache.save(project_id, object_name, etag, obj)
+        finally:
+            obj.close()
+            obj.release_conn()
+        logger.debug("Cached object '%s' from bucket '%s'", object_name, project_id)
+        with cached_file:
+            return json.load(cached_file) if using_json else pickle.load(cached_file)
+
     def does_object_exists(self, project_id, object_name):
         if self.minioClient is None:
             return False
         try:
-            if not self.minioClient.bucket_exists(project_id):
+            if not self.bucket_exists(project_id):
                 return False
-            self.minioClient.get_object(
+            self.minioClient.stat_object(
                 bucket_name=project_id, object_name=object_name)
             return True
         except Exception:
@@ -106,7 +190,7 @@ class MinioClient:
         if self.minioClient is None:
             return []
         object_names = []
-        if not self.minioClient.bucket_exists(project_id):
+        if not self.bucket_exists(project_id):
             return []
         for obj in self.minioClient.list_objects(project_id, prefix=folder):
             object_names.append(obj.object_name)
@@ -115,12 +199,14 @@ class MinioClient:
     def remove_folder_objects(self, project_id, folder):
         if self.minioClient is None:
             return 0
-        if not self.minioClient.bucket_exists(project_id):
+        if not self.bucket_exists(project_id):
             return 0
         try:
             for obj in self.minioClient.list_objects(project_id, prefix=folder):
                 self.minioClient.remove_object(
                     bucket_name=project_id, object_name=obj.object_name)
+                if self.local_cache is not None:
+                    self.local_cache.remove(project_id, obj.object_name)
             return 1
         except Exception as err:
             logger.error(err)
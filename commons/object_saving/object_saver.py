@@ -14,12 +14,33 @@
 * limitations under the License.
 """
 import logging
+import os
+import threading
 from commons.object_saving.minio_client import MinioClient
 from commons.object_saving.filesystem_saver import FilesystemSaver
 
 
 logger = logging.getLogger("analyzerApp.objectSaver")
 
+minio_clients = {}
+minio_clients_lock = threading.Lock()
+
+
+def get_minio_client(app_config):
+    """Returns the minio client shared in the process, so that the connections
+    to minio and the checked buckets are reused by all the object savers"""
+    client_key = (os.getpid(), app_config["minioHost"],
+                  app_config["minioAccessKey"], app_config["minioRegion"])
+    with minio_clients_lock:
+        if client_key not in minio_clients:
+            minio_clients[client_key] = MinioClient(app_config)
+        return minio_clients[client_key]
+
+
+def clear_minio_clients():
+    with minio_clients_lock:
+        minio_clients.clear()
+
 
 class ObjectSaver:
 
@@ -35,7 +56,7 @@ class ObjectSaver:
             self.binarystore_type = self.app_config["binaryStoreType"]
 
     def create_minio(self):
-        return MinioClient(self.app_config)
+        return get_minio_client(self.app_config)
 
     def create_fs(self):
         return FilesystemSaver(self.app_config)
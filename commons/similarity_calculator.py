@@ -16,6 +16,7 @@
 
 from utils import utils
 from scipy import spatial
+from scipy import sparse
 import numpy as np
 from sklearn.feature_extraction.text import CountVectorizer
 
@@ -34,6 +35,54 @@ class SimilarityCalculator:
         }
         self.artificial_columns = ["namespaces_stacktrace"]
 
+    def prepare_field_text(self, obj, field):
+        """Returns lines of the field text of the object and the flag, if the words
+        of the lines need reweighting, empty lines are returned for empty fields"""
+        if field not in self.artificial_columns and not obj["_source"][field].strip():
+            return [], 0
+        text = []
+        needs_reweighting = 0
+        if self.config["number_of_log_lines"] == -1 and\
+                field in self.fields_mapping_for_weighting:
+            fields_to_use = self.fields_mapping_for_weighting[field]
+            text = self.weighted_similarity_calculator.message_to_array(
+                obj["_source"][fields_to_use[0]],
+                obj["_source"][fields_to_use[1]])
+        elif field == "namespaces_stacktrace":
+            gathered_lines = []
+            weights = []
+            for line in obj["_source"]["stacktrace"].split("\n"):
+                line_words = utils.split_words(
+                    line,
+                    min_word_length=self.config["min_word_length"])
+                for word in line_words:
+                    part_of_namespace = ".".join(word.split(".")[:2])
+                    if part_of_namespace in self.config["chosen_namespaces"]:
+                        gathered_lines.append(" ".join(line_words))
+                        weights.append(
+                            self.config["chosen_namespaces"][part_of_namespace])
+            if len(gathered_lines):
+                text = gathered_lines
+                self.object_id_weights[obj["_id"]] = weights
+            else:
+                text = []
+                for line in obj["_source"]["stacktrace"].split("\n"):
+                    text.append(" ".join(utils.split_words(
+                        utils.clean_from_brackets(line),
+                        min_word_length=self.config["min_word_length"])))
+                text = utils.filter_empty_lines(text)
+                self.object_id_weights[obj["_id"]] = [1] * len(text)
+        elif field.startswith("stacktrace"):
+            if utils.does_stacktrace_need_words_reweighting(obj["_source"][field]):
+                needs_reweighting = 1
+            text = self.weighted_similarity_calculator.message_to_array(
+                "", obj["_source"][field])
+        else:
+            text = utils.filter_empty_lines([" ".join(utils.split_words(
+                obj["_source"][field],
+                min_word_length=self.config["min_word_length"]))])
+        return text, needs_reweighting
+
     def find_similarity(self, all_results, fields):
         for field in fields:
             if field in self.similarity_dict:
@@ -48,58 +97,15 @@ class SimilarityCalculator:
             for log, res in all_results:
                 for obj in [log] + res["hits"]["hits"]:
                     if obj["_id"] not in log_field_ids:
-                        if field not in self.artificial_columns and not obj["_source"][field].strip():
+                        text, needs_reweighting = self.prepare_field_text(obj, field)
+                        if not text:
                             log_field_ids[obj["_id"]] = -1
                         else:
-                            text = []
-                            needs_reweighting = 0
-                            if self.config["number_of_log_lines"] == -1 and\
-                                    field in self.fields_mapping_for_weighting:
-                                fields_to_use = self.fields_mapping_for_weighting[field]
-                                text = self.weighted_similarity_calculator.message_to_array(
-                                    obj["_source"][fields_to_use[0]],
-                                    obj["_source"][fields_to_use[1]])
-                            elif field == "namespaces_stacktrace":
-                                gathered_lines = []
-                                weights = []
-                                for line in obj["_source"]["stacktrace"].split("\n"):
-                                    line_words = utils.split_words(
-                                        line,
-                                        min_word_length=self.config["min_word_length"])
-                                    for word in line_words:
-                                        part_of_namespace = ".".join(word.split(".")[:2])
-                                        if part_of_namespace in self.config["chosen_namespaces"]:
-                                            gathered_lines.append(" ".join(line_words))
-                                            weights.append(
-                                                self.config["chosen_namespaces"][part_of_namespace])
-                                if len(gathered_lines):
-                                    text = gathered_lines
-                                    self.object_id_weights[obj["_id"]] = weights
-                                else:
-                                    text = []
-                                    for line in obj["_source"]["stacktrace"].split("\n"):
-                                        text.append(" ".join(utils.split_words(
-                                            utils.clean_from_brackets(line),
-                                            min_word_length=self.config["min_word_length"])))
-                                    text = utils.filter_empty_lines(text)
-                                    self.object_id_weights[obj["_id"]] = [1] * len(text)
-                            elif field.startswith("stacktrace"):
-                                if utils.does_stacktrace_need_words_reweighting(obj["_source"][field]):
-                                    needs_reweighting = 1
-                                text = self.weighted_similarity_calculator.message_to_array(
-                                    "", obj["_source"][field])
-                            else:
-                                text = utils.filter_empty_lines([" ".join(utils.split_words(
-                                    obj["_source"][field],
-                                    min_word_length=self.config["min_word_length"]))])
-                            if not text:
-                                log_field_ids[obj["_id"]] = -1
-                            else:
-                                all_messages.extend(text)
-                                all_messages_needs_reweighting.append(needs_reweighting)
-                                log_field_ids[obj["_id"]] = [index_in_message_array,
-                                                             len(all_messages) - 1]
-                                index_in_message_array += len(text)
+                            all_messages.extend(text)
+                            all_messages_needs_reweighting.append(needs_reweighting)
+                            log_field_ids[obj["_id"]] = [index_in_message_array,
+                                                         len(all_messages) - 1]
+                            index_in_message_array += len(text)
             if all_messages:
                 needs_reweighting_wc = all_messages_needs_reweighting and\
                     sum(all_messages_needs_reweighting) == len(all_messages_needs_reweighting)
@@ -113,6 +119,61 @@ class SimilarityCalculator:
                 for key in sim_dict:
                     self.similarity_dict[field][key] = sim_dict[key]
 
+    def find_pairwise_similarity(self, objects, field):
+        """Calculates the field similarity for all pairs of the objects with one sparse
+        matrix product, the similarity is the same as the one of find_similarity
+        for the objects compared together, the namespaces column is not supported"""
+        objects_num = len(objects)
+        empty_objects = np.zeros(objects_num, dtype=bool)
+        all_messages = []
+        all_messages_needs_reweighting = []
+        row_objects = []
+        row_positions = []
+        for idx, obj in enumerate(objects):
+            text, needs_reweighting = self.prepare_field_text(obj, field)
+            if not text:
+                empty_objects[idx] = True
+                continue
+            all_messages.extend(text)
+            all_messages_needs_reweighting.append(needs_reweighting)
+            row_objects.extend([idx] * len(text))
+            row_positions.extend(range(len(text)))
+        similarity = np.zeros((objects_num, objects_num))
+        similarity[np.ix_(empty_objects, empty_objects)] = 1.0
+        if not all_messages:
+            return similarity
+        needs_reweighting_wc = sum(all_messages_needs_reweighting) == len(all_messages_needs_reweighting)
+        count_vector_matrix = CountVectorizer(
+            binary=not needs_reweighting_wc,
+            analyzer="word", token_pattern="[^ ]+").fit_transform(all_messages).astype(float).tocoo()
+        row_objects = np.asarray(row_objects)
+        rows_num = len(all_messages)
+        object_rows = sparse.csr_matrix(
+            (np.ones(rows_num), (row_objects, np.arange(rows_num))), shape=(objects_num, rows_num))
+        if needs_reweighting_wc:
+            words_sums = np.asarray((object_rows @ count_vector_matrix.tocsr())[
+                row_objects[count_vector_matrix.row], count_vector_matrix.col]).ravel()
+            count_vector_matrix.data = np.where(
+                words_sums > 1, np.maximum(0.1, 1 - words_sums * 0.2), count_vector_matrix.data)
+        weights = np.reshape(self.weighted_similarity_calculator.weights, [-1])
+        object_vectors = sparse.csr_matrix(
+            (weights[row_positions], (row_objects, np.arange(rows_num))),
+            shape=(objects_num, rows_num)) @ count_vector_matrix.tocsr()
+        object_vectors.data = np.clip(object_vectors.data, a_min=0, a_max=1)
+        norms = np.sqrt(np.asarray(object_vectors.multiply(object_vectors).sum(axis=1)).ravel())
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cosine_similarity = (object_vectors @ object_vectors.T).toarray() / np.outer(norms, norms)
+        rounded_similarity = np.round(cosine_similarity, 2)
+        # recalculate the similarity, which can be rounded differently by numpy
+        for first, second in np.argwhere(
+                np.abs(cosine_similarity * 100 - np.floor(cosine_similarity * 100) - 0.5) < 1e-6):
+            rounded_similarity[first, second] = round(1 - spatial.distance.cosine(
+                object_vectors[first].toarray()[0], object_vectors[second].toarray()[0]), 2)
+        not_empty_objects = ~empty_objects
+        similarity[np.ix_(not_empty_objects, not_empty_objects)] = rounded_similarity[
+            np.ix_(not_empty_objects, not_empty_objects)]
+        return similarity
+
     def reweight_words_weights_by_summing(self, count_vector_matrix):
         count_vector_matrix_weighted = np.zeros_like(count_vector_matrix, dtype=float)
         whole_sum_vector = np.sum(count_vector_matrix, axis=0)
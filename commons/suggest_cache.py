@@ -0,0 +1,67 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from time import time
+
+logger = logging.getLogger("analyzerApp.suggestCache")
+
+cached_suggestions = OrderedDict()
+cached_suggestions_lock = threading.Lock()
+
+
+def get_suggestions(key, ttl):
+    """Returns copies of the suggestions saved by the key and the info saved with them,
+    the first element of the key is the project id, None is returned if there are
+    no suggestions saved for the last ttl seconds"""
+    with cached_suggestions_lock:
+        if key not in cached_suggestions:
+            return None
+        saved_time, suggestions, info = cached_suggestions[key]
+        if time() - saved_time > ttl:
+            del cached_suggestions[key]
+            return None
+        cached_suggestions.move_to_end(key)
+    return [suggestion.copy() for suggestion in suggestions], info
+
+
+def save_suggestions(key, suggestions, max_size, info=None):
+    with cached_suggestions_lock:
+        cached_suggestions[key] = (
+            time(), [suggestion.copy() for suggestion in suggestions], info or {})
+        cached_suggestions.move_to_end(key)
+        while len(cached_suggestions) > max_size:
+            cached_suggestions.popitem(last=False)
+
+
+def invalidate_projects(project_ids):
+    """Removes suggestions of the projects, it's called when the data of the projects is changed.
+    The cache is kept in the process memory, so suggestions cached by other processes
+    are kept until they expire, i.e. for at most the cache ttl after the change"""
+    project_ids = set(int(project_id) for project_id in project_ids)
+    with cached_suggestions_lock:
+        keys_to_remove = [key for key in cached_suggestions if key[0] in project_ids]
+        for key in keys_to_remove:
+            del cached_suggestions[key]
+    if keys_to_remove:
+        logger.debug("Removed %d cached suggestions of the projects %s",
+                     len(keys_to_remove), project_ids)
+
+
+def clear():
+    with cached_suggestions_lock:
+        cached_suggestions.clear()
@@ -0,0 +1,27 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+
+The module is imported by the uWSGI master process before the workers are forked
+(the "shared-import" option), so the global models are loaded once and the workers
+share their memory copy-on-write instead of holding private copies.
+"""
+
+import os
+from commons import global_models
+
+
+if os.getenv("INSTANCE_TASK_TYPE", "").strip() != "train" and\
+        os.getenv("ANALYZER_PRELOAD_MODELS", "true").strip().lower() == "true":
+    global_models.preload_global_models(global_models.read_global_model_folders())
@@ -17,8 +17,9 @@ from commons.esclient import EsClient
 from utils import utils
 from commons.log_preparation import LogPreparation
 from commons.log_merger import LogMerger
-from boosting_decision_making import weighted_similarity_calculator
+from commons import global_models
 from commons import namespace_finder
+from commons import suggest_cache
 import logging
 import re
 
@@ -35,10 +36,8 @@ class AnalyzerService:
         self.log_merger = LogMerger()
         self.namespace_finder = namespace_finder.NamespaceFinder(app_config)
         self.model_chooser = model_chooser
-        self.weighted_log_similarity_calculator = None
-        if self.search_cfg["SimilarityWeightsFolder"].strip():
-            self.weighted_log_similarity_calculator = weighted_similarity_calculator.\
-                WeightedSimilarityCalculator(folder=self.search_cfg["SimilarityWeightsFolder"])
+        self.weighted_log_similarity_calculator = global_models.get_weighted_similarity_calculator(
+            self.search_cfg)
 
     def find_min_should_match_threshold(self, analyzer_config):
         return analyzer_config.minShouldMatch if analyzer_config.minShouldMatch > 0 else\
@@ -148,6 +147,7 @@ class AnalyzerService:
             deleted_models = self.model_chooser.delete_old_model(
                 model_name=model_info["model_type"] + "_model",
                 project_id=model_info["project"])
+            suggest_cache.invalidate_projects([model_info["project"]])
             logger.info("Finished removing %s models from project %d",
                         model_info["model_type"], model_info["project"])
             return deleted_models
@@ -18,6 +18,8 @@ import logging
 import utils.utils as utils
 from time import time
 from commons.esclient import EsClient
+from commons import cluster_index
+from commons import suggest_cache
 from commons.launch_objects import CleanIndexStrIds
 from service import suggest_info_service
 
@@ -32,6 +34,7 @@ class CleanIndexService:
         self.es_client = EsClient(app_config=app_config, search_cfg=search_cfg)
         self.suggest_info_service = suggest_info_service.SuggestInfoService(
             app_config=app_config, search_cfg=search_cfg)
+        self.cluster_index = cluster_index.ClusterIndex(app_config)
 
     @utils.ignore_warnings
     def delete_logs(self, clean_index):
@@ -39,6 +42,8 @@ class CleanIndexService:
         t_start = time()
         deleted_logs_cnt = self.es_client.delete_logs(clean_index)
         self.suggest_info_service.clean_suggest_info_logs(clean_index)
+        self.cluster_index.remove_launches_with_logs(clean_index.project, clean_index.ids)
+        suggest_cache.invalidate_projects([clean_index.project])
         logger.info("Finished cleaning index %.2f s", time() - t_start)
         return deleted_logs_cnt
 
@@ -48,6 +53,9 @@ class CleanIndexService:
         t_start = time()
         deleted_logs_cnt = self.es_client.remove_test_items(remove_items_info)
         self.suggest_info_service.clean_suggest_info_logs_by_test_item(remove_items_info)
+        self.cluster_index.remove_launches_with_test_items(
+            remove_items_info["project"], remove_items_info["itemsToDelete"])
+        suggest_cache.invalidate_projects([remove_items_info["project"]])
         logger.info("Finished removing test items %.2f s", time() - t_start)
         return deleted_logs_cnt
 
@@ -57,6 +65,9 @@ class CleanIndexService:
         t_start = time()
         deleted_logs_cnt = self.es_client.remove_launches(launch_remove_info)
         self.suggest_info_service.clean_suggest_info_logs_by_launch_id(launch_remove_info)
+        self.cluster_index.remove_launches(
+            launch_remove_info["project"], launch_remove_info["launch_ids"])
+        suggest_cache.invalidate_projects([launch_remove_info["project"]])
         logger.info("Finished removing launches %.2f s", time() - t_start)
         return deleted_logs_cnt
 
@@ -78,6 +89,8 @@ class CleanIndexService:
             "launch_ids": launch_ids
         }
         self.suggest_info_service.clean_suggest_info_logs_by_launch_id(launch_remove_info)
+        self.cluster_index.remove_launches(project, launch_ids)
+        suggest_cache.invalidate_projects([project])
         logger.info(
             "Finished removing logs by launch start time %.2f s", time() - t_start
         )
@@ -98,6 +111,8 @@ class CleanIndexService:
         )
         clean_index = CleanIndexStrIds(ids=log_ids, project=project)
         self.suggest_info_service.clean_suggest_info_logs(clean_index)
+        self.cluster_index.remove_launches_with_logs(project, log_ids)
+        suggest_cache.invalidate_projects([project])
         logger.info(
             "Finished removing logs by log time range %.2f s", time() - t_start
         )
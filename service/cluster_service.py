@@ -15,18 +15,20 @@
 """
 from commons.esclient import EsClient
 from commons import clusterizer
+from commons import cluster_index
 from utils import utils
 from commons.launch_objects import ClusterResult, ClusterInfo
 from commons.log_preparation import LogPreparation
 from commons.log_merger import LogMerger
-from sklearn.feature_extraction.text import CountVectorizer
-import numpy as np
 from amqp.amqp import AmqpClient
 import json
 import logging
 from time import time
 from datetime import datetime
 import hashlib
+from collections import deque
+import multiprocessing
+import os
 
 logger = logging.getLogger("analyzerApp.clusterService")
 
@@ -39,6 +41,24 @@ class ClusterService:
         self.es_client = EsClient(app_config=app_config, search_cfg=search_cfg)
         self.log_preparation = LogPreparation()
         self.log_merger = LogMerger()
+        self.cluster_index = cluster_index.ClusterIndex(app_config)
+        self.cluster_messages_cache = cluster_index.ClusterMessagesCache(app_config)
+        self.min_messages_for_parallel_clustering = 1000
+        self.clustering_pool = self.create_clustering_pool()
+
+    def create_clustering_pool(self):
+        """Creates the processes for clustering once, when the service is created.
+        The processes are forked before the threads handling requests are started,
+        so they don't inherit the locks held by other threads"""
+        processes_num = self.get_configured_processes_num()
+        if processes_num <= 1:
+            return None
+        try:
+            return multiprocessing.get_context("fork").Pool(processes_num)
+        except Exception as err:
+            logger.error("Failed to create processes for clustering")
+            logger.error(err)
+            return None
 
     def build_search_similar_items_query(self, queried_log, message,
                                          launch_info,
@@ -234,14 +254,12 @@ class ClusterService:
                     log_dict[ind]["_source"]["whole_message"],
                     number_of_log_lines, launch_info.cleanNumbers,
                     leave_log_structure=True).strip()
-        _cnt_vectorizer = CountVectorizer(
-            binary=True, analyzer="word", token_pattern="[^ ]+", ngram_range=(2, 2))
-        group_res = _cnt_vectorizer.fit_transform(group_logs).astype(np.int8)
-        res_bitwise = np.bitwise_and.reduce(group_res.toarray(), axis=0)
-        bigrams_list = []
-        for i, feature_name in enumerate(_cnt_vectorizer.get_feature_names()):
-            if res_bitwise[i] == 1:
-                bigrams_list.append(feature_name)
+        common_bigrams = None
+        for message in group_logs:
+            words = [word for word in message.lower().split(" ") if word]
+            bigrams = set(" ".join(words[i:i + 2]) for i in range(len(words) - 1))
+            common_bigrams = bigrams if common_bigrams is None else common_bigrams.intersection(bigrams)
+        bigrams_list = sorted(common_bigrams)
         hash_message = int(
             hashlib.sha1(" ".join(bigrams_list).encode("utf-8")).hexdigest(), 16) % (10 ** 16)
         hash_message = hash_message * 10 + int(not launch_info.cleanNumbers)
@@ -253,6 +271,7 @@ class ClusterService:
         merged_logs_to_update = {}
         clusters_found = {}
         cluster_message_by_id = {}
+        cluster_representatives = {}
         for group in groups:
             cnt_items = len(groups[group])
             cluster_id = 0
@@ -288,6 +307,8 @@ class ClusterService:
                 cluster_test_items.extend(test_item_ids)
                 clusters_found[cluster_id] = (cluster_log_ids, cluster_test_items)
             cluster_message_by_id[cluster_id] = cluster_message
+            if cluster_id not in cluster_representatives:
+                cluster_representatives[cluster_id] = groups[group][0]
         results_to_return = []
         for cluster_id in clusters_found:
             results_to_return.append(ClusterInfo(
@@ -295,11 +316,13 @@ class ClusterService:
                 clusterMessage=cluster_message_by_id[cluster_id],
                 logIds=clusters_found[cluster_id][0],
                 itemIds=list(set(clusters_found[cluster_id][1]))))
-        return results_to_return, len(results_to_return), merged_logs_to_update
+        return results_to_return, len(results_to_return), merged_logs_to_update, cluster_representatives
 
-    def regroup_by_error_ans_status_codes(self, log_messages, log_dict):
+    def regroup_by_error_ans_status_codes(self, log_messages, log_dict, inds_to_cluster=None):
         regroupped_by_error = {}
-        for i in range(len(log_messages)):
+        if inds_to_cluster is None:
+            inds_to_cluster = range(len(log_messages))
+        for i in inds_to_cluster:
             found_exceptions = " ".join(
                 sorted(log_dict[i]["_source"]["found_exceptions"].split()))
             potential_status_codes = " ".join(
@@ -310,32 +333,156 @@ class ClusterService:
             regroupped_by_error[group_key].append(i)
         return regroupped_by_error
 
+    def get_configured_processes_num(self):
+        if "clusteringProcessesNum" in self.app_config:
+            return self.app_config["clusteringProcessesNum"] or os.cpu_count() or 1
+        return 1
+
+    def get_clustering_processes_num(self, groups_to_cluster):
+        if self.clustering_pool is None:
+            return 1
+        processes_num = self.get_configured_processes_num()
+        messages_num = sum(len(log_messages) for log_messages in groups_to_cluster)
+        if messages_num < self.min_messages_for_parallel_clustering:
+            return 1
+        return min(processes_num, len(groups_to_cluster))
+
+    def find_clusters_for_groups(self, groups_to_cluster, threshold):
+        """Clusters independent groups of messages, the groups are clustered in the
+        processes of the clustering pool, results are returned in the order of the groups"""
+        processes_num = self.get_clustering_processes_num(groups_to_cluster)
+        if processes_num > 1:
+            try:
+                t_start = time()
+                groups_order = sorted(
+                    range(len(groups_to_cluster)), key=lambda idx: -len(groups_to_cluster[idx]))
+                found_clusters = [None] * len(groups_to_cluster)
+                async_results = {idx: self.clustering_pool.apply_async(
+                    clusterizer.find_clusters, (groups_to_cluster[idx], threshold))
+                    for idx in groups_order}
+                for idx in async_results:
+                    found_clusters[idx] = async_results[idx].get()
+                logger.debug("Clustered %d groups in %d processes for %.2f s",
+                             len(groups_to_cluster), processes_num, time() - t_start)
+                return found_clusters
+            except Exception as err:
+                logger.error("Failed to cluster groups in parallel processes")
+                logger.error(err)
+        _clusterizer = clusterizer.Clusterizer()
+        return [_clusterizer.find_clusters(log_messages, threshold=threshold)
+                for log_messages in groups_to_cluster]
+
     def cluster_messages_with_groupping_by_error(self, log_messages, log_dict,
-                                                 unique_errors_min_should_match):
+                                                 unique_errors_min_should_match,
+                                                 inds_to_cluster=None):
         regroupped_by_error = self.regroup_by_error_ans_status_codes(
-            log_messages, log_dict)
-        _clusterizer = clusterizer.Clusterizer()
+            log_messages, log_dict, inds_to_cluster=inds_to_cluster)
+        groups_to_cluster = []
+        for group_key in regroupped_by_error:
+            groups_to_cluster.append(
+                [log_messages[idx] for idx in regroupped_by_error[group_key]])
+        found_clusters = self.find_clusters_for_groups(
+            groups_to_cluster, unique_errors_min_should_match)
         all_groups = {}
         start_group_id = 0
-        for group_key in regroupped_by_error:
-            log_messages_part = []
-            log_messages_idx_dict = {}
-            for i, idx in enumerate(regroupped_by_error[group_key]):
-                log_messages_part.append(log_messages[idx])
-                log_messages_idx_dict[i] = idx
-            groups = _clusterizer.find_clusters(
-                log_messages_part,
-                threshold=unique_errors_min_should_match)
+        for group_key, groups in zip(regroupped_by_error, found_clusters):
+            if not groups:
+                continue
             max_group_id = max(groups.keys())
             for group_id in groups:
                 global_idx = start_group_id + group_id
                 if global_idx not in all_groups:
                     all_groups[global_idx] = []
                 for i in groups[group_id]:
-                    all_groups[global_idx].append(log_messages_idx_dict[i])
+                    all_groups[global_idx].append(regroupped_by_error[group_key][i])
             start_group_id = start_group_id + max_group_id + 1
         return all_groups
 
+    def cluster_messages_with_cached_clusters(self, log_messages, log_dict,
+                                              unique_errors_min_should_match,
+                                              cached_clusters, inds_to_cluster):
+        """Clusters the messages not found in the cache together with one message
+        of every cached cluster, the groups with a cached message are merged into
+        the cached clusters, so that similar new messages don't get a new cluster id"""
+        if not inds_to_cluster:
+            return {}
+        cached_representatives = {
+            cached_clusters[cluster_id][0]: cluster_id for cluster_id in cached_clusters}
+        groups = self.cluster_messages_with_groupping_by_error(
+            log_messages, log_dict, unique_errors_min_should_match,
+            inds_to_cluster=sorted(set(inds_to_cluster).union(cached_representatives)))
+        for group_id in list(groups.keys()):
+            cached_cluster_ids = [cached_representatives[ind] for ind in groups[group_id]
+                                  if ind in cached_representatives]
+            if not cached_cluster_ids:
+                continue
+            cached_clusters[cached_cluster_ids[0]].extend(
+                ind for ind in groups[group_id] if ind not in cached_representatives)
+            del groups[group_id]
+        return groups
+
+    def add_cached_clusters(self, groups, additional_results, cached_clusters, cached_cluster_messages):
+        """Adds groups of the messages found in the cluster messages cache,
+        they are assigned to the cached clusters"""
+        group_id = max(groups.keys()) + 1 if groups else 0
+        for cluster_id in cached_clusters:
+            groups[group_id] = cached_clusters[cluster_id]
+            additional_results[group_id] = ClusterInfo(
+                logIds=[], itemIds=[], clusterId=cluster_id,
+                clusterMessage=cached_cluster_messages[cluster_id])
+            group_id += 1
+        return groups, additional_results
+
+    def generate_cluster_updates(self, clusters, merged_logs_to_update, index_name,
+                                 launch_info, body_cluster_ids):
+        """Yields update bodies for the logs of the clusters,
+        log ids and cluster ids of the yielded bodies are added to body_cluster_ids"""
+        for result in clusters:
+            logger.debug("Cluster Id: %s, Cluster message: %s",
+                         result.clusterId, result.clusterMessage)
+            logger.debug("Cluster Ids: %s", result.logIds)
+            for log_id in result.logIds:
+                body_cluster_ids.append((str(log_id), result.clusterId))
+                yield {
+                    "_op_type": "update",
+                    "_id": log_id,
+                    "_index": index_name,
+                    "doc": {"cluster_id": str(result.clusterId),
+                            "cluster_message": result.clusterMessage,
+                            "cluster_with_numbers": not launch_info.cleanNumbers}}
+        for log_id in merged_logs_to_update:
+            cluster_id, cluster_message = merged_logs_to_update[log_id]
+            body_cluster_ids.append((str(log_id), cluster_id))
+            yield {
+                "_op_type": "update",
+                "_id": log_id,
+                "_index": index_name,
+                "doc": {"cluster_id": str(cluster_id),
+                        "cluster_message": cluster_message,
+                        "cluster_with_numbers": not launch_info.cleanNumbers}}
+
+    def update_clusters_in_es(self, clusters, merged_logs_to_update, index_name, launch_info):
+        """Streams cluster updates to Elasticsearch by chunks, so that update bodies
+        are not kept in memory, returns the number of failed updates by cluster id"""
+        body_cluster_ids = deque()
+        failed_clusters = {}
+        bodies = self.generate_cluster_updates(
+            clusters, merged_logs_to_update, index_name, launch_info, body_cluster_ids)
+        for success, info in self.es_client._streaming_bulk_index(
+                bodies, refresh=False, chunk_size=self.app_config["esChunkNumberUpdateClusters"]):
+            log_id = str(list(info.values())[0].get("_id", "")) if info else ""
+            cluster_id = None
+            while body_cluster_ids and cluster_id is None:
+                body_log_id, body_cluster_id = body_cluster_ids.popleft()
+                if body_log_id == log_id:
+                    cluster_id = body_cluster_id
+            if not success:
+                logger.debug("Failed to update log of the cluster %s: %s", cluster_id, info)
+                failed_clusters[cluster_id] = failed_clusters.get(cluster_id, 0) + 1
+        for cluster_id, failed_logs_num in failed_clusters.items():
+            logger.error("Failed to update %d logs of the cluster %s", failed_logs_num, cluster_id)
+        return failed_clusters
+
     @utils.ignore_warnings
     def find_clusters(self, launch_info):
         logger.info("Started clusterizing logs")
@@ -361,42 +508,42 @@ class ClusterService:
                 launch_info.cleanNumbers, index_name)
             log_ids = set([str(log["_id"]) for log in log_dict.values()])
 
-            groups = self.cluster_messages_with_groupping_by_error(
-                log_messages, log_dict,
-                unique_errors_min_should_match)
+            cached_clusters, cached_cluster_messages, inds_to_cluster =\
+                self.cluster_messages_cache.find_cached_clusters(log_dict, log_messages, launch_info)
+            groups = self.cluster_messages_with_cached_clusters(
+                log_messages, log_dict, unique_errors_min_should_match,
+                cached_clusters, inds_to_cluster)
             logger.debug("Groups: %s", groups)
+            additional_results = {}
+            groups_to_search = groups
+            launch_clusters = None
+            if launch_info.forUpdate:
+                launch_clusters = self.cluster_index.get_launch_clusters(launch_info)
+                additional_results, groups_to_search = self.cluster_index.find_clusters_in_index(
+                    launch_clusters, groups, log_dict, log_messages, log_ids,
+                    unique_errors_min_should_match)
             additional_results = self.find_similar_items_from_es(
-                groups, log_dict, log_messages,
+                groups_to_search, log_dict, log_messages,
                 log_ids, launch_info,
-                {}, unique_errors_min_should_match)
-            clusters, cluster_num, merged_logs_to_update = self.gather_cluster_results(
-                groups, additional_results, log_dict, log_messages,
-                log_ids_for_merged_logs, launch_info)
-            if clusters:
-                bodies = []
-                for result in clusters:
-                    logger.debug("Cluster Id: %s, Cluster message: %s",
-                                 result.clusterId, result.clusterMessage)
-                    logger.debug("Cluster Ids: %s", result.logIds)
-                    for log_id in result.logIds:
-                        bodies.append({
-                            "_op_type": "update",
-                            "_id": log_id,
-                            "_index": index_name,
-                            "doc": {"cluster_id": str(result.clusterId),
-                                    "cluster_message": result.clusterMessage,
-                                    "cluster_with_numbers": not launch_info.cleanNumbers}})
-                for log_id in merged_logs_to_update:
-                    cluster_id, cluster_message = merged_logs_to_update[log_id]
-                    bodies.append({
-                        "_op_type": "update",
-                        "_id": log_id,
-                        "_index": index_name,
-                        "doc": {"cluster_id": str(cluster_id),
-                                "cluster_message": cluster_message,
-                                "cluster_with_numbers": not launch_info.cleanNumbers}})
-                self.es_client._bulk_index(
-                    bodies, refresh=False, chunk_size=self.app_config["esChunkNumberUpdateClusters"])
+                additional_results, unique_errors_min_should_match)
+            groups, additional_results = self.add_cached_clusters(
+                groups, additional_results, cached_clusters, cached_cluster_messages)
+            clusters, cluster_num, merged_logs_to_update, cluster_representatives =\
+                self.gather_cluster_results(
+                    groups, additional_results, log_dict, log_messages,
+                    log_ids_for_merged_logs, launch_info)
+            failed_clusters = self.update_clusters_in_es(
+                clusters, merged_logs_to_update, index_name, launch_info)
+            for cluster_id, failed_logs_num in failed_clusters.items():
+                errors_found.append(
+                    "Failed to update %d logs of the cluster %s" % (failed_logs_num, cluster_id))
+                errors_count += 1
+            self.cluster_index.update_launch_clusters(
+                clusters, cluster_representatives, log_dict, log_messages, launch_info,
+                launch_clusters=launch_clusters)
+            self.cluster_messages_cache.update_cached_clusters(
+                clusters, merged_logs_to_update, log_dict, log_messages, launch_info,
+                failed_clusters=failed_clusters)
         except Exception as err:
             logger.error(err)
             errors_found.append(utils.extract_exception(err))
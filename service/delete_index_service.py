@@ -18,6 +18,8 @@ import logging
 import utils.utils as utils
 from time import time
 from commons import namespace_finder
+from commons import cluster_index
+from commons import suggest_cache
 from commons.esclient import EsClient
 from commons import trigger_manager
 
@@ -30,6 +32,8 @@ class DeleteIndexService:
         self.app_config = app_config
         self.search_cfg = search_cfg
         self.namespace_finder = namespace_finder.NamespaceFinder(app_config)
+        self.cluster_index = cluster_index.ClusterIndex(app_config)
+        self.cluster_messages_cache = cluster_index.ClusterMessagesCache(app_config)
         self.trigger_manager = trigger_manager.TriggerManager(
             model_chooser, app_config=app_config, search_cfg=search_cfg)
         self.es_client = EsClient(app_config=app_config, search_cfg=search_cfg)
@@ -42,6 +46,9 @@ class DeleteIndexService:
         is_index_deleted = self.es_client.delete_index(utils.unite_project_name(
             str(index_name), self.app_config["esProjectIndexPrefix"]))
         self.namespace_finder.remove_namespaces(index_name)
+        self.cluster_index.remove_cluster_index(index_name)
+        self.cluster_messages_cache.remove_cache(index_name)
+        suggest_cache.invalidate_projects([index_name])
         self.trigger_manager.delete_triggers(index_name)
         self.model_chooser.delete_all_custom_models(index_name)
         logger.info("Finished deleting index %.2f s", time() - t_start)
@@ -19,7 +19,7 @@ from utils import utils
 from commons.launch_objects import SearchLogInfo, Log
 from commons.log_preparation import LogPreparation
 from commons.log_merger import LogMerger
-from boosting_decision_making import weighted_similarity_calculator
+from commons import global_models
 from commons import similarity_calculator
 import elasticsearch
 import elasticsearch.helpers
@@ -37,10 +37,8 @@ class SearchService:
         self.es_client = EsClient(app_config=app_config, search_cfg=search_cfg)
         self.log_preparation = LogPreparation()
         self.log_merger = LogMerger()
-        self.weighted_log_similarity_calculator = None
-        if self.search_cfg["SimilarityWeightsFolder"].strip():
-            self.weighted_log_similarity_calculator = weighted_similarity_calculator.\
-                WeightedSimilarityCalculator(folder=self.search_cfg["SimilarityWeightsFolder"])
+        self.weighted_log_similarity_calculator = global_models.get_weighted_similarity_calculator(
+            self.search_cfg)
 
     def build_search_query(self, search_req, queried_log, search_min_should_match="95%"):
         """Build search query"""
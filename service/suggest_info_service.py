@@ -22,6 +22,7 @@ from datetime import datetime
 import elasticsearch
 import elasticsearch.helpers
 from commons.esclient import EsClient
+from commons import bulk_writer
 
 logger = logging.getLogger("analyzerApp.suggestInfoService")
 
@@ -34,6 +35,7 @@ class SuggestInfoService():
         self.es_client = EsClient(app_config=app_config, search_cfg=search_cfg)
         self.rp_suggest_index_template = "rp_suggestions_info"
         self.rp_suggest_metrics_index_template = "rp_suggestions_info_metrics"
+        self.bulk_writer = bulk_writer.get_bulk_writer(self.es_client, app_config)
 
     def build_index_name(self, project_id):
         return str(project_id) + "_suggest"
@@ -43,10 +45,8 @@ class SuggestInfoService():
         logger.info("Started saving suggest_info_list")
         t_start = time()
         bodies = []
-        project_index_names = set()
         if len(suggest_info_list):
-            self.es_client.create_index_for_stats_info(
-                self.rp_suggest_metrics_index_template)
+            self.bulk_writer.ensure_index(self.rp_suggest_metrics_index_template)
         metrics_data_by_test_item = {}
         for obj in suggest_info_list:
             obj_info = json.loads(obj.json())
@@ -59,21 +59,18 @@ class SuggestInfoService():
             project_index_name = self.build_index_name(obj_info["project"])
             project_index_name = utils.unite_project_name(
                 project_index_name, self.app_config["esProjectIndexPrefix"])
-            if project_index_name not in project_index_names:
-                self.es_client.create_index_for_stats_info(
-                    self.rp_suggest_index_template,
-                    override_index_name=project_index_name)
-                project_index_names.add(project_index_name)
+            self.bulk_writer.ensure_index(
+                self.rp_suggest_index_template, override_index_name=project_index_name)
             bodies.append({
                 "_index": project_index_name,
                 "_source": obj_info
             })
-        bulk_result = self.es_client._bulk_index(bodies)
-        self.index_data_for_metrics(metrics_data_by_test_item)
+        bodies.extend(self.prepare_metrics_bodies(metrics_data_by_test_item))
+        bulk_result = self.bulk_writer.add(bodies)
         logger.info("Finished saving %.2f s", time() - t_start)
         return bulk_result
 
-    def index_data_for_metrics(self, metrics_data_by_test_item):
+    def prepare_metrics_bodies(self, metrics_data_by_test_item):
         bodies = []
         for test_item in metrics_data_by_test_item:
             sorted_metrics_data = sorted(
@@ -95,13 +92,14 @@ class SuggestInfoService():
                 "_index": self.rp_suggest_metrics_index_template,
                 "_source": chosen_data
             })
-        self.es_client._bulk_index(bodies)
+        return bodies
 
     def remove_suggest_info(self, project_id):
         logger.info("Removing suggest_info index")
         project_index_name = self.build_index_name(project_id)
         project_index_name = utils.unite_project_name(
             project_index_name, self.app_config["esProjectIndexPrefix"])
+        self.bulk_writer.remove_index(project_index_name)
         return self.es_client.delete_index(project_index_name)
 
     def build_suggest_info_ids_query(self, log_ids):
@@ -139,6 +137,7 @@ class SuggestInfoService():
         logger.info("Delete logs %s for the index %s",
                     clean_index.ids, index_name)
         t_start = time()
+        self.bulk_writer.flush()
         if not self.es_client.index_exists(index_name, print_error=False):
             logger.info("Didn't find index '%s'", index_name)
             return 0
@@ -174,6 +173,7 @@ class SuggestInfoService():
         logger.info("Delete test items %s for the index %s",
                     remove_items_info["itemsToDelete"], index_name)
         t_start = time()
+        self.bulk_writer.flush()
         deleted_logs = self.es_client.delete_by_query(
             index_name, remove_items_info["itemsToDelete"],
             self.build_suggest_info_ids_query_by_test_item)
@@ -191,6 +191,7 @@ class SuggestInfoService():
         )
         logger.info("Delete launches %s for the index %s", launch_ids, index_name)
         t_start = time()
+        self.bulk_writer.flush()
         deleted_logs = self.es_client.delete_by_query(
             index_name, launch_ids, self.build_suggest_info_ids_query_by_launch_ids
         )
@@ -226,6 +227,7 @@ class SuggestInfoService():
             int(key_): val for key_, val in defect_update_info["itemsToUpdate"].items()}
         index_name = self.build_index_name(defect_update_info["project"])
         index_name = utils.unite_project_name(index_name, self.app_config["esProjectIndexPrefix"])
+        self.bulk_writer.flush()
         if not self.es_client.index_exists(index_name):
             return 0
         batch_size = 1000
@@ -32,6 +32,17 @@ class SuggestPatternsService:
         self.search_cfg = search_cfg
         self.es_client = EsClient(app_config=app_config, search_cfg=search_cfg)
 
+    def build_label_query(self, label):
+        return {
+            "bool": {
+                "should": [
+                    {"wildcard": {"issue_type": "{}*".format(label.upper())}},
+                    {"wildcard": {"issue_type": "{}*".format(label.lower())}},
+                    {"wildcard": {"issue_type": "{}*".format(label)}},
+                ]
+            }
+        }
+
     def query_data(self, project, label):
         data = []
         for d in elasticsearch.helpers.scan(
@@ -44,15 +55,7 @@ class SuggestPatternsService:
                     "query": {
                         "bool": {
                             "must": [
-                                {
-                                    "bool": {
-                                        "should": [
-                                            {"wildcard": {"issue_type": "{}*".format(label.upper())}},
-                                            {"wildcard": {"issue_type": "{}*".format(label.lower())}},
-                                            {"wildcard": {"issue_type": "{}*".format(label)}},
-                                        ]
-                                    }
-                                }
+                                self.build_label_query(label)
                             ],
                             "should": [
                                 {"term": {"is_auto_analyzed": {"value": "false", "boost": 1.0}}},
@@ -63,6 +66,61 @@ class SuggestPatternsService:
             data.append((d["_source"]["detected_message"], d["_source"]["issue_type"]))
         return data
 
+    def exceptions_are_aggregatable(self, index, index_name):
+        """Checks whether the index has found exceptions mapped for aggregations,
+        indices created before the mapping was added are scanned instead"""
+        try:
+            found_exceptions_mapping = index[index_name]["mappings"]["properties"]["found_exceptions"]
+            return "tokens" in found_exceptions_mapping["fields"]
+        except Exception:
+            return False
+
+    def query_exceptions_counts(self, project, labels):
+        """Counts logs for each pair of issue type and found exception with
+        a composite aggregation, merged logs don't have detected messages
+        and exceptions are taken only from not merged logs"""
+        exceptions_counts = []
+        composite_query = {
+            "size": self.app_config["esChunkNumber"],
+            "sources": [
+                {"issue_type": {"terms": {"field": "issue_type"}}},
+                {"exception": {"terms": {"field": "found_exceptions.tokens"}}}
+            ]
+        }
+        while True:
+            res = self.es_client.es_client.search(index=project, body={
+                "size": 0,
+                "query": {
+                    "bool": {
+                        "filter": [
+                            {"bool": {"should": [self.build_label_query(label) for label in labels]}}
+                        ],
+                        "must_not": [
+                            {"term": {"is_merged": True}}
+                        ]
+                    }
+                },
+                "aggs": {
+                    "exceptions": {"composite": composite_query}
+                }
+            })
+            buckets = res["aggregations"]["exceptions"]["buckets"]
+            for bucket in buckets:
+                exceptions_counts.append(
+                    (bucket["key"]["exception"], bucket["key"]["issue_type"], bucket["doc_count"]))
+            if len(buckets) < composite_query["size"] or\
+                    "after_key" not in res["aggregations"]["exceptions"]:
+                break
+            composite_query["after"] = res["aggregations"]["exceptions"]["after_key"]
+        return exceptions_counts
+
+    def count_exceptions(self, found_data):
+        exceptions_counts = []
+        for log, label in found_data:
+            for exception in utils.get_found_exceptions(log).split(" "):
+                exceptions_counts.append((exception, label, 1))
+        return exceptions_counts
+
     def get_patterns_with_labels(self, exceptions_with_labels):
         min_count = self.search_cfg["PatternLabelMinCountToSuggest"]
         min_percent = self.search_cfg["PatternLabelMinPercentToSuggest"]
@@ -98,25 +156,35 @@ class SuggestPatternsService:
         found_data = []
         exceptions_with_labels = {}
         all_exceptions = {}
-        if not self.es_client.index_exists(index_name):
+        labels = ["ab", "pb", "si", "ti"]
+        index = None
+        try:
+            index = self.es_client.es_client.indices.get(index=index_name)
+        except Exception as err:
+            logger.error("Index %s was not found", index_name)
+            logger.error(err)
+        if index is None:
             return SuggestPattern(
                 suggestionsWithLabels=[],
                 suggestionsWithoutLabels=[])
-        for label in ["ab", "pb", "si", "ti"]:
-            found_data.extend(self.query_data(index_name, label))
-        for log, label in found_data:
-            for exception in utils.get_found_exceptions(log).split(" "):
-                if exception.strip():
-                    if exception not in all_exceptions:
-                        all_exceptions[exception] = 0
-                    all_exceptions[exception] += 1
+        if self.exceptions_are_aggregatable(index, index_name):
+            exceptions_counts = self.query_exceptions_counts(index_name, labels)
+        else:
+            for label in labels:
+                found_data.extend(self.query_data(index_name, label))
+            exceptions_counts = self.count_exceptions(found_data)
+        for exception, label, count in exceptions_counts:
+            if exception.strip():
+                if exception not in all_exceptions:
+                    all_exceptions[exception] = 0
+                all_exceptions[exception] += count
 
-                    if label[:2].lower() != "ti":
-                        if exception not in exceptions_with_labels:
-                            exceptions_with_labels[exception] = {}
-                        if label not in exceptions_with_labels[exception]:
-                            exceptions_with_labels[exception][label] = 0
-                        exceptions_with_labels[exception][label] += 1
+                if label[:2].lower() != "ti":
+                    if exception not in exceptions_with_labels:
+                        exceptions_with_labels[exception] = {}
+                    if label not in exceptions_with_labels[exception]:
+                        exceptions_with_labels[exception][label] = 0
+                    exceptions_with_labels[exception][label] += count
         suggestedPatternsWithLabels = self.get_patterns_with_labels(exceptions_with_labels)
         suggestedPatternsWithoutLabels = self.get_patterns_without_labels(all_exceptions)
         logger.info("Finished suggesting patterns %.2f s", time() - t_start)
@@ -19,7 +19,11 @@ from boosting_decision_making.suggest_boosting_featurizer import SuggestBoosting
 from amqp.amqp import AmqpClient
 from service.analyzer_service import AnalyzerService
 from commons import similarity_calculator
+from commons import suggest_cache
+from commons import bulk_writer
 import json
+import hashlib
+import numpy as np
 import logging
 from time import time
 from datetime import datetime
@@ -35,6 +39,19 @@ class SuggestService(AnalyzerService):
         self.suggest_threshold = 0.4
         self.rp_suggest_index_template = "rp_suggestions_info"
         self.rp_suggest_metrics_index_template = "rp_suggestions_info_metrics"
+        self.max_queries_per_msearch = 60
+        self.msearch_threads_num = 1
+        if "suggestMsearchChunkSize" in self.app_config:
+            self.max_queries_per_msearch = self.app_config["suggestMsearchChunkSize"]
+        if "suggestMsearchThreadsNum" in self.app_config:
+            self.msearch_threads_num = self.app_config["suggestMsearchThreadsNum"]
+        self.suggest_cache_ttl = 0
+        self.suggest_cache_size = 1000
+        if "suggestCacheTtl" in self.app_config:
+            self.suggest_cache_ttl = self.app_config["suggestCacheTtl"]
+        if "suggestCacheSize" in self.app_config:
+            self.suggest_cache_size = self.app_config["suggestCacheSize"]
+        self.bulk_writer = bulk_writer.get_bulk_writer(self.es_client, self.app_config)
 
     def get_config_for_boosting_suggests(self, analyzerConfig):
         return {
@@ -136,18 +153,16 @@ class SuggestService(AnalyzerService):
 
         return self.add_query_with_start_time_decay(query, log["_source"]["start_time"])
 
-    def query_es_for_suggested_items(self, test_item_info, logs):
-        full_results = []
-        index_name = utils.unite_project_name(
-            str(test_item_info.project), self.app_config["esProjectIndexPrefix"])
-
+    def build_suggest_queries(self, test_item_info, logs):
+        """Returns queried logs and queries with 3 query variants for every log"""
+        queried_logs = []
+        queries = []
         for log in logs:
             message = log["_source"]["message"].strip()
             merged_small_logs = log["_source"]["merged_small_logs"].strip()
             if log["_source"]["log_level"] < utils.ERROR_LOGGING_LEVEL or\
                     (not message and not merged_small_logs):
                 continue
-            queries = []
 
             for query in [
                     self.build_suggest_query(
@@ -165,12 +180,18 @@ class SuggestService(AnalyzerService):
                         message_field="message_without_params_and_brackets",
                         det_mes_field="detected_message_without_params_and_brackets",
                         stacktrace_field="stacktrace_extended")]:
-                queries.append("{}\n{}".format(json.dumps({"index": index_name}), json.dumps(query)))
+                queried_logs.append(log)
+                queries.append(query)
+        return queried_logs, queries
 
-            partial_res = self.es_client.es_client.msearch("\n".join(queries) + "\n")["responses"]
-            for ind in range(len(partial_res)):
-                full_results.append((log, partial_res[ind]))
-        return full_results
+    def query_es_for_suggested_items(self, test_item_info, logs):
+        index_name = utils.unite_project_name(
+            str(test_item_info.project), self.app_config["esProjectIndexPrefix"])
+        queried_logs, queries = self.build_suggest_queries(test_item_info, logs)
+        responses = self.es_client.msearch_by_chunks(
+            index_name, queries, chunk_size=self.max_queries_per_msearch,
+            threads_num=self.msearch_threads_num)
+        return list(zip(queried_logs, responses))
 
     def deduplicate_results(self, gathered_results, scores_by_test_items, test_item_ids):
         _similarity_calculator = similarity_calculator.SimilarityCalculator(
@@ -181,43 +202,24 @@ class SuggestService(AnalyzerService):
                 "number_of_log_lines": -1
             },
             weighted_similarity_calculator=self.weighted_log_similarity_calculator)
-        all_pairs_to_check = []
-        for i in range(len(gathered_results)):
-            for j in range(i + 1, len(gathered_results)):
-                test_item_id_first = test_item_ids[gathered_results[i][0]]
-                test_item_id_second = test_item_ids[gathered_results[j][0]]
-                issue_type1 = scores_by_test_items[test_item_id_first]["mrHit"]["_source"]["issue_type"]
-                issue_type2 = scores_by_test_items[test_item_id_second]["mrHit"]["_source"]["issue_type"]
-                if issue_type1 != issue_type2:
-                    continue
-                items_to_compare = {"hits": {"hits": [scores_by_test_items[test_item_id_first]["mrHit"]]}}
-                all_pairs_to_check.append((scores_by_test_items[test_item_id_second]["mrHit"],
-                                           items_to_compare))
-        _similarity_calculator.find_similarity(
-            all_pairs_to_check,
-            ["detected_message_with_numbers", "stacktrace", "merged_small_logs"])
-
-        filtered_results = []
-        deleted_indices = set()
-        for i in range(len(gathered_results)):
-            if i in deleted_indices:
-                continue
-            for j in range(i + 1, len(gathered_results)):
-                test_item_id_first = test_item_ids[gathered_results[i][0]]
-                test_item_id_second = test_item_ids[gathered_results[j][0]]
-                group_id = (scores_by_test_items[test_item_id_first]["mrHit"]["_id"],
-                            scores_by_test_items[test_item_id_second]["mrHit"]["_id"])
-                if group_id not in _similarity_calculator.similarity_dict["detected_message_with_numbers"]:
-                    continue
-                det_message = _similarity_calculator.similarity_dict["detected_message_with_numbers"]
-                detected_message_sim = det_message[group_id]
-                stacktrace_sim = _similarity_calculator.similarity_dict["stacktrace"][group_id]
-                merged_logs_sim = _similarity_calculator.similarity_dict["merged_small_logs"][group_id]
-                if detected_message_sim["similarity"] >= 0.98 and\
-                        stacktrace_sim["similarity"] >= 0.98 and merged_logs_sim["similarity"] >= 0.98:
-                    deleted_indices.add(j)
-            filtered_results.append(gathered_results[i])
-        return filtered_results
+        hits = [scores_by_test_items[test_item_ids[result[0]]]["mrHit"] for result in gathered_results]
+        issue_types = np.array([hit["_source"]["issue_type"] for hit in hits])
+        same_issue_type = issue_types[:, None] == issue_types[None, :]
+        np.fill_diagonal(same_issue_type, False)
+        results_to_compare = np.flatnonzero(same_issue_type.any(axis=1))
+        if not len(results_to_compare):
+            return gathered_results
+        duplicates = np.triu(same_issue_type[np.ix_(results_to_compare, results_to_compare)], k=1)
+        hits_to_compare = [hits[idx] for idx in results_to_compare]
+        for field in ["detected_message_with_numbers", "stacktrace", "merged_small_logs"]:
+            with np.errstate(invalid="ignore"):
+                duplicates &= _similarity_calculator.find_pairwise_similarity(hits_to_compare, field) >= 0.98
+
+        deleted_results = np.zeros(len(gathered_results), dtype=bool)
+        for compared_idx in np.flatnonzero(duplicates.any(axis=1)):
+            if not deleted_results[results_to_compare[compared_idx]]:
+                deleted_results[results_to_compare[duplicates[compared_idx]]] = True
+        return [result for idx, result in enumerate(gathered_results) if not deleted_results[idx]]
 
     def sort_results(self, scores_by_test_items, test_item_ids, predicted_labels_probability):
         gathered_results = []
@@ -310,6 +312,18 @@ class SuggestService(AnalyzerService):
             logs.append(log)
         return logs, test_item_id
 
+    def find_test_items_in_cluster(self, test_item_info, index_name):
+        """Returns test items of the cluster with ids of their logs from the cluster"""
+        test_item_logs = {}
+        for log in elasticsearch.helpers.scan(self.es_client.es_client,
+                                              query=self.get_query_for_test_item_in_cluster(test_item_info),
+                                              index=index_name):
+            test_item_id = int(log["_source"]["test_item"])
+            if test_item_id not in test_item_logs:
+                test_item_logs[test_item_id] = int(log["_id"])
+            test_item_logs[test_item_id] = min(test_item_logs[test_item_id], int(log["_id"]))
+        return test_item_logs
+
     def prepare_logs_for_suggestions(self, test_item_info, index_name):
         prepared_logs = []
         test_item_id_for_suggest = test_item_info.testItemId
@@ -323,108 +337,163 @@ class SuggestService(AnalyzerService):
         return logs, test_item_id_for_suggest
 
     @utils.ignore_warnings
-    def suggest_items(self, test_item_info):
-        logger.info("Started suggesting test items")
-        logger.info("ES Url %s", utils.remove_credentials_from_url(self.es_client.host))
+    def suggest_items_for_cluster(self, test_item_info):
+        """Suggests for all test items of the cluster with one request, suggestions are
+        computed once for the cluster and returned for every test item of the cluster"""
+        if test_item_info.clusterId == 0:
+            return self.suggest_items(test_item_info)
+        logger.info("Started suggesting test items for the cluster %d", test_item_info.clusterId)
+        t_start = time()
         index_name = utils.unite_project_name(
             str(test_item_info.project), self.app_config["esProjectIndexPrefix"])
-        if not self.es_client.index_exists(index_name):
-            logger.info("Project %s doesn't exist", index_name)
-            logger.info("Finished suggesting for test item with 0 results.")
+        cluster_results = self.suggest_items(test_item_info)
+        if not cluster_results:
             return []
-
-        t_start = time()
         results = []
-        errors_found = []
-        errors_count = 0
-        model_info_tags = []
-        feature_names = ""
         try:
-            logs, test_item_id_for_suggest = self.prepare_logs_for_suggestions(test_item_info, index_name)
-            logger.info("Number of logs for suggestions: %d", len(logs))
-            searched_res = self.query_es_for_suggested_items(test_item_info, logs)
-
-            boosting_config = self.get_config_for_boosting_suggests(test_item_info.analyzerConfig)
-            boosting_config["chosen_namespaces"] = self.namespace_finder.get_chosen_namespaces(
-                test_item_info.project)
-            _suggest_decision_maker_to_use = self.model_chooser.choose_model(
-                test_item_info.project, "suggestion_model/",
-                custom_model_prob=self.search_cfg["ProbabilityForCustomModelSuggestions"])
-            features_dict_objects = _suggest_decision_maker_to_use.features_dict_with_saved_objects
-
-            _boosting_data_gatherer = SuggestBoostingFeaturizer(
-                searched_res,
-                boosting_config,
-                feature_ids=_suggest_decision_maker_to_use.get_feature_ids(),
-                weighted_log_similarity_calculator=self.weighted_log_similarity_calculator,
-                features_dict_with_saved_objects=features_dict_objects)
-            _boosting_data_gatherer.set_defect_type_model(self.model_chooser.choose_model(
-                test_item_info.project, "defect_type_model/"))
-            feature_data, test_item_ids = _boosting_data_gatherer.gather_features_info()
-            scores_by_test_items = _boosting_data_gatherer.scores_by_issue_type
-            model_info_tags = _boosting_data_gatherer.get_used_model_info() +\
-                _suggest_decision_maker_to_use.get_model_info()
-            feature_names = ";".join(_suggest_decision_maker_to_use.get_feature_names())
-            if feature_data:
-                predicted_labels, predicted_labels_probability = _suggest_decision_maker_to_use.predict(
-                    feature_data)
-                sorted_results = self.sort_results(
-                    scores_by_test_items, test_item_ids, predicted_labels_probability)
-
-                logger.debug("Found %d results for test items ", len(sorted_results))
-                for idx, prob, _ in sorted_results:
-                    test_item_id = test_item_ids[idx]
-                    issue_type = scores_by_test_items[test_item_id]["mrHit"]["_source"]["issue_type"]
-                    logger.debug("Test item id %d with issue type %s has probability %.2f",
-                                 test_item_id, issue_type, prob)
-                processed_time = time() - t_start
-                global_idx = 0
-                for idx, prob, _ in sorted_results[:self.search_cfg["MaxSuggestionsNumber"]]:
-                    if prob >= self.suggest_threshold:
-                        test_item_id = test_item_ids[idx]
-                        issue_type = scores_by_test_items[test_item_id]["mrHit"]["_source"]["issue_type"]
-                        relevant_log_id = utils.extract_real_id(
-                            scores_by_test_items[test_item_id]["mrHit"]["_id"])
-                        real_log_id = str(scores_by_test_items[test_item_id]["mrHit"]["_id"])
-                        is_merged = real_log_id != str(relevant_log_id)
-                        test_item_log_id = utils.extract_real_id(
-                            scores_by_test_items[test_item_id]["compared_log"]["_id"])
-                        analysis_result = SuggestAnalysisResult(
-                            project=test_item_info.project,
-                            testItem=test_item_id_for_suggest,
-                            testItemLogId=test_item_log_id,
-                            launchId=test_item_info.launchId,
-                            launchName=test_item_info.launchName,
-                            issueType=issue_type,
-                            relevantItem=test_item_id,
-                            relevantLogId=relevant_log_id,
-                            isMergedLog=is_merged,
-                            matchScore=round(prob, 2) * 100,
-                            esScore=round(scores_by_test_items[test_item_id]["mrHit"]["_score"], 2),
-                            esPosition=scores_by_test_items[test_item_id]["mrHit"]["es_pos"],
-                            modelFeatureNames=feature_names,
-                            modelFeatureValues=";".join(
-                                [str(feature) for feature in feature_data[idx]]),
-                            modelInfo=";".join(model_info_tags),
-                            resultPosition=global_idx,
-                            usedLogLines=test_item_info.analyzerConfig.numberOfLogLines,
-                            minShouldMatch=self.find_min_should_match_threshold(
-                                test_item_info.analyzerConfig),
-                            processedTime=processed_time,
-                            clusterId=test_item_info.clusterId,
-                            methodName="suggestion")
-                        results.append(analysis_result)
-                        logger.debug(analysis_result)
-                        global_idx += 1
-            else:
-                logger.debug("There are no results for test item %s", test_item_info.testItemId)
+            test_item_logs = self.find_test_items_in_cluster(test_item_info, index_name)
+            for test_item_id in sorted(test_item_logs):
+                for result in cluster_results:
+                    item_result = result.copy()
+                    if item_result.testItem != test_item_id:
+                        item_result.testItem = test_item_id
+                        item_result.testItemLogId = test_item_logs[test_item_id]
+                    results.append(item_result)
+        except Exception as err:
+            logger.error(err)
+            return cluster_results
+        logger.info("Finished suggesting for %d test items of the cluster for %.2f s.",
+                    len(test_item_logs), time() - t_start)
+        return results
+
+    def get_suggest_cache_key(self, test_item_info):
+        """Items of the same cluster share suggestions, other items are identified
+        by their info and the error logs, the key also contains the analyzer config
+        and the custom models, so that retrained models are used for new suggestions.
+        The custom models are looked up for every request, so a retrained model
+        invalidates cached suggestions in all processes at once"""
+        if test_item_info.clusterId != 0:
+            item_key = (test_item_info.launchId, test_item_info.clusterId)
+        else:
+            error_messages = sorted(set(
+                " ".join(log.message.split()) for log in test_item_info.logs
+                if log.logLevel >= utils.ERROR_LOGGING_LEVEL))
+            item_key = (
+                test_item_info.testItemId, test_item_info.uniqueId, test_item_info.testCaseHash,
+                test_item_info.launchId, test_item_info.launchName, test_item_info.testItemName,
+                hashlib.sha1("\n".join(error_messages).encode("utf-8")).hexdigest())
+        models_version = tuple(
+            self.model_chooser.get_model_info(model_name, test_item_info.project)
+            for model_name in ["suggestion_model", "defect_type_model"])
+        return (int(test_item_info.project), item_key,
+                test_item_info.analyzerConfig.json(sort_keys=True), models_version)
+
+    def get_cached_suggestions(self, test_item_info):
+        """Returns the cache key and the cached suggestions of the test item with
+        the info saved with them, suggestions are None, if they are not cached"""
+        if self.suggest_cache_ttl <= 0:
+            return None, None
+        try:
+            cache_key = self.get_suggest_cache_key(test_item_info)
+            return cache_key, suggest_cache.get_suggestions(cache_key, self.suggest_cache_ttl)
         except Exception as err:
+            logger.error("Failed to get cached suggestions")
             logger.error(err)
-            errors_found.append(utils.extract_exception(err))
-            errors_count += 1
-        results_to_share = {test_item_info.launchId: {
-            "not_found": int(len(results) == 0), "items_to_process": 1,
-            "processed_time": time() - t_start, "found_items": len(results),
+        return None, None
+
+    def save_cached_suggestions(self, cache_key, results, model_info_tags, feature_names):
+        suggest_cache.save_suggestions(
+            cache_key, results, self.suggest_cache_size,
+            info={"model_info_tags": model_info_tags, "feature_names": feature_names})
+
+    def choose_suggest_models(self, project):
+        """Chooses models and namespaces used for suggestions in the project"""
+        return {
+            "chosen_namespaces": self.namespace_finder.get_chosen_namespaces(project),
+            "suggest_model": self.model_chooser.choose_model(
+                project, "suggestion_model/",
+                custom_model_prob=self.search_cfg["ProbabilityForCustomModelSuggestions"]),
+            "defect_type_model": self.model_chooser.choose_model(project, "defect_type_model/")
+        }
+
+    def gather_suggest_features(self, test_item_info, searched_res, project_models):
+        boosting_config = self.get_config_for_boosting_suggests(test_item_info.analyzerConfig)
+        boosting_config["chosen_namespaces"] = project_models["chosen_namespaces"]
+        _suggest_decision_maker_to_use = project_models["suggest_model"]
+        features_dict_objects = _suggest_decision_maker_to_use.features_dict_with_saved_objects
+
+        _boosting_data_gatherer = SuggestBoostingFeaturizer(
+            searched_res,
+            boosting_config,
+            feature_ids=_suggest_decision_maker_to_use.get_feature_ids(),
+            weighted_log_similarity_calculator=self.weighted_log_similarity_calculator,
+            features_dict_with_saved_objects=features_dict_objects)
+        _boosting_data_gatherer.set_defect_type_model(project_models["defect_type_model"])
+        feature_data, test_item_ids = _boosting_data_gatherer.gather_features_info()
+        scores_by_test_items = _boosting_data_gatherer.scores_by_issue_type
+        model_info_tags = _boosting_data_gatherer.get_used_model_info() +\
+            _suggest_decision_maker_to_use.get_model_info()
+        return feature_data, test_item_ids, scores_by_test_items, model_info_tags
+
+    def build_suggest_results(self, test_item_info, test_item_id_for_suggest,
+                              feature_data, test_item_ids, scores_by_test_items,
+                              predicted_labels_probability, feature_names, model_info_tags, t_start):
+        results = []
+        sorted_results = self.sort_results(
+            scores_by_test_items, test_item_ids, predicted_labels_probability)
+
+        logger.debug("Found %d results for test items ", len(sorted_results))
+        for idx, prob, _ in sorted_results:
+            test_item_id = test_item_ids[idx]
+            issue_type = scores_by_test_items[test_item_id]["mrHit"]["_source"]["issue_type"]
+            logger.debug("Test item id %d with issue type %s has probability %.2f",
+                         test_item_id, issue_type, prob)
+        processed_time = time() - t_start
+        global_idx = 0
+        for idx, prob, _ in sorted_results[:self.search_cfg["MaxSuggestionsNumber"]]:
+            if prob >= self.suggest_threshold:
+                test_item_id = test_item_ids[idx]
+                issue_type = scores_by_test_items[test_item_id]["mrHit"]["_source"]["issue_type"]
+                relevant_log_id = utils.extract_real_id(
+                    scores_by_test_items[test_item_id]["mrHit"]["_id"])
+                real_log_id = str(scores_by_test_items[test_item_id]["mrHit"]["_id"])
+                is_merged = real_log_id != str(relevant_log_id)
+                test_item_log_id = utils.extract_real_id(
+                    scores_by_test_items[test_item_id]["compared_log"]["_id"])
+                analysis_result = SuggestAnalysisResult(
+                    project=test_item_info.project,
+                    testItem=test_item_id_for_suggest,
+                    testItemLogId=test_item_log_id,
+                    launchId=test_item_info.launchId,
+                    launchName=test_item_info.launchName,
+                    issueType=issue_type,
+                    relevantItem=test_item_id,
+                    relevantLogId=relevant_log_id,
+                    isMergedLog=is_merged,
+                    matchScore=round(prob, 2) * 100,
+                    esScore=round(scores_by_test_items[test_item_id]["mrHit"]["_score"], 2),
+                    esPosition=scores_by_test_items[test_item_id]["mrHit"]["es_pos"],
+                    modelFeatureNames=feature_names,
+                    modelFeatureValues=";".join(
+                        [str(feature) for feature in feature_data[idx]]),
+                    modelInfo=";".join(model_info_tags),
+                    resultPosition=global_idx,
+                    usedLogLines=test_item_info.analyzerConfig.numberOfLogLines,
+                    minShouldMatch=self.find_min_should_match_threshold(
+                        test_item_info.analyzerConfig),
+                    processedTime=processed_time,
+                    clusterId=test_item_info.clusterId,
+                    methodName="suggestion")
+                results.append(analysis_result)
+                logger.debug(analysis_result)
+                global_idx += 1
+        return results
+
+    def get_suggest_stats(self, test_item_info, results_num, processed_time,
+                          model_info_tags, errors_found, errors_count):
+        return {
+            "not_found": int(results_num == 0), "items_to_process": 1,
+            "processed_time": processed_time, "found_items": results_num,
             "launch_id": test_item_info.launchId, "launch_name": test_item_info.launchName,
             "project_id": test_item_info.project, "method": "suggest",
             "gather_date": datetime.now().strftime("%Y-%m-%d"),
@@ -435,29 +504,234 @@ class SuggestService(AnalyzerService):
             "min_should_match": self.find_min_should_match_threshold(
                 test_item_info.analyzerConfig),
             "errors": errors_found,
-            "errors_count": errors_count}}
-        if not results:
-            self.es_client.create_index_for_stats_info(self.rp_suggest_metrics_index_template)
-            self.es_client._bulk_index([{
+            "errors_count": errors_count}
+
+    def send_suggest_stats(self, results_to_share, not_found_objects, found_results_by_project):
+        if not_found_objects:
+            self.bulk_writer.ensure_index(self.rp_suggest_metrics_index_template)
+            self.bulk_writer.add([{
                 "_index": self.rp_suggest_metrics_index_template,
-                "_source": self.prepare_not_found_object_info(
-                    test_item_info, time() - t_start,
-                    feature_names,
-                    model_info_tags)
-            }])
+                "_source": not_found_object
+            } for not_found_object in not_found_objects])
         if "amqpUrl" in self.app_config and self.app_config["amqpUrl"].strip():
             AmqpClient(self.app_config["amqpUrl"]).send_to_inner_queue(
                 self.app_config["exchangeName"], "stats_info", json.dumps(results_to_share))
-            if results:
+            for project, found_results_num in found_results_by_project.items():
+                if not found_results_num:
+                    continue
                 for model_type in ["suggestion", "auto_analysis"]:
                     AmqpClient(self.app_config["amqpUrl"]).send_to_inner_queue(
                         self.app_config["exchangeName"], "train_models", json.dumps({
                             "model_type": model_type,
-                            "project_id": test_item_info.project,
-                            "gathered_metric_total": len(results)
+                            "project_id": project,
+                            "gathered_metric_total": found_results_num
                         }))
-
         logger.debug("Stats info %s", results_to_share)
+
+    @utils.ignore_warnings
+    def suggest_items(self, test_item_info):
+        logger.info("Started suggesting test items")
+        logger.info("ES Url %s", utils.remove_credentials_from_url(self.es_client.host))
+        index_name = utils.unite_project_name(
+            str(test_item_info.project), self.app_config["esProjectIndexPrefix"])
+        if not self.es_client.index_exists(index_name):
+            logger.info("Project %s doesn't exist", index_name)
+            logger.info("Finished suggesting for test item with 0 results.")
+            return []
+
+        t_start = time()
+        cache_key, cached_suggestions = self.get_cached_suggestions(test_item_info)
+        results = []
+        errors_found = []
+        errors_count = 0
+        model_info_tags = []
+        feature_names = ""
+        if cached_suggestions is not None:
+            results, cached_info = cached_suggestions
+            model_info_tags = cached_info.get("model_info_tags", [])
+            feature_names = cached_info.get("feature_names", "")
+            logger.info("Found %d cached results for the test item", len(results))
+        else:
+            try:
+                logs, test_item_id_for_suggest = self.prepare_logs_for_suggestions(test_item_info, index_name)
+                logger.info("Number of logs for suggestions: %d", len(logs))
+                searched_res = self.query_es_for_suggested_items(test_item_info, logs)
+
+                project_models = self.choose_suggest_models(test_item_info.project)
+                _suggest_decision_maker_to_use = project_models["suggest_model"]
+                feature_data, test_item_ids, scores_by_test_items, model_info_tags =\
+                    self.gather_suggest_features(test_item_info, searched_res, project_models)
+                feature_names = ";".join(_suggest_decision_maker_to_use.get_feature_names())
+                if feature_data:
+                    predicted_labels, predicted_labels_probability = _suggest_decision_maker_to_use.predict(
+                        feature_data)
+                    results = self.build_suggest_results(
+                        test_item_info, test_item_id_for_suggest, feature_data, test_item_ids,
+                        scores_by_test_items, predicted_labels_probability, feature_names,
+                        model_info_tags, t_start)
+                else:
+                    logger.debug("There are no results for test item %s", test_item_info.testItemId)
+            except Exception as err:
+                logger.error(err)
+                errors_found.append(utils.extract_exception(err))
+                errors_count += 1
+        results_to_share = {test_item_info.launchId: self.get_suggest_stats(
+            test_item_info, len(results), time() - t_start, model_info_tags, errors_found, errors_count)}
+        not_found_objects = []
+        if not results:
+            not_found_objects.append(self.prepare_not_found_object_info(
+                test_item_info, time() - t_start, feature_names, model_info_tags))
+        self.send_suggest_stats(
+            results_to_share, not_found_objects, {test_item_info.project: len(results)})
+        if cache_key is not None and cached_suggestions is None and not errors_count:
+            self.save_cached_suggestions(cache_key, results, model_info_tags, feature_names)
+
         logger.info("Processed the test item. It took %.2f sec.", time() - t_start)
         logger.info("Finished suggesting for test item with %d results.", len(results))
         return results
+
+    def merge_suggest_stats(self, results_to_share, item_stats):
+        launch_id = item_stats["launch_id"]
+        if launch_id not in results_to_share:
+            results_to_share[launch_id] = item_stats
+            return
+        launch_stats = results_to_share[launch_id]
+        for key in ["items_to_process", "processed_time", "found_items", "errors_count"]:
+            launch_stats[key] += item_stats[key]
+        launch_stats["not_found"] = int(launch_stats["found_items"] == 0)
+        launch_stats["errors"].extend(item_stats["errors"])
+        launch_stats["model_info"] = list(dict.fromkeys(
+            launch_stats["model_info"] + item_stats["model_info"]))
+
+    def suggest_items_for_project(self, test_item_infos, index_name, t_start):
+        """Suggests for test items of one project: the models and namespaces are chosen once,
+        queries of all test items are sent together and the model predicts for all test items
+        at once, returns results, errors and model info for every test item"""
+        items_num = len(test_item_infos)
+        results = [[] for _ in range(items_num)]
+        errors = [[] for _ in range(items_num)]
+        model_info_tags = [[] for _ in range(items_num)]
+        feature_names = ""
+        try:
+            items_for_search = []
+            all_queried_logs = []
+            all_queries = []
+            for idx, test_item_info in enumerate(test_item_infos):
+                try:
+                    logs, test_item_id_for_suggest = self.prepare_logs_for_suggestions(
+                        test_item_info, index_name)
+                    queried_logs, queries = self.build_suggest_queries(test_item_info, logs)
+                except Exception as err:
+                    logger.error(err)
+                    errors[idx].append(utils.extract_exception(err))
+                    continue
+                items_for_search.append((idx, test_item_id_for_suggest, len(all_queries), len(queries)))
+                all_queried_logs.extend(queried_logs)
+                all_queries.extend(queries)
+            responses = self.es_client.msearch_by_chunks(
+                index_name, all_queries, chunk_size=self.max_queries_per_msearch,
+                threads_num=self.msearch_threads_num)
+            searched_res = list(zip(all_queried_logs, responses))
+
+            project_models = self.choose_suggest_models(test_item_infos[0].project)
+            _suggest_decision_maker_to_use = project_models["suggest_model"]
+            feature_names = ";".join(_suggest_decision_maker_to_use.get_feature_names())
+            items_with_features = []
+            all_feature_data = []
+            for idx, test_item_id_for_suggest, queries_start, queries_num in items_for_search:
+                try:
+                    feature_data, test_item_ids, scores_by_test_items, model_info_tags[idx] =\
+                        self.gather_suggest_features(
+                            test_item_infos[idx], searched_res[queries_start:queries_start + queries_num],
+                            project_models)
+                except Exception as err:
+                    logger.error(err)
+                    errors[idx].append(utils.extract_exception(err))
+                    continue
+                if not feature_data:
+                    logger.debug("There are no results for test item %s", test_item_infos[idx].testItemId)
+                    continue
+                items_with_features.append((
+                    idx, test_item_id_for_suggest, feature_data, test_item_ids, scores_by_test_items,
+                    len(all_feature_data)))
+                all_feature_data.extend(feature_data)
+            if all_feature_data:
+                predicted_labels, predicted_labels_probability = _suggest_decision_maker_to_use.predict(
+                    all_feature_data)
+                for item_with_features in items_with_features:
+                    (idx, test_item_id_for_suggest, feature_data, test_item_ids,
+                     scores_by_test_items, features_start) = item_with_features
+                    results[idx] = self.build_suggest_results(
+                        test_item_infos[idx], test_item_id_for_suggest, feature_data, test_item_ids,
+                        scores_by_test_items,
+                        predicted_labels_probability[features_start:features_start + len(feature_data)],
+                        feature_names, model_info_tags[idx], t_start)
+        except Exception as err:
+            logger.error(err)
+            for idx in range(items_num):
+                results[idx] = []
+                errors[idx].append(utils.extract_exception(err))
+        return results, errors, model_info_tags, feature_names
+
+    @utils.ignore_warnings
+    def suggest_items_batch(self, test_item_infos):
+        """Suggests for the list of test items, a list of results is returned for every
+        test item in the order of the test items, as results for test items of a cluster
+        are found for the test item chosen for the cluster"""
+        logger.info("Started suggesting for %d test items", len(test_item_infos))
+        t_start = time()
+        results_by_item = [[] for _ in test_item_infos]
+        cache_keys = [None] * len(test_item_infos)
+        items_by_project = {}
+        results_to_share = {}
+        not_found_objects = []
+        found_results_by_project = {}
+        for idx, test_item_info in enumerate(test_item_infos):
+            cache_keys[idx], cached_suggestions = self.get_cached_suggestions(test_item_info)
+            if cached_suggestions is not None:
+                item_results, cached_info = cached_suggestions
+                results_by_item[idx] = item_results
+                found_results_by_project[test_item_info.project] = found_results_by_project.get(
+                    test_item_info.project, 0) + len(item_results)
+                self.merge_suggest_stats(results_to_share, self.get_suggest_stats(
+                    test_item_info, len(item_results), time() - t_start,
+                    cached_info.get("model_info_tags", []), [], 0))
+                if not item_results:
+                    not_found_objects.append(self.prepare_not_found_object_info(
+                        test_item_info, time() - t_start, cached_info.get("feature_names", ""),
+                        cached_info.get("model_info_tags", [])))
+                continue
+            if test_item_info.project not in items_by_project:
+                items_by_project[test_item_info.project] = []
+            items_by_project[test_item_info.project].append(idx)
+
+        for project, item_ids in items_by_project.items():
+            index_name = utils.unite_project_name(
+                str(project), self.app_config["esProjectIndexPrefix"])
+            if not self.es_client.index_exists(index_name):
+                logger.info("Project %s doesn't exist", index_name)
+                continue
+            project_test_item_infos = [test_item_infos[idx] for idx in item_ids]
+            results, errors, model_info_tags, feature_names = self.suggest_items_for_project(
+                project_test_item_infos, index_name, t_start)
+            found_results_by_project[project] = found_results_by_project.get(project, 0)
+            for idx, test_item_info, item_results, item_errors, item_model_info_tags in zip(
+                    item_ids, project_test_item_infos, results, errors, model_info_tags):
+                results_by_item[idx] = item_results
+                found_results_by_project[project] += len(item_results)
+                self.merge_suggest_stats(results_to_share, self.get_suggest_stats(
+                    test_item_info, len(item_results), time() - t_start, item_model_info_tags,
+                    item_errors, len(item_errors)))
+                if not item_results:
+                    not_found_objects.append(self.prepare_not_found_object_info(
+                        test_item_info, time() - t_start, feature_names, item_model_info_tags))
+                if cache_keys[idx] is not None and not item_errors:
+                    self.save_cached_suggestions(
+                        cache_keys[idx], item_results, item_model_info_tags, feature_names)
+        if results_to_share:
+            self.send_suggest_stats(results_to_share, not_found_objects, found_results_by_project)
+
+        logger.info("Processed %d test items. It took %.2f sec.", len(test_item_infos), time() - t_start)
+        logger.info("Finished suggesting for %d test items with %d results.",
+                    len(test_item_infos), sum(len(item_results) for item_results in results_by_item))
+        return results_by_item
@@ -15,6 +15,7 @@
 """
 
 import unittest
+from unittest.mock import MagicMock
 import logging
 import sure # noqa
 from boosting_decision_making.boosting_featurizer import BoostingFeaturizer
@@ -187,6 +188,33 @@ class TestBoostingFeaturizer(unittest.TestCase):
                                 elastic_res[field][field_dict].should.equal(result_field_dict,
                                                                             epsilon=self.epsilon)
 
+    @utils.ignore_warnings
+    def test_predict_particular_defect_type_per_model_on_errors(self):
+        """Test a failing defect type model zeroes the feature only for its issue type"""
+        weight_log_sim = weighted_similarity_calculator.\
+            WeightedSimilarityCalculator(folder=self.weights_folder)
+        _boosting_featurizer = BoostingFeaturizer(
+            [(utils.get_fixture(self.log_message, to_json=True),
+              utils.get_fixture(self.two_hits_search_rs_explained, to_json=True))],
+            TestBoostingFeaturizer.get_default_config(),
+            [],
+            weighted_log_similarity_calculator=weight_log_sim)
+
+        def predict(data, model_name):
+            if model_name == "pb":
+                raise ValueError("Broken model")
+            return [1], [[0.2, 0.8]]
+        defect_type_model = MagicMock()
+        defect_type_model.models = {"ab": None, "pb": None}
+        defect_type_model.predict_with_several_models = MagicMock(
+            side_effect=ValueError("Broken model"))
+        defect_type_model.predict = MagicMock(side_effect=predict)
+        defect_type_model.get_model_info = MagicMock(return_value=["global defect type model"])
+        _boosting_featurizer.set_defect_type_model(defect_type_model)
+        _boosting_featurizer.predict_particular_defect_type().should.equal(
+            {"AB001": 0.8, "PB001": 0.0})
+        _boosting_featurizer.get_used_model_info().should.equal(["global defect type model"])
+
     @utils.ignore_warnings
     def test_filter_by_min_should_match(self):
         tests = [
@@ -16,11 +16,16 @@
 
 import unittest
 import logging
+import shutil
+import tempfile
 import sure # noqa
+from unittest.mock import MagicMock
 import numpy as np
 from boosting_decision_making.boosting_featurizer import BoostingFeaturizer
 from boosting_decision_making.suggest_boosting_featurizer import SuggestBoostingFeaturizer
 from boosting_decision_making.boosting_decision_maker import BoostingDecisionMaker
+from boosting_decision_making.custom_boosting_decision_maker import CustomBoostingDecisionMaker
+from boosting_decision_making.feature_encoder import FeatureEncoder
 from boosting_decision_making import weighted_similarity_calculator
 from boosting_decision_making import defect_type_model
 from utils import utils
@@ -84,6 +89,96 @@ class TestBoostingModel(unittest.TestCase):
             result.should.have.length_of(test_data_size)
             result_probability.should.have.length_of(test_data_size)
 
+    @utils.ignore_warnings
+    def test_booster_predict_matches_classifier(self):
+        random_state = np.random.RandomState(43)
+        train_data = random_state.rand(200, 5)
+        labels = (train_data[:, 0] + train_data[:, 1] > 1.0).astype(int)
+        decision_maker = BoostingDecisionMaker(n_estimators=10, max_depth=3)
+        decision_maker.add_config_info({}, [1, 2, 3, 4, 5], [])
+        decision_maker.train_model(train_data.tolist(), labels.tolist())
+        test_data = random_state.rand(20, 5).tolist()
+        for n_threads in [None, 1]:
+            result, result_probability = decision_maker.predict(test_data, n_threads=n_threads)
+            result.tolist().should.equal(decision_maker.xg_boost.predict(test_data).tolist())
+            result_probability.tolist().should.equal(
+                decision_maker.xg_boost.predict_proba(test_data).tolist(), epsilon=self.epsilon)
+
+    @utils.ignore_warnings
+    def test_booster_threads_restored_after_errors(self):
+        decision_maker = BoostingDecisionMaker(n_estimators=10, max_depth=3)
+        decision_maker.xg_boost = MagicMock(n_jobs=4)
+        decision_maker.predict_probabilities = MagicMock(side_effect=ValueError("predict failed"))
+        decision_maker.predict.when.called_with([[0.5]], n_threads=1).should.throw(ValueError)
+        decision_maker.xg_boost.get_booster().set_param.call_args_list[-1][0][0].should.equal(
+            {"nthread": 4})
+
+    @utils.ignore_warnings
+    def test_booster_is_locked_for_all_predictions(self):
+        decision_maker = BoostingDecisionMaker(n_estimators=10, max_depth=3)
+        decision_maker.xg_boost = MagicMock(n_jobs=4, classes_=[0, 1])
+        locked_calls = []
+
+        def predict_probabilities(data, n_threads=None):
+            locked_calls.append(decision_maker.booster_lock.locked())
+            return np.array([[0.3, 0.7]])
+        decision_maker.predict_probabilities = MagicMock(side_effect=predict_probabilities)
+        for n_threads in [None, 1]:
+            decision_maker.predict([[0.5]], n_threads=n_threads)[0].tolist().should.equal([1])
+        locked_calls.should.equal([True, True])
+        decision_maker.booster_lock.locked().should.be.false
+
+    @utils.ignore_warnings
+    def test_native_model_save_and_load(self):
+        random_state = np.random.RandomState(43)
+        train_data = random_state.rand(200, 5)
+        labels = (train_data[:, 0] + train_data[:, 1] > 1.0).astype(int)
+        decision_maker = BoostingDecisionMaker(n_estimators=10, max_depth=3)
+        decision_maker.add_config_info({"n_estimators": 10}, [1, 2, 3, 68, 70], [1])
+        logs = [{"_source": {"detected_message": message, "launch_name": launch_name}}
+                for message, launch_name in [
+                    ("java.lang.NullPointerException occurred", "launch_1"),
+                    ("AssertionError expected true", "launch_2"),
+                    ("timeout waiting for element", "launch_1")]]
+        for feature, field_name, encoding_type in [(68, "detected_message", "tf_idf"),
+                                                   (69, "detected_message", "count_vector"),
+                                                   (70, "launch_name", "one_hot")]:
+            decision_maker.features_dict_with_saved_objects[feature] = FeatureEncoder(
+                field_name=field_name, encoding_type=encoding_type, max_features=10)
+            decision_maker.features_dict_with_saved_objects[feature].fit(logs)
+        decision_maker.train_model(train_data.tolist(), labels.tolist())
+        folder = tempfile.mkdtemp()
+        try:
+            decision_maker.save_model(folder)
+            loaded_decision_maker = BoostingDecisionMaker(folder=folder)
+            app_config = {"binaryStoreType": "filesystem", "filesystemDefaultPath": folder,
+                          "minioBucketPrefix": "prj-"}
+            custom_decision_maker = CustomBoostingDecisionMaker(app_config, 1)
+            for attribute in ["n_estimators", "max_depth", "full_config", "feature_ids",
+                              "monotonous_features", "xg_boost", "features_dict_with_saved_objects"]:
+                setattr(custom_decision_maker, attribute, getattr(decision_maker, attribute))
+            custom_decision_maker.save_model("suggestion_model/")
+            custom_decision_maker = CustomBoostingDecisionMaker(app_config, 1)
+            custom_decision_maker.object_saver.does_object_exists = MagicMock()
+            custom_decision_maker.load_model("suggestion_model/")
+            custom_decision_maker.object_saver.does_object_exists.call_count.should.equal(0)
+        finally:
+            shutil.rmtree(folder)
+        loaded_decision_maker.get_feature_ids().should.equal([1, 2, 3, 68, 70])
+        loaded_decision_maker.monotonous_features.should.equal([1])
+        _, result_probability = decision_maker.predict(train_data.tolist())
+        _, loaded_result_probability = loaded_decision_maker.predict(train_data.tolist())
+        loaded_result_probability.tolist().should.equal(result_probability.tolist(), epsilon=self.epsilon)
+        _, custom_result_probability = custom_decision_maker.predict(train_data.tolist())
+        custom_result_probability.tolist().should.equal(result_probability.tolist(), epsilon=self.epsilon)
+        for feature, texts in [(68, ["AssertionError expected false", ""]),
+                               (69, ["NullPointerException occurred", "unknown"]),
+                               (70, ["launch_2", "launch_3"])]:
+            encoder = decision_maker.features_dict_with_saved_objects[feature]
+            loaded_encoder = loaded_decision_maker.features_dict_with_saved_objects[feature]
+            loaded_encoder.transform(texts).toarray().tolist().should.equal(
+                encoder.transform(texts).toarray().tolist(), epsilon=self.epsilon)
+
     @utils.ignore_warnings
     def test_full_data_check(self):
         print("Boost model folder : ", self.boost_model_folder)
@@ -0,0 +1,212 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+"""
+
+import unittest
+from unittest.mock import MagicMock
+import logging
+import tempfile
+import shutil
+import sure # noqa
+from commons import launch_objects
+from commons.cluster_index import ClusterIndex, ClusterMessagesCache
+from utils import utils
+
+
+class TestClusterIndex(unittest.TestCase):
+    """Tests attaching logs to the clusters saved in the cluster index"""
+    @utils.ignore_warnings
+    def setUp(self):
+        self.storage_folder = tempfile.mkdtemp()
+        self.app_config = {
+            "binaryStoreType": "filesystem",
+            "filesystemDefaultPath": self.storage_folder,
+            "minioBucketPrefix": "prj-"
+        }
+        self.log_messages = [
+            "error occured while processing the request for the item and it failed with number 1",
+            "assertion failed expected status code 200 but was 500",
+            "error occured while processing the request for the item and it failed with number 2"]
+        self.log_dict = {}
+        for idx in range(len(self.log_messages)):
+            self.log_dict[idx] = {"_id": str(idx + 10), "_source": {
+                "found_exceptions": "", "potential_status_codes": "",
+                "is_merged": False, "test_item": str(idx + 100)}}
+        logging.disable(logging.CRITICAL)
+
+    @utils.ignore_warnings
+    def tearDown(self):
+        shutil.rmtree(self.storage_folder)
+        logging.disable(logging.DEBUG)
+
+    def get_launch_info(self, for_update):
+        return launch_objects.LaunchInfoForClustering(
+            launch=launch_objects.Launch(launchId=1, project=2),
+            project=2, forUpdate=for_update, numberOfLogLines=-1)
+
+    @utils.ignore_warnings
+    def test_find_clusters_in_index(self):
+        _cluster_index = ClusterIndex(self.app_config)
+        clusters = [launch_objects.ClusterInfo(
+            clusterId=123, clusterMessage="error occured", logIds=[10], itemIds=[100])]
+        _cluster_index.update_launch_clusters(
+            clusters, {123: 0}, self.log_dict, self.log_messages, self.get_launch_info(False))
+
+        log_ids = {"11", "12"}
+        launch_clusters = _cluster_index.get_launch_clusters(self.get_launch_info(True))
+        found_clusters, groups_not_found = _cluster_index.find_clusters_in_index(
+            launch_clusters, {0: [1], 1: [2]}, self.log_dict, self.log_messages, log_ids, 0.8)
+        groups_not_found.should.equal({0: [1]})
+        found_clusters.should.equal({1: launch_objects.ClusterInfo(
+            clusterId=123, clusterMessage="error occured", logIds=[10], itemIds=[100])})
+        log_ids.should.equal({"10", "11", "12"})
+
+        launch_info = self.get_launch_info(True)
+        launch_info.numberOfLogLines = 2
+        _cluster_index.get_launch_clusters(launch_info).should.be.none
+        _cluster_index.find_clusters_in_index(
+            None, {1: [2]}, self.log_dict, self.log_messages, set(), 0.8)[0].should.equal({})
+
+    @utils.ignore_warnings
+    def test_clusters_of_other_launches_are_left_for_search(self):
+        _cluster_index = ClusterIndex(self.app_config)
+        _cluster_index.update_launch_clusters(
+            [launch_objects.ClusterInfo(
+                clusterId=123, clusterMessage="error occured", logIds=[10], itemIds=[100])],
+            {123: 0}, self.log_dict, self.log_messages, self.get_launch_info(False))
+        launch_info = self.get_launch_info(True)
+        launch_info.launch.launchId = 2
+        launch_clusters = _cluster_index.get_launch_clusters(launch_info)
+        launch_clusters.should.be.none
+        _cluster_index.find_clusters_in_index(
+            launch_clusters, {1: [2]}, self.log_dict, self.log_messages, set(), 0.8).should.equal(
+            ({}, {1: [2]}))
+
+    @utils.ignore_warnings
+    def test_update_and_remove_launch_clusters(self):
+        _cluster_index = ClusterIndex(self.app_config)
+        _cluster_index.update_launch_clusters(
+            [launch_objects.ClusterInfo(
+                clusterId=123, clusterMessage="error occured", logIds=[10], itemIds=[100])],
+            {123: 0}, self.log_dict, self.log_messages, self.get_launch_info(False))
+        launch_info = self.get_launch_info(True)
+        _cluster_index.update_launch_clusters(
+            [launch_objects.ClusterInfo(
+                clusterId=123, clusterMessage="error occured", logIds=[12], itemIds=[102])],
+            {123: 2}, self.log_dict, self.log_messages, launch_info,
+            launch_clusters=_cluster_index.get_launch_clusters(launch_info))
+        cluster = _cluster_index.get_saved_launch_clusters(2, 1)["clusters"]["123"]
+        cluster["log_ids"].should.equal(["10", "12"])
+        cluster["item_ids"].should.equal([100, 102])
+        cluster["message"].should.equal(self.log_messages[0])
+
+        _cluster_index.remove_launches_with_test_items(2, [101])
+        _cluster_index.get_launch_ids(2).should.equal(["1"])
+        _cluster_index.remove_launches_with_logs(2, [12])
+        _cluster_index.get_launch_ids(2).should.equal([])
+
+    @utils.ignore_warnings
+    def test_launch_clusters_limits(self):
+        _cluster_index = ClusterIndex(self.app_config, max_launches=2, max_log_ids=2)
+        for launch_id in [3, 1, 2]:
+            launch_info = self.get_launch_info(False)
+            launch_info.launch.launchId = launch_id
+            _cluster_index.update_launch_clusters(
+                [launch_objects.ClusterInfo(
+                    clusterId=123, clusterMessage="error occured", logIds=[10], itemIds=[100])],
+                {123: 0}, self.log_dict, self.log_messages, launch_info)
+        sorted(_cluster_index.get_launch_ids(2)).should.equal(["2", "3"])
+
+        launch_info = self.get_launch_info(False)
+        _cluster_index.update_launch_clusters(
+            [launch_objects.ClusterInfo(
+                clusterId=123, clusterMessage="error occured", logIds=[10, 11, 12], itemIds=[100])],
+            {123: 0}, self.log_dict, self.log_messages, launch_info)
+        sorted(_cluster_index.get_launch_ids(2)).should.equal(["2", "3"])
+        launch_info.launch.launchId = 3
+        _cluster_index.update_launch_clusters(
+            [launch_objects.ClusterInfo(
+                clusterId=123, clusterMessage="error occured", logIds=[11, 12], itemIds=[101])],
+            {123: 0}, self.log_dict, self.log_messages, launch_info)
+        cluster = _cluster_index.get_saved_launch_clusters(2, 3)["clusters"]["123"]
+        cluster["log_ids"].should.equal(["11", "12"])
+        launch_info.forUpdate = True
+        launch_clusters = _cluster_index.get_launch_clusters(launch_info)
+        _cluster_index.update_launch_clusters(
+            [launch_objects.ClusterInfo(
+                clusterId=123, clusterMessage="error occured", logIds=[10], itemIds=[100])],
+            {123: 0}, self.log_dict, self.log_messages, launch_info, launch_clusters=launch_clusters)
+        cluster = _cluster_index.get_saved_launch_clusters(2, 3)["clusters"]["123"]
+        cluster["log_ids"].should.equal(["11", "12"])
+        cluster["log_ids_truncated"].should.be.true
+        cluster["item_ids"].should.equal([100, 101])
+        _cluster_index.find_clusters_in_index(
+            _cluster_index.get_launch_clusters(launch_info), {1: [2]},
+            self.log_dict, self.log_messages, set(), 0.8).should.equal(({}, {1: [2]}))
+
+    @utils.ignore_warnings
+    def test_launches_are_listed_only_for_trimming(self):
+        _cluster_index = ClusterIndex(self.app_config, max_launches=2)
+        _cluster_index.object_saver.get_folder_objects = MagicMock(
+            side_effect=_cluster_index.object_saver.get_folder_objects)
+        _cluster_index.object_saver.get_project_object = MagicMock(
+            side_effect=_cluster_index.object_saver.get_project_object)
+        for launch_id in [1, 2, 2, 1]:
+            launch_info = self.get_launch_info(False)
+            launch_info.launch.launchId = launch_id
+            _cluster_index.update_launch_clusters(
+                [launch_objects.ClusterInfo(
+                    clusterId=123, clusterMessage="error occured", logIds=[10], itemIds=[100])],
+                {123: 0}, self.log_dict, self.log_messages, launch_info)
+        _cluster_index.object_saver.get_folder_objects.call_count.should.equal(1)
+        _cluster_index.object_saver.get_project_object.call_count.should.equal(0)
+
+        launch_info.launch.launchId = 3
+        _cluster_index.update_launch_clusters(
+            [launch_objects.ClusterInfo(
+                clusterId=123, clusterMessage="error occured", logIds=[10], itemIds=[100])],
+            {123: 0}, self.log_dict, self.log_messages, launch_info)
+        _cluster_index.object_saver.get_folder_objects.call_count.should.equal(2)
+        sorted(_cluster_index.get_launch_ids(2)).should.equal(["2", "3"])
+
+    @utils.ignore_warnings
+    def test_cluster_messages_cache(self):
+        _cache = ClusterMessagesCache(self.app_config, max_messages=2)
+        launch_info = self.get_launch_info(False)
+        _cache.find_cached_clusters(
+            self.log_dict, self.log_messages, launch_info).should.equal(({}, {}, [0, 1, 2]))
+        clusters = [
+            launch_objects.ClusterInfo(
+                clusterId=123, clusterMessage="error occured", logIds=["10"], itemIds=[100]),
+            launch_objects.ClusterInfo(
+                clusterId=456, clusterMessage="assertion failed", logIds=["11"], itemIds=[101])]
+        _cache.update_cached_clusters(
+            clusters, {}, self.log_dict, self.log_messages, launch_info)
+        _cache.find_cached_clusters(
+            self.log_dict, self.log_messages, launch_info).should.equal(
+            ({123: [0], 456: [1]}, {123: "error occured", 456: "assertion failed"}, [2]))
+
+        launch_info.cleanNumbers = True
+        _cache.find_cached_clusters(
+            self.log_dict, self.log_messages, launch_info)[2].should.equal([0, 1, 2])
+
+        launch_info = self.get_launch_info(False)
+        _cache.update_cached_clusters(
+            [launch_objects.ClusterInfo(
+                clusterId=123, clusterMessage="error occured", logIds=["12"], itemIds=[102])],
+            {}, self.log_dict, self.log_messages, launch_info, failed_clusters={123: 1})
+        _cache.get_cache(2)["messages"].should.have.length_of(2)
+        _cache.remove_cache(2)
+        _cache.get_cache(2).should.equal({"messages": {}})
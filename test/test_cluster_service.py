@@ -15,6 +15,7 @@
 """
 
 import unittest
+import json
 from http import HTTPStatus
 import sure # noqa
 import httpretty
@@ -568,6 +569,88 @@ class TestClusterService(TestService):
 
                 TestClusterService.shutdown_server(test["test_calls"])
 
+    @utils.ignore_warnings
+    def test_update_clusters_in_es_reports_failed_clusters(self):
+        """Test reporting failed cluster updates"""
+        bulk_rs = json.dumps({"took": 1, "errors": True, "items": [
+            {"update": {"_index": "2", "_id": "4", "status": 200}},
+            {"update": {"_index": "2", "_id": "5", "status": 404,
+                        "error": {"type": "document_missing_exception"}}},
+            {"update": {"_index": "2", "_id": "9", "status": 404,
+                        "error": {"type": "document_missing_exception"}}}]})
+        test_calls = [{"method":         httpretty.POST,
+                       "uri":            "/_bulk?refresh=false",
+                       "status":         HTTPStatus.OK,
+                       "content_type":   "application/json",
+                       "rs":             bulk_rs}]
+        self._start_server(test_calls)
+        _cluster_service = ClusterService(app_config=self.app_config,
+                                          search_cfg=self.get_default_search_config())
+        launch_info = launch_objects.LaunchInfoForClustering(
+            launch=launch_objects.Launch(launchId=1, project=2),
+            project=2, numberOfLogLines=-1)
+        clusters = [
+            launch_objects.ClusterInfo(clusterId=1, clusterMessage="error", logIds=[4, 5], itemIds=[2]),
+            launch_objects.ClusterInfo(clusterId=2, clusterMessage="error found", logIds=[9], itemIds=[6])]
+        failed_clusters = _cluster_service.update_clusters_in_es(clusters, {}, "2", launch_info)
+        failed_clusters.should.equal({1: 1, 2: 1})
+        TestClusterService.shutdown_server(test_calls)
+
+    @utils.ignore_warnings
+    def test_clustering_with_partly_cached_clusters(self):
+        """Test merging new messages similar to the cached ones into the cached clusters"""
+        log_messages = [
+            "error occured while processing the request for the item and it failed with number 1",
+            "assertion failed expected status code 200 but was 500",
+            "error occured while processing the request for the item and it failed with number 2",
+            "error occured while processing the request for the item and it failed with number 3"]
+        log_dict = {}
+        for idx in range(len(log_messages)):
+            log_dict[idx] = {"_source": {"found_exceptions": "", "potential_status_codes": ""}}
+        _cluster_service = ClusterService(app_config=self.app_config,
+                                          search_cfg=self.get_default_search_config())
+        cached_clusters = {123: [0]}
+        groups = _cluster_service.cluster_messages_with_cached_clusters(
+            log_messages, log_dict, 0.8, cached_clusters, [1, 2, 3])
+        list(groups.values()).should.equal([[1]])
+        cached_clusters.should.equal({123: [0, 2, 3]})
+
+        cached_clusters = {123: [0, 2, 3], 456: [1]}
+        _cluster_service.cluster_messages_with_cached_clusters(
+            log_messages, log_dict, 0.8, cached_clusters, []).should.equal({})
+        cached_clusters.should.equal({123: [0, 2, 3], 456: [1]})
+
+    @utils.ignore_warnings
+    def test_parallel_clustering_by_error_groups(self):
+        """Test clustering error groups in the processes created with the service"""
+        log_messages, log_dict = [], {}
+        for idx in range(40):
+            log_messages.append("error occured in the request number %d with code %d" % (
+                idx % 3, idx % 2))
+            log_dict[idx] = {"_source": {"found_exceptions": "Exception%d" % (idx % 4),
+                                         "potential_status_codes": ""}}
+        _cluster_service = ClusterService(app_config=self.app_config,
+                                          search_cfg=self.get_default_search_config())
+        _cluster_service.clustering_pool.should.be.none
+        sequential_groups = _cluster_service.cluster_messages_with_groupping_by_error(
+            log_messages, log_dict, 0.95)
+        app_config = dict(self.app_config)
+        app_config["clusteringProcessesNum"] = 2
+        _cluster_service = ClusterService(app_config=app_config,
+                                          search_cfg=self.get_default_search_config())
+        clustering_pool = _cluster_service.clustering_pool
+        try:
+            _cluster_service.min_messages_for_parallel_clustering = 0
+            _cluster_service.get_clustering_processes_num([log_messages] * 4).should.equal(2)
+            for _ in range(2):
+                parallel_groups = _cluster_service.cluster_messages_with_groupping_by_error(
+                    log_messages, log_dict, 0.95)
+                parallel_groups.should.equal(sequential_groups)
+                len(parallel_groups).should.equal(12)
+            _cluster_service.clustering_pool.should.equal(clustering_pool)
+        finally:
+            clustering_pool.terminate()
+
 
 if __name__ == '__main__':
     unittest.main()
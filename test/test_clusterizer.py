@@ -0,0 +1,76 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+"""
+
+import unittest
+import logging
+import numpy as np
+import sure # noqa
+from commons import clusterizer
+from utils import utils
+
+
+class TestClusterizer(unittest.TestCase):
+    """Tests grouping messages by similarity"""
+    @utils.ignore_warnings
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        random_state = np.random.RandomState(0)
+        words = ["word%d" % i for i in range(200)]
+        templates = [list(random_state.choice(words, size=random_state.randint(3, 30)))
+                     for _ in range(30)]
+        self.messages = []
+        for _ in range(400):
+            message = list(templates[random_state.randint(len(templates))])
+            for _ in range(random_state.choice([0, 1, 2, 5])):
+                message[random_state.randint(len(message))] = random_state.choice(words)
+            self.messages.append(" ".join(message))
+
+    @utils.ignore_warnings
+    def tearDown(self):
+        logging.disable(logging.DEBUG)
+
+    @utils.ignore_warnings
+    def test_lsh_groupping_equals_pairwise_groupping(self):
+        _clusterizer = clusterizer.Clusterizer()
+        hash_prints = _clusterizer.calculate_hashes(self.messages)
+        for threshold in [0.95, 0.8, 0.6]:
+            for for_text, data in [(True, self.messages), (False, hash_prints)]:
+                with sure.ensure('Error for the threshold {0}, for_text {1}', threshold, for_text):
+                    pairwise_groups = _clusterizer.similarity_groupping(
+                        data, for_text=for_text, threshold=threshold)
+                    lsh_groups = _clusterizer.similarity_groupping(
+                        data, block_size=10, for_text=for_text, threshold=threshold)
+                    len(set(pairwise_groups.values())).should.be.lower_than(len(self.messages))
+                    lsh_groups.should.equal(pairwise_groups)
+
+    @utils.ignore_warnings
+    def test_blocked_groupping_for_low_thresholds(self):
+        _clusterizer = clusterizer.Clusterizer()
+        _clusterizer.choose_rows_per_band(0.2, _clusterizer.n_permutations).should.equal(0)
+        for threshold in [0.2, 0.0]:
+            with sure.ensure('Error for the threshold {0}', threshold):
+                pairwise_groups = _clusterizer.similarity_groupping(self.messages, threshold=threshold)
+                blocked_groups = _clusterizer.similarity_groupping(
+                    self.messages, block_size=10, threshold=threshold)
+                blocked_groups.should.equal(pairwise_groups)
+
+    @utils.ignore_warnings
+    def test_groups_of_different_key_words_dont_overlap(self):
+        _clusterizer = clusterizer.Clusterizer()
+        messages = [self.messages[0], self.messages[1], self.messages[0], self.messages[2]]
+        groups = _clusterizer.find_groups_by_similarity(
+            messages, {"first": [0, 1, 2], "second": [3]})
+        sorted(groups.values()).should.equal([[0, 2], [1], [3]])
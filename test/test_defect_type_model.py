@@ -0,0 +1,83 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+"""
+
+import unittest
+import logging
+import random
+import numpy as np
+import sure # noqa
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.ensemble import RandomForestClassifier
+from boosting_decision_making.defect_type_model import DefectTypeModel
+from utils import utils
+
+
+class TestDefectTypeModel(unittest.TestCase):
+    """Tests defect type model predictions with the shared tf-idf vectorizer"""
+    @utils.ignore_warnings
+    def setUp(self):
+        self.words = [
+            "java.lang.NullPointerException", "AssertionError", "timeout_exceeded_wait",
+            "ConnectionRefusedError", "expected", "value", "org.test.MyClass",
+            "failedToConnectServer", "element not found", "status code 500"]
+        self.random = random.Random(1257)
+        self.model = DefectTypeModel()
+        for label in ["ab", "pb", "si", "ab_custom"]:
+            data = self.generate_messages(80)
+            labels = [self.random.randint(0, 1) for _ in data]
+            self.model.count_vectorizer_models[label] = TfidfVectorizer(
+                binary=True, stop_words="english", min_df=2,
+                token_pattern=r"[\w\._]+", analyzer=utils.preprocess_words).fit(data)
+            self.model.models[label] = RandomForestClassifier(n_estimators=5, random_state=43).fit(
+                self.model.count_vectorizer_models[label].transform(data).toarray(), labels)
+        logging.disable(logging.CRITICAL)
+
+    @utils.ignore_warnings
+    def tearDown(self):
+        logging.disable(logging.DEBUG)
+
+    def generate_messages(self, messages_number):
+        return [" ".join(self.random.choice(self.words) for _ in range(self.random.randint(2, 8)))
+                for _ in range(messages_number)]
+
+    @utils.ignore_warnings
+    def test_shared_vectorizer_transform(self):
+        messages = self.generate_messages(30)
+        shared_vectorizer = self.model.get_shared_vectorizer()
+        len(shared_vectorizer.analyzers).should.equal(1)
+        transformed_by_label = shared_vectorizer.transform(
+            messages, list(self.model.count_vectorizer_models.keys()))
+        for label, vectorizer in self.model.count_vectorizer_models.items():
+            np.allclose(transformed_by_label[label].toarray(),
+                        vectorizer.transform(messages).toarray()).should.be.true
+
+    @utils.ignore_warnings
+    def test_predict_with_several_models(self):
+        messages = self.generate_messages(30)
+        model_names = [self.random.choice(list(self.model.models.keys())) for _ in messages]
+        _, predicted_probs = self.model.predict_with_several_models(messages, model_names)
+        for message, model_name, prob in zip(messages, model_names, predicted_probs):
+            _, expected_probs = self.model.predict([message], model_name)
+            np.allclose(prob, expected_probs[0]).should.be.true
+
+    @utils.ignore_warnings
+    def test_shared_vectorizer_resynced(self):
+        shared_vectorizer = self.model.get_shared_vectorizer()
+        del self.model.count_vectorizer_models["ab_custom"]
+        del self.model.models["ab_custom"]
+        self.model.get_shared_vectorizer().label_projections.keys().should.equal({"ab", "pb", "si"})
+        self.model.get_shared_vectorizer().should_not.be(shared_vectorizer)
+        shared_vectorizer.label_projections.keys().should.equal({"ab", "pb", "si", "ab_custom"})
@@ -15,11 +15,14 @@
 """
 
 import unittest
+from unittest import mock
 from unittest.mock import MagicMock
+from time import time, sleep
 import json
 from http import HTTPStatus
 import sure # noqa
 import httpretty
+import elasticsearch.helpers
 
 import commons.launch_objects as launch_objects
 from commons import esclient
@@ -954,6 +957,93 @@ class TestEsClient(TestService):
 
                 TestEsClient.shutdown_server(test["test_calls"])
 
+    @utils.ignore_warnings
+    def test_msearch_by_chunks(self):
+        """Test sending queries with several msearch requests"""
+        def msearch(body):
+            return {"responses": [json.loads(line)["size"] for line in body.strip().split("\n")[1::2]]}
+        for threads_num in [1, 3]:
+            es_client = esclient.EsClient(app_config=self.app_config,
+                                          search_cfg=self.get_default_search_config())
+            es_client.es_client.msearch = MagicMock(side_effect=msearch)
+            queries = [{"size": idx, "query": {"match_all": {}}} for idx in range(7)]
+            es_client.msearch_by_chunks(
+                "1", queries, chunk_size=3, threads_num=threads_num).should.equal(list(range(7)))
+            es_client.es_client.msearch.call_count.should.equal(3)
+            es_client.msearch_by_chunks("1", [], chunk_size=3).should.equal([])
+
+    def test_scan_by_slices(self):
+        """Test scanning the index with sliced scrolls in parallel"""
+        def scan(es_client, query=None, index=None, scroll=None):
+            slice_id = query["slice"]["id"] if "slice" in query else 0
+            for idx in range(slice_id, 20, query["slice"]["max"] if "slice" in query else 1):
+                yield {"_id": idx}
+        es_client = esclient.EsClient(app_config=self.app_config,
+                                      search_cfg=self.get_default_search_config())
+        query = {"query": {"match_all": {}}}
+        with mock.patch("elasticsearch.helpers.scan", side_effect=scan) as scan_mock:
+            for slices_num in [1, 3]:
+                scan_mock.reset_mock()
+                found_ids = [res["_id"] for res in es_client.scan_by_slices(
+                    "1", query, slices_num=slices_num)]
+                sorted(found_ids).should.equal(list(range(20)))
+                scan_mock.call_count.should.equal(slices_num)
+            query.should.equal({"query": {"match_all": {}}})
+
+            found_ids = []
+            for res in es_client.scan_by_slices("1", query, slices_num=3):
+                found_ids.append(res["_id"])
+                if len(found_ids) == 5:
+                    break
+            found_ids.should.have.length_of(5)
+
+            list(es_client.scan_by_slices("1", query, slices_num=3, deadline=time() - 1)).should.equal([])
+
+    def test_scan_by_slices_with_bounded_queue(self):
+        """Test scanning threads wait for the consumer, when the queue is full"""
+        scanned_ids = []
+
+        def scan(es_client, query=None, index=None, scroll=None):
+            for idx in range(query["slice"]["id"], 1000, query["slice"]["max"]):
+                scanned_ids.append(idx)
+                yield {"_id": idx}
+        es_client = esclient.EsClient(app_config=self.app_config,
+                                      search_cfg=self.get_default_search_config())
+        query = {"query": {"match_all": {}}}
+        with mock.patch("elasticsearch.helpers.scan", side_effect=scan):
+            found_ids = [res["_id"] for res in es_client.scan_by_slices(
+                "1", query, slices_num=3, queue_size=5)]
+            sorted(found_ids).should.equal(list(range(1000)))
+
+            scanned_ids.clear()
+            for _ in es_client.scan_by_slices("1", query, slices_num=3, queue_size=5):
+                break
+            sleep(0.2)
+            len(scanned_ids).should.be.lower_than(10)
+
+    def test_recreate_only_indices_with_mapping_errors(self):
+        """Test only the stats indices, which documents failed with mapping errors, are recreated"""
+        es_client = esclient.EsClient(app_config=self.app_config,
+                                      search_cfg=self.get_default_search_config())
+        es_client.delete_index = MagicMock(return_value=True)
+        es_client.create_index_for_stats_info = MagicMock()
+        es_client.update_settings_after_read_only = MagicMock()
+        bodies = [{"_index": "1_suggest", "_source": {}},
+                  {"_index": "rp_suggestions_info_metrics", "_source": {}}]
+
+        def item_error(index_name):
+            return {"index": {"_index": index_name, "status": 400,
+                              "error": {"type": "mapper_parsing_exception"}}}
+        for failed_index, recreated_indices in [("1_suggest", []),
+                                                ("rp_suggestions_info_metrics",
+                                                 ["rp_suggestions_info_metrics"])]:
+            es_client.delete_index.reset_mock()
+            bulk_error = elasticsearch.helpers.BulkIndexError(
+                "1 document(s) failed to index.", [item_error(failed_index)])
+            with mock.patch("elasticsearch.helpers.bulk", side_effect=[bulk_error, (1, [])]):
+                es_client._bulk_index(bodies).errors.should.be.false
+            [call[0][0] for call in es_client.delete_index.call_args_list].should.equal(recreated_indices)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,74 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+"""
+
+import unittest
+import logging
+import tempfile
+import shutil
+import sure # noqa
+from boosting_decision_making.training_models.features_cache import FeaturesCache
+from utils import utils
+
+
+class TestFeaturesCache(unittest.TestCase):
+    """Tests keeping features for model retraining in the project storage"""
+    @utils.ignore_warnings
+    def setUp(self):
+        self.storage_folder = tempfile.mkdtemp()
+        self.app_config = {
+            "binaryStoreType": "filesystem",
+            "filesystemDefaultPath": self.storage_folder,
+            "minioBucketPrefix": "prj-"
+        }
+        logging.disable(logging.CRITICAL)
+
+    @utils.ignore_warnings
+    def tearDown(self):
+        shutil.rmtree(self.storage_folder)
+        logging.disable(logging.DEBUG)
+
+    @utils.ignore_warnings
+    def test_features_are_cached_by_version(self):
+        features_cache = FeaturesCache(self.app_config, 1, "suggestion")
+        features_cache.load([0, 3], ["1.0", "suggestion"])
+        features_cache.get("1").should.be.none
+        features_cache.add("1", {0: [[0.5]], 3: [[1.0]], 67: [[0.0, 1.0]]})
+        features_cache.add("2", {0: [[0.25]], 3: [[0.0]]})
+        features_cache.add("3", {0: [[0.25, 0.5]], 3: [[1.0]]})
+        features_cache.add("4", {0: [[0.75]], 3: []})
+        features_cache.save()
+
+        features_cache = FeaturesCache(self.app_config, 1, "suggestion")
+        features_cache.load([0, 3], ["1.0", "suggestion"])
+        features_cache.get("1").should.equal({0: [[0.5]], 3: [[1.0]]})
+        features_cache.get("3").should.be.none
+        features_cache.get("4").should.equal({0: [[0.75]], 3: [[0.0]]})
+        features_cache.save()
+
+        features_cache = FeaturesCache(self.app_config, 1, "suggestion")
+        features_cache.load([0, 3], ["1.0", "suggestion"])
+        features_cache.get("2").should.be.none
+        features_cache.get("1").should.equal({0: [[0.5]], 3: [[1.0]]})
+
+        for feature_ids, version_info in [([0, 3], ["1.1", "suggestion"]), ([0, 4], ["1.0", "suggestion"])]:
+            features_cache = FeaturesCache(self.app_config, 1, "suggestion")
+            features_cache.load(feature_ids, version_info)
+            features_cache.get("1").should.be.none
+        FeaturesCache(self.app_config, 2, "suggestion").get("1").should.be.none
+
+
+if __name__ == '__main__':
+    unittest.main()
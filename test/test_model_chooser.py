@@ -0,0 +1,90 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+"""
+
+import unittest
+import logging
+import tempfile
+import shutil
+import sure # noqa
+from commons import global_models
+from commons.model_chooser import ModelChooser
+from utils import utils
+
+
+class FakeModel:
+
+    loaded_folders = []
+
+    def __init__(self, folder=""):
+        self.folder = folder
+        FakeModel.loaded_folders.append(folder)
+
+
+class TestModelChooser(unittest.TestCase):
+    """Tests lazy loading of global models"""
+    @utils.ignore_warnings
+    def setUp(self):
+        global_models.clear_global_models()
+        FakeModel.loaded_folders = []
+        self.storage_folder = tempfile.mkdtemp()
+        self.app_config = {
+            "binaryStoreType": "filesystem",
+            "filesystemDefaultPath": self.storage_folder,
+            "minioBucketPrefix": "prj-"
+        }
+        self.search_cfg = {
+            "GlobalDefectTypeModelFolder": "defect_type_folder",
+            "SuggestBoostModelFolder": "suggest_folder",
+            "BoostModelFolder": "",
+            "SimilarityWeightsFolder": utils.read_json_file(
+                "", "model_settings.json", to_json=True)["SIMILARITY_WEIGHTS_FOLDER"]
+        }
+        logging.disable(logging.CRITICAL)
+
+    @utils.ignore_warnings
+    def tearDown(self):
+        global_models.clear_global_models()
+        shutil.rmtree(self.storage_folder)
+        logging.disable(logging.DEBUG)
+
+    def create_model_chooser(self):
+        _model_chooser = ModelChooser(self.app_config, self.search_cfg)
+        for model_name_folder in _model_chooser.global_model_folders:
+            folder, _ = _model_chooser.global_model_folders[model_name_folder]
+            _model_chooser.global_model_folders[model_name_folder] = (folder, FakeModel)
+        return _model_chooser
+
+    @utils.ignore_warnings
+    def test_global_models_are_loaded_lazily_and_shared(self):
+        first_model_chooser = self.create_model_chooser()
+        second_model_chooser = self.create_model_chooser()
+        FakeModel.loaded_folders.should.equal([])
+
+        model = first_model_chooser.choose_model(1, "suggestion_model/")
+        model.folder.should.equal("suggest_folder")
+        second_model_chooser.choose_model(2, "suggestion_model/").should.be(model)
+        FakeModel.loaded_folders.should.equal(["suggest_folder"])
+
+        first_model_chooser.choose_model(1, "auto_analysis_model/").should.be(None)
+        FakeModel.loaded_folders.should.equal(["suggest_folder"])
+
+    @utils.ignore_warnings
+    def test_warm_up_global_models(self):
+        _model_chooser = self.create_model_chooser()
+        _model_chooser.warm_up_global_models().join()
+        sorted(FakeModel.loaded_folders).should.equal(["defect_type_folder", "suggest_folder"])
+        global_models.get_weighted_similarity_calculator(self.search_cfg).should.be(
+            global_models.get_weighted_similarity_calculator(self.search_cfg))
@@ -0,0 +1,280 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+"""
+
+import unittest
+import logging
+import hashlib
+import io
+import os
+import tempfile
+import shutil
+from collections import Counter
+from time import time
+from unittest import mock
+from minio.error import BucketAlreadyOwnedByYou
+import sure # noqa
+from commons.object_saving import object_saver
+from commons.object_saving.object_saver import ObjectSaver
+from commons.object_saving.local_cache import LocalObjectCache
+from utils import utils
+
+
+class FakeObject(io.BytesIO):
+
+    def __init__(self, object_name, data=b""):
+        super(FakeObject, self).__init__(data)
+        self.object_name = object_name
+        self.etag = hashlib.md5(data).hexdigest()
+
+    def release_conn(self):
+        pass
+
+
+class FakeMinio:
+    """Keeps buckets in memory the same way as minio does, the buckets are shared
+    by all the clients like on a minio server"""
+
+    instances = []
+    buckets = {}
+
+    def __init__(self, host, access_key=None, secret_key=None, secure=False, region=None):
+        self.calls = Counter()
+        FakeMinio.instances.append(self)
+
+    def bucket_exists(self, bucket_name):
+        self.calls["bucket_exists"] += 1
+        return bucket_name in self.buckets
+
+    def make_bucket(self, bucket_name, location=None):
+        self.calls["make_bucket"] += 1
+        if bucket_name in self.buckets:
+            raise BucketAlreadyOwnedByYou()
+        self.buckets[bucket_name] = {}
+
+    def put_object(self, bucket_name, object_name, data, length, part_size=5 * 1024 * 1024):
+        self.calls["put_object"] += 1
+        parts = []
+        while length > 0:
+            parts.append(data.read(min(part_size, length)))
+            length -= len(parts[-1])
+        self.calls["uploaded_parts"] += len(parts)
+        self.buckets[bucket_name][object_name] = b"".join(parts)
+
+    def get_object(self, bucket_name, object_name):
+        self.calls["get_object"] += 1
+        return FakeObject(object_name, self.buckets[bucket_name][object_name])
+
+    def stat_object(self, bucket_name, object_name):
+        self.calls["stat_object"] += 1
+        return FakeObject(object_name, self.buckets[bucket_name][object_name])
+
+    def list_objects(self, bucket_name, prefix=None):
+        self.calls["list_objects"] += 1
+        return [FakeObject(name) for name in self.buckets[bucket_name] if name.startswith(prefix)]
+
+    def remove_object(self, bucket_name, object_name):
+        self.calls["remove_object"] += 1
+        del self.buckets[bucket_name][object_name]
+
+
+class TestObjectSaver(unittest.TestCase):
+    """Tests saving objects into minio and the filesystem"""
+    @utils.ignore_warnings
+    def setUp(self):
+        object_saver.clear_minio_clients()
+        FakeMinio.instances = []
+        FakeMinio.buckets = {}
+        self.storage_folder = tempfile.mkdtemp()
+        self.app_config = {
+            "binaryStoreType": "minio",
+            "minioHost": "minio:9000",
+            "minioAccessKey": "minio",
+            "minioSecretKey": "minio123",
+            "minioRegion": None,
+            "minioBucketPrefix": "prj-",
+            "filesystemDefaultPath": self.storage_folder
+        }
+        logging.disable(logging.CRITICAL)
+
+    @utils.ignore_warnings
+    def tearDown(self):
+        object_saver.clear_minio_clients()
+        shutil.rmtree(self.storage_folder)
+        logging.disable(logging.DEBUG)
+
+    @utils.ignore_warnings
+    def test_minio_client_is_shared(self):
+        with mock.patch("commons.object_saving.minio_client.Minio", FakeMinio):
+            first_saver = ObjectSaver(self.app_config)
+            second_saver = ObjectSaver(self.app_config)
+            first_saver.does_object_exists(1, "chosen_namespaces").should.be.false
+            first_saver.put_project_object({"a": 1}, 1, "chosen_namespaces", using_json=True)
+            second_saver.put_project_object([1, 2], 1, "model/boost_model")
+            second_saver.does_object_exists(1, "chosen_namespaces").should.be.true
+            first_saver.get_project_object(1, "chosen_namespaces", using_json=True).should.equal({"a": 1})
+            second_saver.get_project_object(1, "model/boost_model").should.equal([1, 2])
+            first_saver.get_project_object(1, "model/features").should.equal({})
+            first_saver.get_folder_objects(1, "model/").should.equal(["model/boost_model"])
+            second_saver.remove_folder_objects(1, "model/").should.equal(1)
+            second_saver.does_object_exists(1, "model/boost_model").should.be.false
+            first_saver.does_object_exists(2, "chosen_namespaces").should.be.false
+
+        FakeMinio.instances.should.have.length_of(1)
+        calls = FakeMinio.instances[0].calls
+        calls["bucket_exists"].should.equal(3)
+        calls["make_bucket"].should.equal(1)
+        calls["stat_object"].should.equal(2)
+        calls["get_object"].should.equal(3)
+
+    @utils.ignore_warnings
+    def test_buckets_created_by_other_processes(self):
+        def bucket_created_after_check(bucket_name):
+            exists = bucket_name in FakeMinio.buckets
+            FakeMinio.buckets.setdefault(bucket_name, {})
+            return exists
+        with mock.patch("commons.object_saving.minio_client.Minio", FakeMinio):
+            saver = ObjectSaver(self.app_config)
+            saver.get_project_object(1, "chosen_namespaces", using_json=True).should.equal({})
+            FakeMinio.buckets["prj-1"] = {"chosen_namespaces": b'{"a": 1}'}
+            saver.get_project_object(1, "chosen_namespaces", using_json=True).should.equal({"a": 1})
+
+            FakeMinio.instances[0].bucket_exists = bucket_created_after_check
+            saver.put_project_object([1, 2], 2, "model/boost_model")
+            FakeMinio.instances[0].calls["make_bucket"].should.equal(1)
+            saver.get_project_object(2, "model/boost_model").should.equal([1, 2])
+
+    @utils.ignore_warnings
+    def test_large_objects_are_uploaded_by_parts(self):
+        large_object = {"model": b"0" * 12 * 1024 * 1024}
+        with mock.patch("commons.object_saving.minio_client.Minio", FakeMinio):
+            saver = ObjectSaver(self.app_config)
+            saver.put_project_object(large_object, 1, "defect_type_model/models")
+            saver.get_project_object(1, "defect_type_model/models").should.equal(large_object)
+        FakeMinio.instances[0].calls["uploaded_parts"].should.equal(3)
+
+    @utils.ignore_warnings
+    def test_bucket_existence_is_checked_after_ttl(self):
+        self.app_config["minioBucketCacheTtl"] = 0
+        with mock.patch("commons.object_saving.minio_client.Minio", FakeMinio):
+            saver = ObjectSaver(self.app_config)
+            saver.does_object_exists(1, "chosen_namespaces").should.be.false
+            saver.does_object_exists(1, "chosen_namespaces").should.be.false
+        FakeMinio.instances[0].calls["bucket_exists"].should.equal(2)
+
+    @utils.ignore_warnings
+    def test_minio_objects_are_cached_locally(self):
+        self.app_config["minioLocalCacheFolder"] = os.path.join(self.storage_folder, "cache")
+        self.app_config["minioLocalCacheSize"] = 1
+        with mock.patch("commons.object_saving.minio_client.Minio", FakeMinio):
+            saver = ObjectSaver(self.app_config)
+            saver.put_project_object({"a": 1}, 1, "chosen_namespaces", using_json=True)
+            saver.put_project_object([1, 2], 1, "model/boost_model")
+            for _ in range(2):
+                saver.get_project_object(1, "chosen_namespaces", using_json=True).should.equal({"a": 1})
+                saver.get_project_object(1, "model/boost_model").should.equal([1, 2])
+            FakeMinio.instances[0].calls["get_object"].should.equal(2)
+
+            object_saver.clear_minio_clients()
+            saver = ObjectSaver(self.app_config)
+            saver.get_project_object(1, "model/boost_model").should.equal([1, 2])
+            FakeMinio.instances[1].calls["get_object"].should.equal(0)
+            saver.put_project_object([1, 2, 3], 1, "model/boost_model")
+            saver.get_project_object(1, "model/boost_model").should.equal([1, 2, 3])
+            saver.get_project_object(1, "model/boost_model").should.equal([1, 2, 3])
+            FakeMinio.instances[1].calls["get_object"].should.equal(1)
+            os.listdir(self.app_config["minioLocalCacheFolder"]).should.have.length_of(2)
+
+            for object_name in ["model/defect_type_model", "model/defect_type_model_count_vectorizer"]:
+                saver.put_project_object(b"0" * 600 * 1024, 1, object_name)
+                saver.get_project_object(1, object_name).should.have.length_of(600 * 1024)
+            os.listdir(self.app_config["minioLocalCacheFolder"]).should.have.length_of(1)
+            saver.get_project_object(1, "model/defect_type_model_count_vectorizer")
+            FakeMinio.instances[1].calls["get_object"].should.equal(3)
+            saver.remove_folder_objects(1, "model/")
+            os.listdir(self.app_config["minioLocalCacheFolder"]).should.have.length_of(0)
+
+    @utils.ignore_warnings
+    def test_broken_cached_objects_are_downloaded_again(self):
+        cache_folder = os.path.join(self.storage_folder, "cache")
+        self.app_config["minioLocalCacheFolder"] = cache_folder
+        with mock.patch("commons.object_saving.minio_client.Minio", FakeMinio):
+            saver = ObjectSaver(self.app_config)
+            saver.put_project_object([1, 2], 1, "model/boost_model")
+            saver.get_project_object(1, "model/boost_model").should.equal([1, 2])
+            for file_name in os.listdir(cache_folder):
+                with open(os.path.join(cache_folder, file_name), "wb") as f:
+                    f.write(b"broken")
+            saver.get_project_object(1, "model/boost_model").should.equal([1, 2])
+            saver.get_project_object(1, "model/boost_model").should.equal([1, 2])
+            FakeMinio.instances[0].calls["get_object"].should.equal(2)
+
+    @utils.ignore_warnings
+    def test_saved_cached_object_is_read_after_removal(self):
+        cache_folder = os.path.join(self.storage_folder, "cache")
+        local_cache = LocalObjectCache(cache_folder, 1024 * 1024)
+        cached_file = local_cache.save("prj-1", "model/boost_model", "etag", io.BytesIO(b"model"))
+        local_cache.remove("prj-1", "model/boost_model")
+        with cached_file:
+            cached_file.read().should.equal(b"model")
+        os.listdir(cache_folder).should.have.length_of(0)
+
+    @utils.ignore_warnings
+    def test_filesystem_saver(self):
+        self.app_config["binaryStoreType"] = "filesystem"
+        saver = ObjectSaver(self.app_config)
+        saver.does_object_exists(1, "chosen_namespaces").should.be.false
+        saver.put_project_object({"a": 1}, 1, "chosen_namespaces", using_json=True)
+        saver.put_project_object([1, 2], 1, "model/boost_model")
+        saver.get_project_object(1, "chosen_namespaces", using_json=True).should.equal({"a": 1})
+        saver.get_project_object(1, "model/boost_model").should.equal([1, 2])
+        saver.get_folder_objects(1, "model/").should.equal(["model/boost_model"])
+        saver.remove_folder_objects(1, "model/").should.equal(1)
+        saver.does_object_exists(1, "model/boost_model").should.be.false
+
+    @utils.ignore_warnings
+    def test_filesystem_saver_replaces_objects_atomically(self):
+        self.app_config["binaryStoreType"] = "filesystem"
+        saver = ObjectSaver(self.app_config)
+        saver.put_project_object([1, 2], 1, "model/boost_model")
+        saver.put_project_object([1, 2, lambda x: x], 1, "model/boost_model")
+        saver.get_project_object(1, "model/boost_model").should.equal([1, 2])
+        saver.get_folder_objects(1, "model/").should.equal(["model/boost_model"])
+
+    @utils.ignore_warnings
+    def test_filesystem_saver_file_mode_and_temp_files(self):
+        self.app_config["binaryStoreType"] = "filesystem"
+        saver = ObjectSaver(self.app_config)
+        folder = os.path.join(self.app_config["filesystemDefaultPath"], "prj-1", "model")
+        os.makedirs(folder)
+        stale_file = os.path.join(folder, ".tmp_stale")
+        new_file = os.path.join(folder, ".tmp_new")
+        for temp_file in [stale_file, new_file]:
+            with open(temp_file, "wb") as f:
+                f.write(b"data")
+        os.utime(stale_file, (time() - 7200, time() - 7200))
+        saver.get_folder_objects(1, "model/").should.equal([])
+
+        saver.put_project_object([1, 2], 1, "model/boost_model")
+        os.path.exists(stale_file).should.be.false
+        os.path.exists(new_file).should.be.true
+        saver.get_folder_objects(1, "model/").should.equal(["model/boost_model"])
+        umask = os.umask(0)
+        os.umask(umask)
+        (os.stat(os.path.join(folder, "boost_model")).st_mode & 0o777).should.equal(0o666 & ~umask)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -23,6 +23,7 @@ import httpretty
 
 import commons.launch_objects as launch_objects
 from service.suggest_info_service import SuggestInfoService
+from commons import bulk_writer
 from test.test_service import TestService
 from utils import utils
 
@@ -228,12 +229,6 @@ class TestSuggestInfoService(TestService):
                                     "status":         HTTPStatus.OK,
                                     "rs":             utils.get_fixture(self.index_created_rs),
                                     },
-                                   {"method":         httpretty.POST,
-                                    "uri":            "/_bulk?refresh=true",
-                                    "status":         HTTPStatus.OK,
-                                    "content_type":   "application/json",
-                                    "rs":             utils.get_fixture(self.index_logs_rs),
-                                    },
                                    {"method":         httpretty.POST,
                                     "uri":            "/_bulk?refresh=true",
                                     "status":         HTTPStatus.OK,
@@ -263,12 +258,6 @@ class TestSuggestInfoService(TestService):
                                     "status":         HTTPStatus.OK,
                                     "rs":             utils.get_fixture(self.index_created_rs),
                                     },
-                                   {"method":         httpretty.POST,
-                                    "uri":            "/_bulk?refresh=true",
-                                    "status":         HTTPStatus.OK,
-                                    "content_type":   "application/json",
-                                    "rs":             utils.get_fixture(self.index_logs_rs),
-                                    },
                                    {"method":         httpretty.POST,
                                     "uri":            "/_bulk?refresh=true",
                                     "status":         HTTPStatus.OK,
@@ -298,12 +287,6 @@ class TestSuggestInfoService(TestService):
                                     "status":         HTTPStatus.OK,
                                     "rs":             utils.get_fixture(self.index_created_rs),
                                     },
-                                   {"method":         httpretty.POST,
-                                    "uri":            "/_bulk?refresh=true",
-                                    "status":         HTTPStatus.OK,
-                                    "content_type":   "application/json",
-                                    "rs":             utils.get_fixture(self.index_logs_rs),
-                                    },
                                    {"method":         httpretty.POST,
                                     "uri":            "/_bulk?refresh=true",
                                     "status":         HTTPStatus.OK,
@@ -621,6 +604,76 @@ class TestSuggestInfoService(TestService):
 
                 TestSuggestInfoService.shutdown_server(test["test_calls"])
 
+    @utils.ignore_warnings
+    def test_index_suggest_info_buffered(self):
+        """Test suggest info is sent with one bulk request after buffering"""
+        app_config = dict(self.app_config)
+        app_config["suggestInfoFlushInterval"] = 60
+        app_config["suggestInfoFlushSize"] = 1000
+        bulk_writer.bulk_writers.clear()
+        suggest_info_service = SuggestInfoService(app_config=app_config,
+                                                  search_cfg=self.get_default_search_config())
+        es_client = suggest_info_service.es_client
+        es_client.create_index_for_stats_info = MagicMock()
+        es_client._bulk_index = MagicMock(
+            side_effect=lambda bodies: launch_objects.BulkResponse(took=len(bodies), errors=False))
+        es_client.delete_index = MagicMock(return_value=True)
+        suggest_info_list = [launch_objects.SuggestAnalysisResult(**res)
+                             for res in json.loads(utils.get_fixture(self.suggest_info_list))]
+
+        for _ in range(2):
+            response = suggest_info_service.index_suggest_info(suggest_info_list)
+            response.errors.should.equal(False)
+            response.took.should.equal(len(suggest_info_list) + 1)
+        es_client._bulk_index.call_count.should.equal(0)
+        es_client.create_index_for_stats_info.call_count.should.equal(2)
+
+        another_service = SuggestInfoService(app_config=app_config,
+                                             search_cfg=self.get_default_search_config())
+        another_service.bulk_writer.should.be(suggest_info_service.bulk_writer)
+
+        response = suggest_info_service.bulk_writer.flush()
+        es_client._bulk_index.call_count.should.equal(1)
+        indexed_bodies = es_client._bulk_index.call_args[0][0]
+        indexed_project_bodies = [body for body in indexed_bodies if body["_index"] == "1_suggest"]
+        indexed_project_bodies.should.have.length_of(2 * len(suggest_info_list))
+        response.took.should.equal(len(indexed_bodies))
+
+        suggest_info_service.index_suggest_info(suggest_info_list)
+        suggest_info_service.remove_suggest_info(1)
+        suggest_info_service.bulk_writer.bodies.should.have.length_of(
+            len(indexed_bodies) // 2 - len(suggest_info_list))
+        suggest_info_service.index_suggest_info(suggest_info_list)
+        es_client.create_index_for_stats_info.call_count.should.equal(3)
+        suggest_info_service.bulk_writer.flush()
+        es_client._bulk_index.call_count.should.equal(2)
+        bulk_writer.bulk_writers.clear()
+
+    @utils.ignore_warnings
+    def test_index_suggest_info_after_bulk_errors(self):
+        """Test suggest info and metrics are sent with one bulk request and indices
+        are checked again after a failed request"""
+        suggest_info_service = SuggestInfoService(app_config=self.app_config,
+                                                  search_cfg=self.get_default_search_config())
+        es_client = suggest_info_service.es_client
+        es_client.create_index_for_stats_info = MagicMock()
+        es_client._bulk_index = MagicMock(
+            return_value=launch_objects.BulkResponse(took=0, errors=True))
+        suggest_info_list = [launch_objects.SuggestAnalysisResult(**res)
+                             for res in json.loads(utils.get_fixture(self.suggest_info_list))]
+
+        suggest_info_service.index_suggest_info(suggest_info_list).errors.should.be.true
+        es_client._bulk_index.call_count.should.equal(1)
+        indices = set(body["_index"] for body in es_client._bulk_index.call_args[0][0])
+        indices.should.equal({"1_suggest", "rp_suggestions_info_metrics"})
+        suggest_info_service.index_suggest_info(suggest_info_list)
+        es_client.create_index_for_stats_info.call_count.should.equal(4)
+
+        es_client._bulk_index.return_value = launch_objects.BulkResponse(took=3, errors=False)
+        for _ in range(2):
+            suggest_info_service.index_suggest_info(suggest_info_list).errors.should.be.false
+        es_client.create_index_for_stats_info.call_count.should.equal(6)
+
 
 if __name__ == '__main__':
     unittest.main()
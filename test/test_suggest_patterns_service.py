@@ -191,6 +191,51 @@ class TestSearchService(TestService):
 
                 TestSearchService.shutdown_server(test["test_calls"])
 
+    @utils.ignore_warnings
+    def test_suggest_patterns_with_aggregations(self):
+        """Test suggest patterns with exceptions aggregated by elasticsearch"""
+        query_data = [("assertionError notFoundError", "ab001"),
+                      ("assertionError ifElseError", "pb001"),
+                      ("assertionError commonError", "ab001"),
+                      ("assertionError commonError", "ab001"),
+                      ("assertionError", "ab001"),
+                      ("assertionError commonError", "ab001"),
+                      ("assertionError commonError", "ti001")]
+        search_cfg = self.get_default_search_config()
+        scan_service = SuggestPatternsService(app_config=self.app_config, search_cfg=search_cfg)
+        scan_service.es_client.es_client.indices.get = MagicMock(return_value={"1": {}})
+        scan_service.query_data = MagicMock(return_value=query_data)
+        expected_response = scan_service.suggest_patterns(1)
+
+        exceptions_counts = {}
+        for _ in range(4):
+            for log, issue_type in query_data:
+                for exception in log.split():
+                    key = (issue_type, exception)
+                    exceptions_counts[key] = exceptions_counts.get(key, 0) + 1
+        buckets = [{"key": {"issue_type": issue_type, "exception": exception}, "doc_count": count}
+                   for (issue_type, exception), count in sorted(exceptions_counts.items())]
+        app_config = dict(self.app_config)
+        app_config["esChunkNumber"] = 3
+        pages = []
+        for i in range(0, len(buckets) + 1, 3):
+            pages.append({"aggregations": {"exceptions": {
+                "buckets": buckets[i: i + 3], "after_key": buckets[min(i + 2, len(buckets) - 1)]["key"]}}})
+        aggregation_service = SuggestPatternsService(app_config=app_config, search_cfg=search_cfg)
+        aggregation_service.es_client.es_client.indices.get = MagicMock(return_value={
+            "1": {"mappings": {"properties": {"found_exceptions": {
+                "type": "text", "fields": {"tokens": {"type": "text"}}}}}}})
+        aggregation_service.es_client.es_client.search = MagicMock(side_effect=pages)
+        aggregation_service.query_data = MagicMock()
+        response = aggregation_service.suggest_patterns(1)
+
+        aggregation_service.query_data.call_count.should.equal(0)
+        aggregation_service.es_client.es_client.search.call_count.should.equal(len(pages))
+        sorted(response.suggestionsWithLabels, key=lambda x: (x.pattern, x.label)).should.equal(
+            sorted(expected_response.suggestionsWithLabels, key=lambda x: (x.pattern, x.label)))
+        sorted(response.suggestionsWithoutLabels, key=lambda x: x.pattern).should.equal(
+            sorted(expected_response.suggestionsWithoutLabels, key=lambda x: x.pattern))
+
 
 if __name__ == '__main__':
     unittest.main()
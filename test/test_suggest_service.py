@@ -23,12 +23,20 @@ import json
 import commons.launch_objects as launch_objects
 from boosting_decision_making.boosting_decision_maker import BoostingDecisionMaker
 from service.suggest_service import SuggestService
+from commons import suggest_cache
 from test.test_service import TestService
 from utils import utils
 
 
 class TestSuggestService(TestService):
 
+    def get_msearch_results_for_logs(self, msearch_results):
+        """Returns responses of the query variants for every log queried in the msearch body"""
+        def msearch(body):
+            queries_num = len(body.strip().split("\n")) // 2
+            return {"responses": msearch_results * (queries_num // len(msearch_results))}
+        return msearch
+
     @utils.ignore_warnings
     def test_suggest_items(self):
         """Test suggesting test items"""
@@ -788,7 +796,7 @@ class TestSuggestService(TestService):
                     utils.get_fixture(self.no_hits_search_rs)))
                 if "msearch_results" in test:
                     suggest_service.es_client.es_client.msearch = MagicMock(
-                        return_value={"responses": test["msearch_results"]})
+                        side_effect=self.get_msearch_results_for_logs(test["msearch_results"]))
                 _boosting_decision_maker = BoostingDecisionMaker()
                 _boosting_decision_maker.get_feature_ids = MagicMock(return_value=[0])
                 _boosting_decision_maker.get_feature_names = MagicMock(return_value=["0"])
@@ -804,6 +812,146 @@ class TestSuggestService(TestService):
 
                 TestSuggestService.shutdown_server(test["test_calls"])
 
+    @utils.ignore_warnings
+    def test_suggest_items_from_cache(self):
+        """Test returning cached suggestions until the project data or models are changed
+        or the suggestions expire"""
+        suggest_cache.clear()
+        app_config = dict(self.app_config, suggestCacheTtl=300, suggestCacheSize=10)
+        suggest_service = SuggestService(self.model_chooser, app_config=app_config,
+                                         search_cfg=self.get_default_search_config())
+        suggest_service.es_client.index_exists = MagicMock(return_value=True)
+        suggest_service.es_client.create_index_for_stats_info = MagicMock()
+        suggest_service.es_client._bulk_index = MagicMock()
+        suggest_service.query_es_for_suggested_items = MagicMock(return_value=[])
+        _boosting_decision_maker = BoostingDecisionMaker()
+        _boosting_decision_maker.get_feature_ids = MagicMock(return_value=[0])
+        _boosting_decision_maker.get_feature_names = MagicMock(return_value=["0"])
+        suggest_service.model_chooser.choose_model = MagicMock(
+            return_value=_boosting_decision_maker)
+        suggest_service.model_chooser.get_model_info = MagicMock(return_value="")
+        suggest_service.send_suggest_stats = MagicMock()
+        test_item_info = launch_objects.TestItemInfo(
+            **utils.get_fixture(self.suggest_test_item_info_w_logs, to_json=True))
+
+        suggest_service.suggest_items(test_item_info).should.equal([])
+        suggest_service.suggest_items(test_item_info).should.equal([])
+        suggest_service.query_es_for_suggested_items.call_count.should.equal(1)
+        suggest_service.send_suggest_stats.call_count.should.equal(2)
+        suggest_service.model_chooser.get_model_info.call_count.should.equal(4)
+
+        suggest_cache.invalidate_projects([test_item_info.project])
+        suggest_service.suggest_items(test_item_info)
+        suggest_service.query_es_for_suggested_items.call_count.should.equal(2)
+
+        test_item_info.logs[0].message = "another error"
+        suggest_service.suggest_items(test_item_info)
+        suggest_service.query_es_for_suggested_items.call_count.should.equal(3)
+
+        suggest_service.model_chooser.get_model_info = MagicMock(
+            return_value="suggestion_model/retrained")
+        suggest_service.suggest_items(test_item_info)
+        suggest_service.query_es_for_suggested_items.call_count.should.equal(4)
+        suggest_service.suggest_items(test_item_info)
+        suggest_service.query_es_for_suggested_items.call_count.should.equal(4)
+
+        for key, (saved_time, suggestions, info) in list(suggest_cache.cached_suggestions.items()):
+            suggest_cache.cached_suggestions[key] = (saved_time - 301, suggestions, info)
+        suggest_service.suggest_items(test_item_info)
+        suggest_service.query_es_for_suggested_items.call_count.should.equal(5)
+        suggest_cache.clear()
+
+    @utils.ignore_warnings
+    def test_suggest_items_for_cluster(self):
+        """Test suggesting for all test items of the cluster at once"""
+        suggest_service = SuggestService(self.model_chooser, app_config=self.app_config,
+                                         search_cfg=self.get_default_search_config())
+        cluster_result = launch_objects.SuggestAnalysisResult(
+            project=34, testItem=123, testItemLogId=178, launchId=145, launchName="Launch with test items",
+            issueType="AB001", relevantItem=1, relevantLogId=1, matchScore=70.0, esScore=10.0,
+            esPosition=0, modelFeatureNames="0", modelFeatureValues="1.0", modelInfo="",
+            resultPosition=0, usedLogLines=-1, minShouldMatch=80, processedTime=10.0,
+            clusterId=5349085043832165, methodName="suggestion")
+        suggest_service.suggest_items = MagicMock(return_value=[cluster_result])
+        suggest_service.es_client.es_client.search = MagicMock(return_value={
+            "_scroll_id": "1", "_shards": {"successful": 1, "total": 1}, "hits": {"hits": [
+                {"_id": "180", "_source": {"test_item": 124}},
+                {"_id": "179", "_source": {"test_item": 124}},
+                {"_id": "178", "_source": {"test_item": 123}}]}})
+        suggest_service.es_client.es_client.scroll = MagicMock(return_value=json.loads(
+            utils.get_fixture(self.no_hits_search_rs)))
+        suggest_service.es_client.es_client.clear_scroll = MagicMock()
+        test_item_info = launch_objects.TestItemInfo(
+            testItemId=123, launchId=145, launchName="Launch with test items",
+            project=34, clusterId=5349085043832165)
+
+        results = suggest_service.suggest_items_for_cluster(test_item_info)
+        suggest_service.suggest_items.call_count.should.equal(1)
+        [(result.testItem, result.testItemLogId) for result in results].should.equal(
+            [(123, 178), (124, 179)])
+        results[1].issueType.should.equal("AB001")
+
+    @utils.ignore_warnings
+    def test_suggest_items_batch(self):
+        """Test suggesting for several test items with one request"""
+        suggest_service = SuggestService(self.model_chooser, app_config=self.app_config,
+                                         search_cfg=self.get_default_search_config())
+        suggest_service.es_client.index_exists = MagicMock(return_value=True)
+        suggest_service.es_client.create_index_for_stats_info = MagicMock()
+        suggest_service.es_client._bulk_index = MagicMock()
+        suggest_service.es_client.es_client.msearch = MagicMock(
+            side_effect=self.get_msearch_results_for_logs([
+                utils.get_fixture(self.one_hit_search_rs, to_json=True),
+                utils.get_fixture(self.two_hits_search_rs, to_json=True),
+                utils.get_fixture(self.three_hits_search_rs, to_json=True)]))
+        _boosting_decision_maker = BoostingDecisionMaker()
+        _boosting_decision_maker.get_feature_ids = MagicMock(return_value=[0])
+        _boosting_decision_maker.get_feature_names = MagicMock(return_value=["0"])
+        _boosting_decision_maker.predict = MagicMock(side_effect=lambda feature_data: (
+            [1] * len(feature_data), [[1 - features[0], features[0]] for features in feature_data]))
+        suggest_service.model_chooser.choose_model = MagicMock(return_value=_boosting_decision_maker)
+        test_item_info = launch_objects.TestItemInfo(
+            **utils.get_fixture(self.suggest_test_item_info_w_logs, to_json=True))
+        test_item_info_no_logs = launch_objects.TestItemInfo(testItemId=1, launchId=1, project=1)
+
+        expected_results = suggest_service.suggest_items(test_item_info)
+        expected_results.should_not.be.empty
+        results = suggest_service.suggest_items_batch(
+            [test_item_info, test_item_info_no_logs, test_item_info])
+        results.should.have.length_of(3)
+        results[1].should.equal([])
+        for item_results in [results[0], results[2]]:
+            item_results.should.have.length_of(len(expected_results))
+            for result, expected_result in zip(item_results, expected_results):
+                result.processedTime = expected_result.processedTime
+                result.should.equal(expected_result)
+        _boosting_decision_maker.predict.call_count.should.equal(2)
+
+    @utils.ignore_warnings
+    def test_suggest_items_batch_for_cluster_items(self):
+        """Test results of the test items of one cluster are returned for every requested test item"""
+        suggest_service = SuggestService(self.model_chooser, app_config=self.app_config,
+                                         search_cfg=self.get_default_search_config())
+        suggest_service.es_client.index_exists = MagicMock(return_value=True)
+        suggest_service.send_suggest_stats = MagicMock()
+        cluster_result = launch_objects.SuggestAnalysisResult(
+            project=1, testItem=10, testItemLogId=100, launchId=1, launchName="launch",
+            issueType="AB001", relevantItem=5, relevantLogId=50, matchScore=70.0, esScore=10.0,
+            esPosition=0, modelFeatureNames="0", modelFeatureValues="1.0", modelInfo="",
+            resultPosition=0, usedLogLines=-1, minShouldMatch=80, processedTime=10.0,
+            clusterId=7, methodName="suggestion")
+        suggest_service.suggest_items_for_project = MagicMock(side_effect=lambda infos, *args: (
+            [[cluster_result.copy()] if info.clusterId else [] for info in infos],
+            [[] for _ in infos], [[] for _ in infos], "0"))
+        test_item_infos = [launch_objects.TestItemInfo(testItemId=test_item_id, launchId=1, project=1,
+                                                       clusterId=cluster_id)
+                           for test_item_id, cluster_id in [(11, 7), (12, 0), (13, 7)]]
+
+        results = suggest_service.suggest_items_batch(test_item_infos)
+        [len(item_results) for item_results in results].should.equal([1, 0, 1])
+        results[0][0].should.equal(cluster_result)
+        results[2][0].should.equal(cluster_result)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,93 @@
+"""
+* Copyright 2019 EPAM Systems
+*
+* Licensed under the Apache License, Version 2.0 (the "License");
+* you may not use this file except in compliance with the License.
+* You may obtain a copy of the License at
+*
+* http://www.apache.org/licenses/LICENSE-2.0
+*
+* Unless required by applicable law or agreed to in writing, software
+* distributed under the License is distributed on an "AS IS" BASIS,
+* WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+* See the License for the specific language governing permissions and
+* limitations under the License.
+"""
+
+import unittest
+from unittest.mock import MagicMock
+import numpy as np
+import sure # noqa
+
+from boosting_decision_making import boosting_decision_maker
+from boosting_decision_making.training_models import cross_validation
+from boosting_decision_making.training_models.training_analysis_model import AnalysisModelTraining
+from test.test_service import TestService
+from utils import utils
+
+
+def allocate_megabytes(context, megabytes):
+    return len(np.ones(megabytes * 1024 * 1024 // 8)) + context["shift"]
+
+
+def fail_for_odd_numbers(context, number):
+    context["called_jobs"].append(number)
+    if number % 2:
+        raise ValueError("Odd number %d" % number)
+    return number
+
+
+class TestTrainingCrossValidation(TestService):
+
+    @utils.ignore_warnings
+    def test_run_jobs(self):
+        """Test running jobs in parallel processes"""
+        jobs_args = [(1,), (2,), (3,)]
+        serial_results = cross_validation.run_jobs(allocate_megabytes, jobs_args, {"shift": 1})
+        cross_validation.run_jobs(
+            allocate_megabytes, jobs_args, {"shift": 1}, processes_num=2).should.equal(serial_results)
+
+        results = cross_validation.run_jobs(
+            allocate_megabytes, [(1,), (1000,)], {"shift": 0}, processes_num=2, memory_limit=300)
+        results[0].should.equal(1024 * 1024 // 8)
+        isinstance(results[1], MemoryError).should.be.true
+
+    @utils.ignore_warnings
+    def test_run_jobs_with_failed_jobs(self):
+        """Test failed jobs return their exceptions and aren't rerun in the current process"""
+        for processes_num, called_jobs in [(1, [1, 2, 3, 4]), (2, [])]:
+            context = {"called_jobs": []}
+            results = cross_validation.run_jobs(
+                fail_for_odd_numbers, [(1,), (2,), (3,), (4,)], context, processes_num=processes_num)
+            [isinstance(result, ValueError) for result in results].should.equal([True, False, True, False])
+            results[1].should.equal(2)
+            context["called_jobs"].should.equal(called_jobs)
+
+    @utils.ignore_warnings
+    def test_train_several_times_in_parallel(self):
+        """Test validation of the boosting model in parallel processes"""
+        random_state = np.random.RandomState(0)
+        data = random_state.rand(300, 4)
+        labels = (data[:, 0] + 0.3 * random_state.rand(300) > 0.8).astype(int)
+        test_item_ids = list(random_state.randint(0, 40, 300))
+        features = [1, 2, 3, 4]
+        baseline_model = boosting_decision_maker.BoostingDecisionMaker()
+        baseline_model.add_config_info({}, [1, 2, 3], [])
+        baseline_model.train_model(data[:, :3], labels)
+
+        training = AnalysisModelTraining(MagicMock(), self.app_config, self.get_default_search_config())
+        training.baseline_model = baseline_model
+        training.new_model = boosting_decision_maker.BoostingDecisionMaker()
+        training.new_model.add_config_info({}, features, [])
+        results = []
+        for processes_num in [1, 3]:
+            training.cv_processes_num = processes_num
+            results.append(training.train_several_times(
+                data, labels, features, test_item_ids, ["F1", "Mean Reciprocal Rank"]))
+        results[0][1]["F1"].should.have.length_of(len(training.random_states))
+        results[0][0]["Mean Reciprocal Rank"].should.have.length_of(len(training.random_states))
+        results[1].should.equal(results[0])
+
+
+if __name__ == '__main__':
+    unittest.main()